@@ -0,0 +1,89 @@
+import time
+
+import numpy as np
+from django.core.management import BaseCommand
+
+from ...utils.SadTalker.src.generate_batch import mel_windows
+from ...utils.SadTalker.src.generate_facerender_batch import (
+    semantic_windows,
+    transform_semantic_target,
+)
+
+FPS = 25
+MEL_FRAMES_PER_SECOND = 80
+MEL_STEP_SIZE = 16
+SEMANTIC_RADIUS = 13
+
+
+def parse_list(value: str) -> list[float]:
+    return [float(item) for item in value.split(",") if item.strip()]
+
+
+def loop_mel_windows(spec: np.ndarray, num_frames: int) -> np.ndarray:
+    """
+    The per-frame loop `mel_windows` replaced, kept as the reference of the benchmark.
+    """
+    indiv_mels = []
+    for i in range(num_frames):
+        start_idx = int(80.0 * ((i - 2) / float(FPS)))
+        seq = range(start_idx, start_idx + MEL_STEP_SIZE)
+        seq = [min(max(item, 0), spec.shape[0] - 1) for item in seq]
+        indiv_mels.append(spec[seq, :].T)
+    return np.asarray(indiv_mels)
+
+
+def loop_semantic_windows(coeff_3dmm: np.ndarray) -> np.ndarray:
+    return np.array(
+        [
+            transform_semantic_target(coeff_3dmm, frame_index, SEMANTIC_RADIUS)
+            for frame_index in range(coeff_3dmm.shape[0])
+        ]
+    )
+
+
+def timed(function) -> tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = "Compare the loop and vectorized mel and semantic window builders of the lip-sync batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--minutes",
+            default="1,5,10,30",
+            help="Comma separated audio durations in minutes",
+        )
+        parser.add_argument("--coeffs", type=int, default=73)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+
+        for minutes in parse_list(options["minutes"]):
+            num_frames = int(minutes * 60 * FPS)
+            spec = rng.random(
+                (int(minutes * 60 * MEL_FRAMES_PER_SECOND), 80), dtype=np.float32
+            )
+            coeff_3dmm = rng.random((num_frames, options["coeffs"]))
+
+            for name, loop, vectorized in (
+                (
+                    "mel",
+                    lambda: loop_mel_windows(spec, num_frames),
+                    lambda: mel_windows(spec, num_frames, FPS, MEL_STEP_SIZE),
+                ),
+                (
+                    "semantic",
+                    lambda: loop_semantic_windows(coeff_3dmm),
+                    lambda: np.array(semantic_windows(coeff_3dmm, SEMANTIC_RADIUS)),
+                ),
+            ):
+                reference, loop_time = timed(loop)
+                result, vectorized_time = timed(vectorized)
+                self.stdout.write(
+                    f"{minutes:g} min {name} windows {result.shape}: loop {loop_time:.3f}s, "
+                    f"vectorized {vectorized_time:.3f}s ({loop_time / vectorized_time:.1f}x), "
+                    f"equal={np.array_equal(result, reference)}"
+                )
@@ -0,0 +1,90 @@
+import time
+
+import torch
+from django.core.management import BaseCommand
+
+from ...utils.SadTalker.inference import get_models
+from ...utils.SadTalker.src.facerender.modules.make_animation import make_animation
+
+SEMANTIC_WINDOW = 27
+
+
+def parse_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+class Command(BaseCommand):
+    help = "Measure the face renderer throughput across frame chunk sizes and torch thread counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--facerender", choices=["pirender", "facevid2vid"], default="pirender"
+        )
+        parser.add_argument("--frames", type=int, default=64)
+        parser.add_argument("--size", type=int, default=256)
+        parser.add_argument("--chunks", default="1,2,4,8,16")
+        parser.add_argument("--threads", default=str(torch.get_num_threads()))
+        parser.add_argument("--checkpoint-dir", default="./checkpoints")
+        parser.add_argument("--cpu", action="store_true")
+
+    def handle(self, *args, **options):
+        models = get_models(
+            checkpoint_dir=options["checkpoint_dir"],
+            size=options["size"],
+            facerender=options["facerender"],
+            cpu=options["cpu"],
+        )
+        animator = models.animate_from_coeff
+        self.stdout.write(
+            f"Loaded the {options['facerender']} models on {models.device} in {models.load_time:.2f}s"
+        )
+
+        torch.manual_seed(0)
+        size, frames = options["size"], options["frames"]
+        source_image = torch.rand(1, 3, size, size, device=models.device)
+
+        if options["facerender"] == "pirender":
+            coeff_nc = animator.net_G.mapping_net.first[0].in_channels
+
+            def render(target, chunk):
+                return animator.render_frames(source_image, target, chunk)
+
+        else:
+            coeff_nc = animator.mapping.first[0].in_channels
+            source_semantics = torch.randn(
+                1, coeff_nc, SEMANTIC_WINDOW, device=models.device
+            )
+
+            def render(target, chunk):
+                return make_animation(
+                    source_image,
+                    source_semantics,
+                    target,
+                    animator.generator,
+                    animator.kp_extractor,
+                    animator.he_estimator,
+                    animator.mapping,
+                    frame_chunk=chunk,
+                )
+
+        target = torch.randn(1, frames, coeff_nc, SEMANTIC_WINDOW, device=models.device)
+
+        for threads in parse_list(options["threads"]):
+            torch.set_num_threads(threads)
+            reference = None
+
+            for chunk in parse_list(options["chunks"]):
+                render(target[:, :chunk], chunk)
+
+                start = time.perf_counter()
+                output = render(target, chunk)
+                elapsed = time.perf_counter() - start
+
+                if reference is None:
+                    reference = output
+
+                difference = (output - reference).abs().max().item()
+                self.stdout.write(
+                    f"threads={threads} chunk={chunk}: {frames / elapsed:.2f} frames/s "
+                    f"({elapsed:.2f}s, max difference {difference:.2e})"
+                )
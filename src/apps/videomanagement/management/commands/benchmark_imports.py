@@ -0,0 +1,129 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+# The stacks the web workers and the management commands should not import at startup.
+HEAVY_MODULES = (
+    "torch",
+    "TTS",
+    "moviepy",
+    "cv2",
+    "kornia",
+    "facexlib",
+    "gfpgan",
+    "safetensors",
+    "g4f",
+    "google.generativeai",
+    "openai",
+    "anthropic",
+)
+
+# What every target imports or runs after `django.setup()`, in a fresh interpreter.
+TARGETS = {
+    "check": "\n".join(
+        [
+            "import io",
+            "from django.core.management import call_command",
+            "call_command('check', stdout=io.StringIO())",
+        ]
+    ),
+    "urls": "\n".join(
+        ["from django.urls import get_resolver", "get_resolver().url_patterns"]
+    ),
+    "worker": "\n".join(
+        [
+            "from video_creator.celery import app",
+            "app.loader.import_default_modules()",
+        ]
+    ),
+}
+
+CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+{body}
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+    "heavy": sorted(name for name in {heavy!r} if name in sys.modules),
+}}))
+"""
+
+
+def run_target(target: str) -> dict:
+    script = CHILD.format(body=TARGETS[target], heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        env=os.environ.copy(),
+    )
+    if result.returncode != 0:
+        raise CommandError(f"The {target} target failed:\n{result.stderr}")
+
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample["wall_seconds"] = time.perf_counter() - start
+    return sample
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the import time and memory of the Django startup paths, manage.py check, the URL conf "
+        "of the web workers and the celery worker boot, each in a fresh interpreter"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--targets",
+            default=",".join(TARGETS),
+            help="Comma separated targets among " + ", ".join(TARGETS),
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument(
+            "--json", action="store_true", help="Print the results as JSON for CI."
+        )
+        parser.add_argument(
+            "--fail-on-heavy",
+            action="store_true",
+            help="Fail if a target imports one of the heavy ML or provider stacks.",
+        )
+
+    def handle(self, *args, **options):
+        targets = [item for item in options["targets"].split(",") if item.strip()]
+        unknown = set(targets) - set(TARGETS)
+        if unknown:
+            raise CommandError(f"Unknown targets: {', '.join(sorted(unknown))}")
+
+        results = {}
+        for target in targets:
+            samples = [run_target(target) for _ in range(options["repeat"])]
+            results[target] = {
+                "seconds": statistics.median(s["seconds"] for s in samples),
+                "wall_seconds": statistics.median(s["wall_seconds"] for s in samples),
+                "max_rss_mb": max(s["max_rss_mb"] for s in samples),
+                "modules": samples[-1]["modules"],
+                "heavy": samples[-1]["heavy"],
+            }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            for target, result in results.items():
+                self.stdout.write(
+                    f"{target}: {result['seconds']:.2f}s after startup "
+                    f"({result['wall_seconds']:.2f}s wall), {result['max_rss_mb']:.0f} MB, "
+                    f"{result['modules']} modules, heavy: {', '.join(result['heavy']) or 'none'}"
+                )
+
+        heavy = {target: r["heavy"] for target, r in results.items() if r["heavy"]}
+        if options["fail_on_heavy"] and heavy:
+            raise CommandError(f"Heavy modules imported at startup: {heavy}")
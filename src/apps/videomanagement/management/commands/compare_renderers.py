@@ -0,0 +1,55 @@
+import os
+
+from django.core.management import BaseCommand, CommandError
+
+from ...models import Video
+from ...utils.ffmpeg_utils import compare_videos, render_with_ffmpeg
+from ...utils.segment_utils import render_with_segments
+from ...utils.video_utils import (
+    get_avatar_clips,
+    get_avatar_video,
+    render_with_moviepy,
+)
+
+
+class Command(BaseCommand):
+    help = "Render a video with both the MoviePy and an ffmpeg renderer and compare the outputs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("video_id", type=int)
+        parser.add_argument(
+            "--renderer",
+            choices=["ffmpeg", "segments"],
+            default="ffmpeg",
+            help="The ffmpeg renderer compared against MoviePy.",
+        )
+        parser.add_argument(
+            "--min-ssim",
+            type=float,
+            default=0.9,
+            help="The lowest average SSIM accepted as equivalent output.",
+        )
+
+    def handle(self, *args, **options):
+        video = Video.objects.get(id=options["video_id"])
+        moviepy_output = os.path.join(video.dir_name, "compare_moviepy.mp4")
+        ffmpeg_output = os.path.join(
+            video.dir_name, f"compare_{options['renderer']}.mp4"
+        )
+        render_with_moviepy(video, moviepy_output)
+        if options["renderer"] == "segments":
+            render_with_segments(video, ffmpeg_output, avatar_clips=get_avatar_clips)
+        else:
+            render_with_ffmpeg(video, ffmpeg_output, avatar_video=get_avatar_video)
+        result = compare_videos(moviepy_output, ffmpeg_output)
+
+        self.stdout.write(f"MoviePy: {result['first']}")
+        self.stdout.write(f"{options['renderer']}: {result['second']}")
+        self.stdout.write(
+            f"SSIM: {result['ssim']} Duration delta: {result['duration_delta']:.3f}s"
+        )
+
+        if result["ssim"] is None or result["ssim"] < options["min_ssim"]:
+            raise CommandError("The renders are not equivalent.")
+
+        self.stdout.write(self.style.SUCCESS("The renders are equivalent."))
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from ...utils.lipsync_utils import LipSyncClient, LipSyncServer
+
+
+class Command(BaseCommand):
+    help = "Run the lip-sync server, which keeps the SadTalker models loaded between avatar renders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--address",
+            default=settings.LIPSYNC_SERVER_ADDRESS or "127.0.0.1:6100",
+            help="The host:port the server listens on.",
+        )
+        parser.add_argument(
+            "--no-warmup",
+            action="store_true",
+            help="Load the models on the first job instead of at start.",
+        )
+        parser.add_argument(
+            "--health",
+            action="store_true",
+            help="Print the health of a running server and exit.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.LIPSYNC_SERVER_AUTHKEY:
+            raise CommandError("Set LIPSYNC_SERVER_AUTHKEY to run the lip-sync server.")
+
+        authkey = settings.LIPSYNC_SERVER_AUTHKEY.encode()
+
+        if options["health"]:
+            client = LipSyncClient(options["address"], authkey)
+            self.stdout.write(str(client.health()))
+            return
+
+        server = LipSyncServer(options["address"], authkey)
+        if not options["no_warmup"]:
+            result = server.warm_up()
+            self.stdout.write(
+                f"Models loaded on {result['device']} in {result['load_time']:.2f}s"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Lip-sync server listening on {options['address']}")
+        )
+        server.serve_forever()
@@ -1,10 +1,10 @@
 import os
 import pathlib
-import urllib
 
 from django.core.management import BaseCommand
 
 from ...models import Intro, Outro, Background
+from ...utils.http_utils import download_file
 from ...utils.visual_utils import download_video
 
 
@@ -32,9 +32,7 @@ class Command(BaseCommand):
                     parents=True, exist_ok=True
                 )
                 background_url = "https://i.ibb.co/SPz879q/back.jpg"
-                urllib.request.urlretrieve(
-                    background_url, "media/other/backgrounds/back.png"
-                )
+                download_file(background_url, "media/other/backgrounds/back.png")
 
                 Background.objects.create(
                     category="OTHER",
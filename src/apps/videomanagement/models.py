@@ -116,6 +116,7 @@ class VoiceModel(AbstractModel):
     type = models.CharField(max_length=10, choices=MODEL_TYPE_CHOICES)
     sample = models.URLField(blank=True, null=True, max_length=1000)
     path = models.CharField(max_length=255, blank=False)
+    batched = models.BooleanField(default=False)
     objects = models.Manager()
 
     def __str__(self):
@@ -224,6 +225,7 @@ class Video(AbstractModel):
         db_constraint=False,
     )
     status = models.CharField(max_length=20, choices=VIDEO_STATUS, default="RENDERING")
+    job_id = models.CharField(max_length=255, blank=True, null=True)
     music = models.ForeignKey(Music, blank=True, null=True, on_delete=models.SET_NULL)
     background = models.ForeignKey(
         Background, blank=True, null=True, on_delete=models.SET_NULL
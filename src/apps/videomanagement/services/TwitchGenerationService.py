@@ -17,6 +17,7 @@ def generate_twitch_video(
     amt: int = 10,
     started_at: str = "",
     created_by: get_user_model() = None,
+    job_id: str = None,
 ):
     """
     Generate a video based on clips fetched from Twitch.
@@ -27,6 +28,7 @@ def generate_twitch_video(
         amt (int, optional): The number of clips to fetch. Defaults to 10.
         started_at (str, optional): The starting date/time from which to fetch clips. Defaults to "".
         created_by (User, optional): The user that created the video
+        job_id (str, optional): The id of the job generating the video, stored on it once created.
 
     Returns:
         Videos: The generated video instance.
@@ -45,6 +47,7 @@ def generate_twitch_video(
         status="GENERATION",
         video_type="TWITCH",
         created_by=created_by,
+        job_id=job_id,
     )
 
     client = TwitchClient(path=dir_name)
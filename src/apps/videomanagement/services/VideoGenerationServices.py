@@ -33,6 +33,7 @@ def generate_video(
     provider: Union[str, None] = None,
     created_by: get_user_model() = None,
     avatar_position: str = "top,right",
+    job_id: Union[str, None] = None,
 ) -> Video:
     """
     Generate a video based on the provided parameters.
@@ -71,6 +72,8 @@ def generate_video(
         The ID of the user creating the video.
     avatar_position : str, optional
         The position of the avatar in the video (default is "top,right").
+    job_id : Union[str, None], optional
+        The id of the job generating the video, stored on the video as soon as it is created.
 
     Returns:
     --------
@@ -128,6 +131,7 @@ def generate_video(
         status="GENERATION",
         video_type="AI",
         created_by=created_by,
+        job_id=job_id,
     )
 
     logger.info(f"Created the video instance with id : {vid.id}")
@@ -1,11 +1,10 @@
 import logging
-import os
 from rest_framework.exceptions import APIException
 
 from django.db import transaction
 
 from ..models import Video, Avatar, Intro, Outro
-from ..utils.audio_utils import update_scene
+from ..utils.audio_utils import update_scenes
 from ..utils.visual_utils import generate_new_image
 
 logger = logging.getLogger(__name__)
@@ -53,9 +52,7 @@ def video_update(
         if video.voice_model != selected_avatar.voice:
             video.voice_model = selected_avatar.voice
             video.save()
-            scenes = video.prompt.scenes.all()
-            for scene in scenes:
-                update_scene(scene)
+            update_scenes(video, list(video.prompt.scenes.all()))
 
     try:
         video.intro = (
@@ -83,16 +80,12 @@ def video_update(
 
 def video_regenerate(video: Video) -> None:
     with transaction.atomic():
-        for scene in video.prompt.scenes.all():
-            update_scene(scene)
+        scenes = list(video.prompt.scenes.all())
+        update_scenes(video, scenes)
 
+        for scene in scenes:
             for scene_image in scene.scene_images.all():
                 generate_new_image(scene_image=scene_image, video=video)
 
-        if video.avatar and os.path.exists(
-            rf"{os.getcwd()}\{video.dir_name}\output_avatar.mp4"
-        ):
-            os.remove(rf"{os.getcwd()}\{video.dir_name}\output_avatar.mp4")
-
         video.status = "READY"
         video.save()
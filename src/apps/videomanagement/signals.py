@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import SceneImage
+from .utils.rendition_utils import prepare_scene_image
+
+
+@receiver(post_save, sender=SceneImage)
+def create_scene_image_rendition(sender, instance: SceneImage, **kwargs) -> None:
+    """
+    Create the rendition of a scene image as soon as it is stored, so every render of its video finds it
+    ready. Saving an unchanged image again finds the rendition already there.
+    """
+    prepare_scene_image(instance)
@@ -0,0 +1,149 @@
+import logging
+
+from celery import chain, shared_task
+from django.contrib.auth import get_user_model
+
+from .models import Avatar, Video
+from .services.TwitchGenerationService import generate_twitch_video
+from .services.VideoGenerationServices import generate_video
+from .services.VideoServices import video_regenerate
+from .utils.lipsync_utils import prepare_avatar
+from .utils.video_utils import get_avatar_clips, make_video
+
+logger = logging.getLogger(__name__)
+
+
+def fail_video(video_id: int, exc: Exception) -> None:
+    logger.error(f"Job of video {video_id} failed: {exc}")
+    Video.objects.filter(id=video_id).update(status="FAILED")
+
+
+def fail_job(job_id: str, exc: Exception) -> None:
+    """
+    Mark as failed the video created by a generation job, if the job got as far as creating it.
+    """
+    for video_id in Video.objects.filter(job_id=job_id).values_list("id", flat=True):
+        fail_video(video_id, exc)
+
+
+@shared_task(bind=True, name="videomanagement.generate_video")
+def generate_video_task(self, created_by: int, **data) -> int:
+    """
+    Generate the script, the speech and the scene images of a new video.
+
+    Returns:
+    --------
+    int
+        The id of the generated video.
+    """
+    user = get_user_model().objects.get(id=created_by)
+    try:
+        video = generate_video(created_by=user, job_id=self.request.id, **data)
+
+    except Exception as exc:
+        fail_job(self.request.id, exc)
+        raise
+
+    return video.id
+
+
+@shared_task(bind=True, name="videomanagement.generate_twitch_video")
+def generate_twitch_video_task(self, created_by: int, **data) -> int:
+    """
+    Download the twitch clips of a new video and create its scenes.
+
+    Returns:
+    --------
+    int
+        The id of the generated video.
+    """
+    user = get_user_model().objects.get(id=created_by)
+    try:
+        video = generate_twitch_video(created_by=user, job_id=self.request.id, **data)
+
+    except Exception as exc:
+        fail_job(self.request.id, exc)
+        raise
+
+    return video.id
+
+
+@shared_task(name="videomanagement.regenerate_video", acks_late=True)
+def regenerate_video_task(video_id: int) -> int:
+    try:
+        video_regenerate(Video.objects.get(id=video_id))
+
+    except Exception as exc:
+        fail_video(video_id, exc)
+        raise
+
+    return video_id
+
+
+@shared_task(name="videomanagement.lipsync_video", acks_late=True)
+def lipsync_video_task(video_id: int) -> int:
+    """
+    Create the avatar clips of the scenes of a video, ahead of the render that overlays them. Only the
+    scenes whose audio changed since the last run are animated.
+    """
+    video = Video.objects.get(id=video_id)
+    if not video.avatar:
+        return video_id
+
+    try:
+        get_avatar_clips(video)
+
+    except Exception as exc:
+        fail_video(video_id, exc)
+        raise
+
+    return video_id
+
+
+@shared_task(name="videomanagement.preprocess_avatar")
+def preprocess_avatar_task(avatar_id: int) -> None:
+    """
+    Fill the avatar cache of a new avatar image, so its first render skips the face extraction.
+    """
+    avatar = Avatar.objects.filter(id=avatar_id).first()
+    if avatar and avatar.file:
+        prepare_avatar(avatar.file.path)
+
+
+@shared_task(name="videomanagement.render_video", acks_late=True)
+def render_video_task(video_id: int, renderer: str = None) -> int:
+    try:
+        make_video(Video.objects.get(id=video_id), renderer=renderer)
+
+    except Exception as exc:
+        fail_video(video_id, exc)
+        raise
+
+    return video_id
+
+
+def queue_render(video: Video, renderer: str = None) -> str:
+    """
+    Queue the render of a video, after the lip-sync of its avatar if it has one.
+
+    Returns:
+    --------
+    str
+        The id of the job, which is the id of the render task.
+    """
+    render = render_video_task.si(video.id, renderer)
+    if video.avatar:
+        result = chain(lipsync_video_task.si(video.id), render).apply_async()
+    else:
+        result = render.apply_async()
+
+    video.job_id = result.id
+    video.save(update_fields=["job_id"])
+    return result.id
+
+
+def queue_regenerate(video: Video) -> str:
+    result = regenerate_video_task.delay(video.id)
+    video.job_id = result.id
+    video.save(update_fields=["job_id"])
+    return result.id
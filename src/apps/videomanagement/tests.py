@@ -1 +1,633 @@
-# Create your tests here.
+import os
+import tempfile
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.db.models.signals import post_save
+from django.test import SimpleTestCase
+from PIL import Image
+
+from . import signals
+from .management.commands.benchmark_batch_builders import (
+    loop_mel_windows,
+    loop_semantic_windows,
+)
+from .models import SceneImage
+from .utils import audio_utils, rendition_utils, timeline_utils, tts_utils
+from .utils.SadTalker.inference import blend_coeffs, split_frames
+from .utils.SadTalker.src.generate_batch import mel_windows, silent_frames
+from .utils.SadTalker.src.generate_facerender_batch import semantic_windows
+from .utils.cache_utils import DiskCache
+from .utils.ffmpeg_utils import KEY_BLEND, FilterGraph, ScenePlan
+from .utils.rendition_utils import (
+    colorkey_alpha,
+    get_rendition,
+    prepare_scene_image,
+    rendition_path,
+)
+from .utils.segment_utils import Segment, prune_segments, scene_frames, to_frames
+from .utils.timeline_utils import apply_ducking, build_timeline
+from .utils.tts_utils import SynthesizerPool, TokenBucket, save_batch
+
+
+class SynthesizerPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.sizes = {}
+        patches = [
+            mock.patch.object(tts_utils, "create_model", side_effect=self.create_model),
+            mock.patch.object(
+                tts_utils,
+                "estimate_synthesizer_size",
+                side_effect=lambda syn: self.sizes.get(syn, 1),
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def create_model(self, model, vocoder):
+        return None if model == "broken" else f"{model}|{vocoder}"
+
+    def test_get_loads_once_and_counts_hits(self):
+        pool = SynthesizerPool(max_models=2)
+
+        self.assertEqual(pool.get("a"), "a|default_vocoder")
+        self.assertEqual(pool.get("a"), "a|default_vocoder")
+        self.assertEqual(tts_utils.create_model.call_count, 1)
+        self.assertEqual((pool.stats.hits, pool.stats.misses), (1, 1))
+        self.assertEqual(list(pool.stats.loads), ["a|default_vocoder"])
+
+    def test_evicts_the_least_recently_used_model(self):
+        pool = SynthesizerPool(max_models=2)
+        pool.get("a")
+        pool.get("b")
+        pool.get("a")
+        pool.get("c")
+
+        self.assertEqual(
+            pool.report()["models"], ["a|default_vocoder", "c|default_vocoder"]
+        )
+        self.assertEqual(pool.stats.evictions, 1)
+
+    def test_evicts_past_the_memory_limit_but_keeps_the_new_model(self):
+        pool = SynthesizerPool(max_models=4, max_memory=100)
+        self.sizes = {"a|default_vocoder": 60, "b|default_vocoder": 60}
+        pool.get("a")
+        pool.get("b")
+
+        self.assertEqual(pool.report()["models"], ["b|default_vocoder"])
+        self.assertEqual(pool.memory_usage(), 60)
+
+    def test_failed_load_is_not_cached_or_recorded(self):
+        pool = SynthesizerPool()
+
+        self.assertIsNone(pool.get("broken"))
+        self.assertIsNone(pool.get("broken"))
+        self.assertEqual(tts_utils.create_model.call_count, 2)
+        self.assertEqual(pool.stats.loads, {})
+        self.assertEqual(pool.report()["models"], [])
+
+    def test_hits_are_served_while_another_model_loads(self):
+        pool = SynthesizerPool(max_models=2)
+        pool.get("a")
+        loading, release = threading.Event(), threading.Event()
+
+        def slow_create_model(model, vocoder):
+            loading.set()
+            release.wait(5)
+            return f"{model}|{vocoder}"
+
+        tts_utils.create_model.side_effect = slow_create_model
+        loader = threading.Thread(target=pool.get, args=("b",))
+        loader.start()
+        try:
+            self.assertTrue(loading.wait(5))
+            self.assertEqual(pool.get("a"), "a|default_vocoder")
+        finally:
+            release.set()
+            loader.join(5)
+
+        self.assertEqual(pool.get("b"), "b|default_vocoder")
+        self.assertEqual(tts_utils.create_model.call_count, 2)
+
+
+class DiskCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = DiskCache(os.path.join(self.tmp.name, "cache"), max_size=250)
+
+    def source(self, name: str, size: int = 100) -> str:
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        return path
+
+    def test_put_then_get_copies_the_entry(self):
+        cached = self.cache.put("key", self.source("a.wav"), ".wav")
+        dest = os.path.join(self.tmp.name, "out", "a.wav")
+
+        self.assertEqual(cached, self.cache.path("key", ".wav"))
+        self.assertEqual(self.cache.get("key", dest, ".wav"), dest)
+        self.assertEqual(os.path.getsize(dest), 100)
+        self.assertNotEqual(os.stat(dest).st_ino, os.stat(cached).st_ino)
+        self.assertEqual(self.cache.lookup("key", ".wav"), cached)
+        self.assertEqual((self.cache.stats.hits, self.cache.stats.misses), (2, 0))
+
+    def test_get_of_a_missing_key_is_a_miss(self):
+        self.assertIsNone(self.cache.get("missing", os.path.join(self.tmp.name, "x")))
+        self.assertIsNone(self.cache.lookup("missing"))
+        self.assertEqual(self.cache.stats.misses, 2)
+
+    def test_put_evicts_the_least_recently_used_entries(self):
+        for index in range(2):
+            self.cache.put(f"key{index}", self.source(f"{index}.wav"))
+            os.utime(self.cache.path(f"key{index}"), (index, index))
+
+        self.cache.lookup("key0")
+        self.cache.put("key2", self.source("2.wav"))
+
+        self.assertEqual(self.cache.stats.evictions, 1)
+        self.assertEqual(self.cache.size(), 200)
+        self.assertIsNotNone(self.cache.lookup("key0"))
+        self.assertIsNone(self.cache.lookup("key1"))
+        self.assertIsNotNone(self.cache.lookup("key2"))
+
+    def test_put_only_walks_the_directory_when_over_its_size(self):
+        self.cache.put("key0", self.source("0.wav"))
+        with mock.patch.object(
+            DiskCache, "_entries", autospec=True, side_effect=DiskCache._entries
+        ) as entries:
+            self.cache.put("key1", self.source("1.wav"))
+            self.assertEqual(entries.call_count, 0)
+
+            self.cache.put("key2", self.source("2.wav"))
+            self.assertEqual(entries.call_count, 1)
+
+        self.assertEqual(self.cache.size(), 200)
+
+    def test_report_gives_the_running_size(self):
+        self.cache.put("key0", self.source("0.wav"))
+        with mock.patch.object(DiskCache, "_entries") as entries:
+            self.cache.put("key1", self.source("1.wav", size=50))
+            report = self.cache.report()
+
+        entries.assert_not_called()
+        self.assertEqual(report["size"], 150)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 100.0
+        self.sleeps = []
+
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            self.now += seconds
+
+        patches = [
+            mock.patch.object(
+                tts_utils.time, "monotonic", side_effect=lambda: self.now
+            ),
+            mock.patch.object(tts_utils.time, "sleep", side_effect=sleep),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_bursts_up_to_the_capacity_then_waits_for_the_rate(self):
+        bucket = TokenBucket(rate=2, capacity=3)
+        for _ in range(3):
+            bucket.acquire()
+
+        self.assertEqual(self.sleeps, [])
+
+        bucket.acquire()
+        self.assertEqual(self.sleeps, [0.5])
+
+    def test_refills_with_time_but_not_past_the_capacity(self):
+        bucket = TokenBucket(rate=1, capacity=2)
+        bucket.acquire()
+        bucket.acquire()
+        self.now += 60
+
+        for _ in range(2):
+            bucket.acquire()
+        self.assertEqual(self.sleeps, [])
+
+        bucket.acquire()
+        self.assertEqual(self.sleeps, [1.0])
+
+
+class StubVits:
+    """
+    Stands in for a VITS model: every token gives two frames of `hop_length` samples, and the output of
+    the padded batch items is filled with ones, so only the mask tells the real length of an item.
+    """
+
+    config = SimpleNamespace(audio=SimpleNamespace(hop_length=4))
+    tokenizer = SimpleNamespace(text_to_ids=lambda text: list(range(len(text))))
+
+    def __init__(self):
+        self.batches = []
+
+    def parameters(self):
+        yield tts_utils.torch.zeros(1)
+
+    def inference(self, x, aux_input):
+        torch = tts_utils.torch
+        lengths = aux_input["x_lengths"]
+        self.batches.append(lengths.tolist())
+        frames = lengths * 2
+        y_mask = torch.arange(int(frames.max()))[None, :] < frames[:, None]
+        return {
+            "model_outputs": torch.ones((len(lengths), 1, int(frames.max()) * 4)),
+            "y_mask": y_mask.unsqueeze(1).float(),
+        }
+
+
+class SaveBatchTests(SimpleTestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(
+                tts_utils, "speech_cache_key", side_effect=lambda syn, text: text
+            ),
+            mock.patch.object(tts_utils, "load_cached_speech", return_value=None),
+            mock.patch.object(tts_utils, "cache_speech"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.saved = {}
+        self.syn = SimpleNamespace(
+            tts_model=StubVits(),
+            save_wav=lambda wav, path: self.saved.update({path: len(wav)}),
+        )
+
+    def test_trims_every_item_to_its_masked_length(self):
+        texts = ["abc", "a", "ab"]
+        paths = ["0.wav", "1.wav", "2.wav"]
+
+        self.assertEqual(save_batch(self.syn, texts, paths, batch_size=2), paths)
+
+        self.assertEqual(self.syn.tts_model.batches, [[1, 2], [3]])
+        self.assertEqual(self.saved, {"0.wav": 24, "1.wav": 8, "2.wav": 16})
+
+    def test_make_scenes_speech_falls_back_to_one_sentence_at_a_time(self):
+        video = SimpleNamespace(
+            voice_model=SimpleNamespace(batched=True, type="Local"),
+            dir_name="dir",
+            prompt="prompt",
+        )
+        lines = [("First.", False), ("Second.", True)]
+        with mock.patch.multiple(
+            audio_utils,
+            get_script_lines=mock.Mock(return_value=lines),
+            get_syn=mock.Mock(return_value=self.syn),
+            make_scenes_speech_batched=mock.Mock(side_effect=RuntimeError("oom")),
+            make_scene_speech=mock.DEFAULT,
+            log_speech_stats=mock.DEFAULT,
+        ) as patched:
+            audio_utils.make_scenes_speech(video)
+
+        self.assertEqual(
+            patched["make_scene_speech"].call_args_list,
+            [
+                mock.call(
+                    video.voice_model, "dir", "prompt", text, is_last, syn=self.syn
+                )
+                for text, is_last in lines
+            ],
+        )
+
+
+class BatchWindowTests(SimpleTestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_mel_windows_match_the_loop(self):
+        # The last case has fewer mel frames than a window, so both ends are clamped.
+        for num_frames, mel_frames in ((1, 16), (50, 160), (251, 803), (10, 5)):
+            spec = self.rng.random((mel_frames, 80), dtype=np.float32)
+            with self.subTest(num_frames=num_frames, mel_frames=mel_frames):
+                result = mel_windows(spec, num_frames, 25, 16)
+                self.assertEqual(result.shape, (num_frames, 80, 16))
+                np.testing.assert_array_equal(
+                    result, loop_mel_windows(spec, num_frames)
+                )
+
+    def test_semantic_windows_match_the_loop(self):
+        # Sequences shorter than the 27 frame window are padded on both sides.
+        for num_frames in (1, 5, 27, 200):
+            coeff_3dmm = self.rng.random((num_frames, 73))
+            with self.subTest(num_frames=num_frames):
+                result = np.array(semantic_windows(coeff_3dmm, 13))
+                self.assertEqual(result.shape, (num_frames, 73, 27))
+                np.testing.assert_array_equal(result, loop_semantic_windows(coeff_3dmm))
+
+
+class ChunkTests(SimpleTestCase):
+    def test_split_frames(self):
+        self.assertEqual(split_frames(30, 40, 4), [(0, 30)])
+        self.assertEqual(split_frames(80, 40, 4), [(0, 40), (40, 80)])
+        self.assertEqual(split_frames(100, 40, 4), [(0, 40), (40, 80), (80, 100)])
+
+    def test_split_frames_merges_a_tail_too_short_to_blend(self):
+        self.assertEqual(split_frames(85, 40, 4), [(0, 40), (40, 85)])
+        self.assertEqual(split_frames(85, 40, 0), [(0, 40), (40, 80), (80, 85)])
+
+    def test_blend_coeffs_of_a_single_chunk_is_the_chunk(self):
+        coeffs = np.arange(30.0).reshape(10, 3)
+        np.testing.assert_allclose(blend_coeffs([(0, coeffs)], 10, 2), coeffs)
+
+    def test_blend_coeffs_crossfades_the_shared_frames(self):
+        chunks = [(0, np.full((12, 1), 1.0)), (8, np.full((12, 1), 3.0))]
+        result = blend_coeffs(chunks, 20, 2)[:, 0]
+
+        np.testing.assert_allclose(result[:8], 1.0)
+        np.testing.assert_allclose(result[8:12], [1.25, 1.75, 2.25, 2.75])
+        np.testing.assert_allclose(result[12:], 3.0)
+
+    def test_blend_coeffs_rebuilds_a_sequence_cut_in_overlapping_chunks(self):
+        sequence = np.random.default_rng(0).random((100, 5))
+        overlap = 3
+        chunks = [
+            (
+                max(first - overlap, 0),
+                sequence[max(first - overlap, 0) : last + overlap],
+            )
+            for first, last in split_frames(100, 30, overlap)
+        ]
+        np.testing.assert_allclose(blend_coeffs(chunks, 100, overlap), sequence)
+
+
+class SilentFramesTests(SimpleTestCase):
+    def mels(self, num_frames: int, silences: list[tuple[int, int]]) -> np.ndarray:
+        mels = np.zeros((num_frames, 80, 16))
+        for start, end in silences:
+            mels[start:end] = -4.0
+        return mels
+
+    def expected(self, num_frames: int, runs: list[tuple[int, int]]) -> np.ndarray:
+        flags = np.zeros(num_frames, dtype=bool)
+        for start, end in runs:
+            flags[start:end] = True
+        return flags
+
+    def test_flags_long_silences_less_the_margins(self):
+        flags = silent_frames(self.mels(100, [(0, 30), (50, 90)]))
+        np.testing.assert_array_equal(flags, self.expected(100, [(4, 26), (54, 86)]))
+
+    def test_ignores_silences_shorter_than_min_frames(self):
+        flags = silent_frames(self.mels(100, [(10, 34)]))
+        self.assertFalse(flags.any())
+
+    def test_a_single_loud_mel_bin_breaks_the_silence(self):
+        mels = self.mels(100, [(10, 70)])
+        mels[40, 5, 3] = -2.0
+
+        flags = silent_frames(mels)
+        np.testing.assert_array_equal(flags, self.expected(100, [(14, 36), (45, 66)]))
+
+
+def stereo(length: int, value: float) -> np.ndarray:
+    return np.full((length, 2), value, dtype=np.float32)
+
+
+class AudioTimelineTests(SimpleTestCase):
+    def setUp(self):
+        self.sources = {
+            "a.wav": stereo(10, 0.1),
+            "b.wav": stereo(5, 0.2),
+            "blank.wav": stereo(3, 0.0),
+            "video.mp4": stereo(6, 0.2),
+            "music.mp3": stereo(7, 1.0),
+        }
+        patch = mock.patch.object(
+            timeline_utils,
+            "decode_audio",
+            side_effect=lambda path, sample_rate: self.sources[path],
+        )
+        self.decode_audio = patch.start()
+        self.addCleanup(patch.stop)
+
+    def plan(self, speech=None, tail=(), visual=None) -> ScenePlan:
+        scene_image = SimpleNamespace(file=SimpleNamespace(path=visual))
+        return ScenePlan(
+            scene=None,
+            scene_image=scene_image if visual else None,
+            duration=0.0,
+            speech=speech,
+            tail=list(tail),
+            mix_visual_audio=bool(visual),
+        )
+
+    def test_lays_the_scenes_out_one_after_the_other(self):
+        timeline = build_timeline(
+            [
+                self.plan("a.wav"),
+                self.plan("b.wav", tail=["blank.wav"]),
+                self.plan(tail=["blank.wav"]),
+            ],
+            sample_rate=10,
+        )
+
+        self.assertEqual(timeline.spans, [(0, 10), (10, 18), (18, 21)])
+        self.assertEqual(timeline.duration, 2.1)
+        np.testing.assert_array_equal(timeline.scene(0), self.sources["a.wav"])
+        np.testing.assert_array_equal(timeline.scene(1)[:5], self.sources["b.wav"])
+        np.testing.assert_array_equal(timeline.samples[15:], 0.0)
+        # Every source is decoded once, however many scenes use it.
+        self.assertEqual(self.decode_audio.call_count, 3)
+
+    def test_the_spans_set_the_durations_over_the_probed_ones(self):
+        # MP3 data in a .wav file is decoded to more samples than ffprobe estimates.
+        self.sources["a.wav"] = stereo(13, 0.1)
+        self.sources["b.wav"] = stereo(7, 0.2)
+        plans = [
+            ScenePlan(scene=None, scene_image=None, duration=1.2, speech="a.wav"),
+            ScenePlan(scene=None, scene_image=None, duration=0.6, speech="b.wav"),
+        ]
+
+        timeline = build_timeline(plans, sample_rate=10)
+
+        self.assertEqual([plan.duration for plan in plans], [1.3, 0.7])
+        self.assertEqual(timeline.durations, [1.3, 0.7])
+        self.assertEqual(timeline.offsets, [0.0, 1.3])
+        # The segments are cut to the frames of the spans, which add up to the audio.
+        self.assertEqual(scene_frames(timeline), [31, 17])
+        self.assertEqual(sum(scene_frames(timeline)), to_frames(timeline.duration))
+
+    def test_mixes_the_audio_of_a_scene_video_over_its_speech(self):
+        timeline = build_timeline(
+            [self.plan("b.wav", visual="video.mp4")], sample_rate=10
+        )
+
+        self.assertEqual(timeline.spans, [(0, 6)])
+        np.testing.assert_allclose(timeline.samples[:5], 0.4)
+        np.testing.assert_allclose(timeline.samples[5:], 0.2)
+
+    def test_mix_without_music_is_the_narration(self):
+        timeline = build_timeline([self.plan("a.wav")], sample_rate=10)
+        video = SimpleNamespace(music=None, settings={})
+
+        self.assertIs(timeline.mix(video), timeline.samples)
+
+    def test_mix_loops_scales_and_fades_the_music(self):
+        self.sources["a.wav"] = stereo(100, 0.0)
+        timeline = build_timeline([self.plan("a.wav")], sample_rate=10)
+        video = SimpleNamespace(
+            music=SimpleNamespace(file=SimpleNamespace(path="music.mp3")),
+            settings={"music_volume": 0.5},
+        )
+
+        mix = timeline.mix(video)[:, 0]
+        ramp = np.linspace(0.0, 1.0, 10) * 0.5
+        np.testing.assert_allclose(mix[:10], ramp, rtol=1e-6)
+        np.testing.assert_allclose(mix[10:90], 0.5)
+        np.testing.assert_allclose(mix[90:], ramp[::-1], rtol=1e-6)
+
+    def test_ducking_lowers_the_music_under_the_speech(self):
+        sample_rate = 1000
+        narration = stereo(2010, 0.0)
+        narration[1000:] = 0.5
+        music = stereo(2010, 1.0)
+
+        apply_ducking(music, narration, 0.5, 0.1, sample_rate)
+
+        np.testing.assert_allclose(music[:600], 0.5, rtol=1e-6)
+        np.testing.assert_allclose(music[1400:], 0.1, rtol=1e-5)
+        transition = music[600:1400, 0]
+        self.assertTrue(np.all(np.diff(transition) <= 1e-7))
+
+
+class SegmentTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.image = self.write("scene.png", b"image")
+
+    def write(self, name: str, data: bytes = b"") -> str:
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def segment(self, chain: str = "scale=1080:1920") -> Segment:
+        graph = FilterGraph()
+        index = graph.add_input(self.image, "-loop", "1")
+        label = graph.add(f"{index}:v", chain)
+        return Segment(name="scene", frames=30, graph=graph, label=label)
+
+    def test_fingerprint_is_stable_for_the_same_command_and_inputs(self):
+        self.assertEqual(self.segment().fingerprint(), self.segment().fingerprint())
+
+    def test_fingerprint_changes_with_the_command(self):
+        self.assertNotEqual(
+            self.segment().fingerprint(), self.segment("scale=720:1280").fingerprint()
+        )
+
+    def test_fingerprint_changes_with_the_signature_of_an_input(self):
+        before = self.segment().fingerprint()
+        self.write("scene.png", b"another image")
+        os.utime(self.image, ns=(0, 0))
+
+        self.assertNotEqual(self.segment().fingerprint(), before)
+
+    def test_prune_segments_keeps_only_the_current_files(self):
+        current = self.write("current.mp4")
+        self.write("stale.mp4")
+        self.write("list.txt")
+
+        prune_segments(self.tmp.name, {current})
+
+        self.assertEqual(
+            sorted(os.listdir(self.tmp.name)), ["current.mp4", "list.txt", "scene.png"]
+        )
+
+
+class RenditionTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.source = os.path.join(self.tmp.name, "scene.png")
+        Image.new("RGB", (40, 30), (200, 10, 10)).save(self.source)
+        with open(self.source, "rb") as f:
+            self.original = f.read()
+
+    def scene_image(self, background=None) -> SimpleNamespace:
+        patch = mock.patch.object(rendition_utils, "Video")
+        videos = patch.start().objects.filter.return_value.select_related.return_value
+        videos.first.return_value = SimpleNamespace(background=background)
+        self.addCleanup(patch.stop)
+        return SimpleNamespace(
+            file=SimpleNamespace(path=self.source), scene=SimpleNamespace(prompt_id=1)
+        )
+
+    def test_leaves_the_source_unchanged_and_reuses_the_rendition(self):
+        path = get_rendition(self.source, (20, 16))
+
+        with open(self.source, "rb") as f:
+            self.assertEqual(f.read(), self.original)
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (20, 16))
+
+        mtime = os.stat(path).st_mtime_ns
+        with mock.patch.object(rendition_utils.Image, "open") as open_image:
+            self.assertEqual(get_rendition(self.source, (20, 16)), path)
+            open_image.assert_not_called()
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+    def test_a_new_size_or_format_gets_a_new_file(self):
+        paths = {
+            get_rendition(self.source, (20, 16)),
+            get_rendition(self.source, (10, 8)),
+            get_rendition(self.source, (20, 16), "jpeg"),
+        }
+
+        self.assertEqual(len(paths), 3)
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+    def test_prepare_scene_image_resizes_to_the_frame_of_the_background(self):
+        background = SimpleNamespace(file=SimpleNamespace(path="background.mp4"))
+        scene_image = self.scene_image(background)
+        with mock.patch.object(
+            rendition_utils, "scene_frame_size", return_value=(20, 16)
+        ):
+            path = prepare_scene_image(scene_image)
+
+        self.assertEqual(path, rendition_path(self.source, (20, 16)))
+        self.assertTrue(os.path.exists(path))
+
+    def test_prepare_scene_image_without_a_background_is_skipped(self):
+        self.assertIsNone(prepare_scene_image(self.scene_image()))
+        self.assertFalse(
+            os.path.exists(os.path.join(self.tmp.name, rendition_utils.RENDITIONS_DIR))
+        )
+
+    def test_saving_a_scene_image_prepares_its_rendition(self):
+        instance = SimpleNamespace()
+        with mock.patch.object(signals, "prepare_scene_image") as prepare:
+            post_save.send(sender=SceneImage, instance=instance, created=True)
+
+        prepare.assert_called_once_with(instance)
+
+
+class ColorkeyAlphaTests(SimpleTestCase):
+    def test_keys_the_color_and_keeps_the_distant_colors(self):
+        pixels = np.array([[[0, 255, 0], [255, 0, 255], [10, 250, 5]]], dtype=np.uint8)
+
+        alpha = colorkey_alpha(pixels, (0, 255, 0), 0.1)
+
+        self.assertEqual(alpha.shape, (1, 3, 1))
+        np.testing.assert_allclose(alpha[0, :, 0], [0.0, 1.0, 0.0])
+
+    def test_blends_just_past_the_similarity(self):
+        pixels = np.full((2, 2, 3), 30, dtype=np.uint8)
+
+        alpha = colorkey_alpha(pixels, (0, 0, 0), 0.1)
+
+        np.testing.assert_allclose(alpha, (30 / 255 - 0.1) / KEY_BLEND, rtol=1e-5)
@@ -9,6 +9,7 @@ from .views.generate_view import GenerateView
 from .views.scene_view import SceneView
 from .views.video_view import VideoView
 from .views.twitch_views import generate_twitch
+from .views.job_views import job_status
 
 from rest_framework import routers
 from django.urls import path
@@ -28,6 +29,7 @@ router.register("outro", OutroView)
 
 urlpatterns = [
     path("twitch_generate/", generate_twitch),
+    path("jobs/<str:job_id>/", job_status),
 ]
 
 
@@ -1,5 +1,13 @@
+import multiprocessing
 import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import torch
+from pydub import AudioSegment
+from scipy.io import loadmat, savemat, wavfile
 from time import  strftime
 import os
 import sys
@@ -8,115 +16,431 @@ from .src.utils.preprocess import CropAndExtract
 from .src.test_audio2coeff import Audio2Coeff
 from .src.facerender.animate import AnimateFromCoeff
 from .src.generate_batch import get_data
-from .src.generate_facerender_batch import get_facerender_data
+from .src.generate_facerender_batch import get_facerender_data, trim_facerender_data
 from .src.utils.init_path import init_path
 from .src.facerender.pirender_animate import AnimateFromCoeff_PIRender
+from .src.utils.videoio import concat_videos, write_frames
 from django.conf import settings
 
-def lip(source_image,   result_dir = './results', pose_style= 0 , cpu=False, batch_size = 2, input_yaw = None,
-        input_pitch = None, input_roll = None, ref_eyeblink = None, ref_pose = None, checkpoint_dir = './checkpoints',
-        preprocess = 'crop', still = True, size = 256, verbose = True, enhancer = None, background_enhancer = None,
-        expression_scale = 1, driven_audio = './examples/driven_audio/bus_chinese.wav', old_version = None,
-        face3dvis = None, facerender = 'facevid2vid'):
-
-    #torch.backends.cudnn.enabled = False
-    if torch.cuda.is_available() and not cpu:
-        device = "cuda"
-    else:
-        device = "cpu"
-
-
-
-    pic_path = source_image
-    audio_path = driven_audio
-    save_dir = os.path.join(result_dir, strftime("%Y_%m_%d_%H.%M.%S"))
-    os.makedirs(save_dir, exist_ok=True)
-    pose_style = pose_style
-    batch_size = batch_size
-    input_yaw_list = input_yaw
-    input_pitch_list = input_pitch
-    input_roll_list = input_roll
-    ref_eyeblink = ref_eyeblink
-    ref_pose = ref_pose
-
-    current_root_path = os.path.split(sys.argv[0])[0]
-
-    sadtalker_paths = init_path(checkpoint_dir, os.path.join(current_root_path, settings.CONFIG_PATH), size, old_version,
-                                preprocess)
-
-    #init model
-    preprocess_model = CropAndExtract(sadtalker_paths, device)
-
-    audio_to_coeff = Audio2Coeff(sadtalker_paths,  device)
-
-    if facerender == 'facevid2vid':
-        animate_from_coeff = AnimateFromCoeff(sadtalker_paths, device)
-    elif facerender == 'pirender':
-        animate_from_coeff = AnimateFromCoeff_PIRender(sadtalker_paths, device)
-    else:
-        raise (RuntimeError('Unknown model: {}'.format(facerender)))
-
-
-
-
-    #crop image and extract 3dmm from image
-    first_frame_dir = os.path.join(save_dir, 'first_frame_dir')
-    os.makedirs(first_frame_dir, exist_ok=True)
-    print('3DMM Extraction for source image')
-    first_coeff_path, crop_pic_path, crop_info = preprocess_model.generate(pic_path, first_frame_dir, preprocess,\
-                                                                           source_image_flag=True, pic_size=size)
-    if first_coeff_path is None:
-        print("Can't get the coeffs of the input")
-        return
-
-    if ref_eyeblink is not None:
-        ref_eyeblink_videoname = os.path.splitext(os.path.split(ref_eyeblink)[-1])[0]
-        ref_eyeblink_frame_dir = os.path.join(save_dir, ref_eyeblink_videoname)
-        os.makedirs(ref_eyeblink_frame_dir, exist_ok=True)
-        print('3DMM Extraction for the reference video providing eye blinking')
-        ref_eyeblink_coeff_path, _, _ =  preprocess_model.generate(ref_eyeblink, ref_eyeblink_frame_dir, preprocess,
-                                                                   source_image_flag=False)
-    else:
-        ref_eyeblink_coeff_path=None
-
-    if ref_pose is not None:
-        if ref_pose == ref_eyeblink: 
-            ref_pose_coeff_path = ref_eyeblink_coeff_path
+_models = {}
+_models_lock = threading.Lock()
+_load_locks = {}
+_render_pools = {}
+
+FPS = 25
+# The frames of coefficients kept around every rendered chunk, the radius of the semantic windows.
+SEMANTIC_RADIUS = 13
+# The length of the idle loop filling the silent stretches, long enough for a blink or two.
+IDLE_SECONDS = 4
+
+
+class LipSyncModels:
+    """
+    The SadTalker models of one configuration, loaded once and kept resident between jobs.
+
+    Loading the retinaface and FAN models of the keypoint extractor, the 3DMM reconstruction network, the
+    audio to coefficient networks and the face renderer takes seconds to minutes on CPU, so every job of a
+    process reuses the same instances. Jobs are serialized by `lock`, since the models are not thread safe.
+    """
+
+    def __init__(self, checkpoint_dir='./checkpoints', size=256, old_version=None, preprocess='crop',
+                 facerender='facevid2vid', cpu=False):
+        self.model_options = dict(checkpoint_dir=checkpoint_dir, size=size, old_version=old_version,
+                                  preprocess=preprocess, facerender=facerender, cpu=cpu)
+        if torch.cuda.is_available() and not cpu:
+            self.device = "cuda"
         else:
-            ref_pose_videoname = os.path.splitext(os.path.split(ref_pose)[-1])[0]
-            ref_pose_frame_dir = os.path.join(save_dir, ref_pose_videoname)
-            os.makedirs(ref_pose_frame_dir, exist_ok=True)
-            print('3DMM Extraction for the reference video providing pose')
-            ref_pose_coeff_path, _, _ =  preprocess_model.generate(ref_pose, ref_pose_frame_dir, preprocess,
-                                                                   source_image_flag=False)
-    else:
-        ref_pose_coeff_path=None
-
-    #audio2ceoff
-    batch = get_data(first_coeff_path, audio_path, device, ref_eyeblink_coeff_path, still=still)
-    coeff_path = audio_to_coeff.generate(batch, save_dir, pose_style, ref_pose_coeff_path)
-
-    # 3dface render
-    if face3dvis:
-        from src.face3d.visualize import gen_composed_video
-        gen_composed_video(device, first_coeff_path, coeff_path, audio_path, os.path.join(save_dir, '3dface.mp4'))
-    
-    #coeff2video
-    data = get_facerender_data(coeff_path, crop_pic_path, first_coeff_path, audio_path, 
-                               batch_size, input_yaw_list, input_pitch_list, input_roll_list,
-                               expression_scale=expression_scale, still_mode=still, preprocess=preprocess, size=size)
-    
-    result = animate_from_coeff.generate(data, save_dir, pic_path, crop_info, enhancer=enhancer,
-                                         background_enhancer=background_enhancer, preprocess=preprocess, img_size=size)
-    
-    shutil.move(result, save_dir+'.mp4')
-    print('The generated video is named:', save_dir+'.mp4')
-
-    if not verbose:
-        shutil.rmtree(save_dir)
-
-    return save_dir+'.mp4'
+            self.device = "cpu"
+
+        start = time.perf_counter()
+        current_root_path = os.path.split(sys.argv[0])[0]
+        self.paths = init_path(checkpoint_dir, os.path.join(current_root_path, settings.CONFIG_PATH), size,
+                               old_version, preprocess)
+
+        self.facerender = facerender
+        self.preprocess_model = CropAndExtract(self.paths, self.device)
+        self.audio_to_coeff = Audio2Coeff(self.paths, self.device)
+
+        if facerender == 'facevid2vid':
+            self.animate_from_coeff = AnimateFromCoeff(self.paths, self.device)
+        elif facerender == 'pirender':
+            self.animate_from_coeff = AnimateFromCoeff_PIRender(self.paths, self.device)
+        else:
+            raise (RuntimeError('Unknown model: {}'.format(facerender)))
+
+        self.load_time = time.perf_counter() - start
+        self.jobs = 0
+        self.last_timings = {}
+        self.lock = threading.Lock()
+
+    def extract_source(self, source_image, save_dir, preprocess='crop', size=256):
+        """
+        Crop the source image and extract its landmarks and 3DMM coefficients into `save_dir`.
+
+        Returns the (first_coeff_path, crop_pic_path, crop_info) of the image.
+        """
+        os.makedirs(save_dir, exist_ok=True)
+        print('3DMM Extraction for source image')
+        return self.preprocess_model.generate(source_image, save_dir, preprocess, source_image_flag=True,
+                                              pic_size=size)
+
+    def generate(self, source_image, driven_audio, result_dir='./results', pose_style=0, batch_size=2,
+                 input_yaw=None, input_pitch=None, input_roll=None, ref_eyeblink=None, ref_pose=None,
+                 preprocess='crop', still=True, size=256, verbose=True, enhancer=None, background_enhancer=None,
+                 expression_scale=1, face3dvis=None, source=None, frame_chunk=1, chunk_seconds=0,
+                 chunk_overlap=1.0, chunk_workers=1, idle_loop=False):
+        """
+        Animate `source_image` with `driven_audio`.
+
+        `source` is the (first_coeff_path, crop_pic_path, crop_info) of the image when they were extracted
+        ahead, otherwise they are extracted here. `frame_chunk` is the number of frames rendered per call
+        of the face renderer.
+
+        Audio longer than twice `chunk_seconds` is animated in chunks, see `generate_chunks`. With
+        `idle_loop`, the silent stretches of the audio are filled from the idle loop of the source instead
+        of being rendered, see `idle_loop`.
+
+        Returns the path of the generated video, or None if no face was found in the image, and the time
+        spent in every stage in seconds.
+        """
+        with self.lock:
+            timings = {}
+            save_dir = os.path.join(result_dir, strftime("%Y_%m_%d_%H.%M.%S"))
+            os.makedirs(save_dir, exist_ok=True)
+
+            #crop image and extract 3dmm from image, unless the caller already has them
+            start = time.perf_counter()
+            if source is None:
+                source = self.extract_source(source_image, os.path.join(save_dir, 'first_frame_dir'), preprocess,
+                                             size)
+            first_coeff_path, crop_pic_path, crop_info = source
+            if first_coeff_path is None:
+                print("Can't get the coeffs of the input")
+                return None, timings
+
+            if ref_eyeblink is not None:
+                ref_eyeblink_videoname = os.path.splitext(os.path.split(ref_eyeblink)[-1])[0]
+                ref_eyeblink_frame_dir = os.path.join(save_dir, ref_eyeblink_videoname)
+                os.makedirs(ref_eyeblink_frame_dir, exist_ok=True)
+                print('3DMM Extraction for the reference video providing eye blinking')
+                ref_eyeblink_coeff_path, _, _ =  self.preprocess_model.generate(
+                    ref_eyeblink, ref_eyeblink_frame_dir, preprocess, source_image_flag=False)
+            else:
+                ref_eyeblink_coeff_path=None
+
+            if ref_pose is not None:
+                if ref_pose == ref_eyeblink:
+                    ref_pose_coeff_path = ref_eyeblink_coeff_path
+                else:
+                    ref_pose_videoname = os.path.splitext(os.path.split(ref_pose)[-1])[0]
+                    ref_pose_frame_dir = os.path.join(save_dir, ref_pose_videoname)
+                    os.makedirs(ref_pose_frame_dir, exist_ok=True)
+                    print('3DMM Extraction for the reference video providing pose')
+                    ref_pose_coeff_path, _, _ =  self.preprocess_model.generate(
+                        ref_pose, ref_pose_frame_dir, preprocess, source_image_flag=False)
+            else:
+                ref_pose_coeff_path=None
+            timings['preprocess'] = time.perf_counter() - start
+
+            # the frames are rendered one batch item at a time, `batch_size` times as many per call
+            data_options = dict(input_yaw_list=input_yaw, input_pitch_list=input_pitch,
+                                input_roll_list=input_roll, expression_scale=expression_scale,
+                                still_mode=still, preprocess=preprocess, size=size)
+            render_options = dict(enhancer=enhancer, background_enhancer=background_enhancer,
+                                  preprocess=preprocess, img_size=size, frame_chunk=frame_chunk * batch_size)
+
+            if chunk_seconds and audio_frames(driven_audio) > 2 * chunk_seconds * FPS:
+                result = self.generate_chunks(source_image, driven_audio, save_dir, source, ref_eyeblink_coeff_path,
+                                              ref_pose_coeff_path, pose_style, still, data_options, render_options,
+                                              int(chunk_seconds * FPS), int(chunk_overlap * FPS), chunk_workers,
+                                              idle_loop, timings)
+                return self.finish(result, save_dir, verbose, timings)
+
+            #audio2ceoff
+            start = time.perf_counter()
+            batch = get_data(first_coeff_path, driven_audio, self.device, ref_eyeblink_coeff_path, still=still)
+            coeff_path = self.audio_to_coeff.generate(batch, save_dir, pose_style, ref_pose_coeff_path)
+            timings['audio2coeff'] = time.perf_counter() - start
+
+            # 3dface render
+            if face3dvis:
+                from src.face3d.visualize import gen_composed_video
+                gen_composed_video(self.device, first_coeff_path, coeff_path, driven_audio,
+                                   os.path.join(save_dir, '3dface.mp4'))
+
+            #coeff2video
+            start = time.perf_counter()
+            idle = None
+            if idle_loop and batch['silent'].any():
+                idle = self.idle_loop(source, save_dir, still, data_options, render_options)
+            timings['idle_loop'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            result = self.render_coeffs(coeff_path, crop_pic_path, first_coeff_path, driven_audio, save_dir,
+                                        source_image, crop_info, data_options, render_options,
+                                        silent=batch['silent'], idle=idle)
+            timings['facerender'] = time.perf_counter() - start
+            if idle:
+                print('Filled {} silent frames from the idle loop'.format(int(batch['silent'].sum())))
+
+            return self.finish(result, save_dir, verbose, timings)
+
+    def finish(self, result, save_dir, verbose, timings):
+        shutil.move(result, save_dir+'.mp4')
+        print('The generated video is named:', save_dir+'.mp4')
+
+        if not verbose:
+            shutil.rmtree(save_dir)
+
+        self.jobs += 1
+        self.last_timings = timings
+        return save_dir+'.mp4', timings
+
+    def generate_chunks(self, source_image, driven_audio, save_dir, source, ref_eyeblink_coeff_path,
+                        ref_pose_coeff_path, pose_style, still, data_options, render_options, chunk_frames,
+                        overlap, workers, idle_loop, timings):
+        """
+        Animate long audio in chunks of `chunk_frames` frames, so the memory of every stage is bounded by the
+        chunk and the chunks can be rendered by `workers` processes at once.
+
+        Every chunk of audio is run through the audio to coefficient networks with `overlap` frames of the
+        neighbouring chunks on both sides, and the coefficients of two chunks are crossfaded over their
+        shared frames so the head pose and the expression do not jump at the seams. The blended sequence is
+        cut back into chunks, each rendered with the semantic windows of its neighbours, and the chunk
+        videos are joined without re-encoding under the original audio.
+
+        Returns the path of the joined video.
+        """
+        first_coeff_path, crop_pic_path, crop_info = source
+        sound = AudioSegment.from_file(driven_audio)
+        num_frames = audio_frames(driven_audio)
+        overlap = max(0, min(overlap, chunk_frames // 4))
+        chunks = split_frames(num_frames, chunk_frames, overlap)
+        print('Animating {} frames in {} chunks'.format(num_frames, len(chunks)))
+
+        #audio2coeff of every chunk with its overlap, blended at the seams
+        start = time.perf_counter()
+        coeffs = []
+        silent = np.zeros(num_frames, dtype=bool)
+        for index, (first, last) in enumerate(chunks):
+            first, last = max(0, first - overlap), min(num_frames, last + overlap)
+            chunk_audio = os.path.join(save_dir, 'chunk_{:04d}.wav'.format(index))
+            sound[first * 1000 // FPS:last * 1000 // FPS].export(chunk_audio, format='wav')
+
+            batch = get_data(first_coeff_path, chunk_audio, self.device, ref_eyeblink_coeff_path, still=still)
+            coeff_path = self.audio_to_coeff.generate(batch, save_dir, pose_style)
+            coeffs.append((first, fit_frames(loadmat(coeff_path)['coeff_3dmm'], last - first)))
+            count = min(len(batch['silent']), last - first)
+            silent[first:first + count] = batch['silent'][:count]
+
+        blended = blend_coeffs(coeffs, num_frames, overlap)
+        if ref_pose_coeff_path is not None:
+            blended = self.audio_to_coeff.using_refpose(blended, ref_pose_coeff_path)
+        timings['audio2coeff'] = time.perf_counter() - start
+
+        idle = None
+        if idle_loop and silent.any():
+            idle = self.idle_loop(source, save_dir, still, data_options, render_options)
+
+        #coeff2video of every chunk, with the semantic radius of context on both sides
+        start = time.perf_counter()
+        jobs = []
+        for index, (first, last) in enumerate(chunks):
+            chunk_dir = os.path.join(save_dir, 'chunk_{:04d}'.format(index))
+            os.makedirs(chunk_dir, exist_ok=True)
+            context = max(0, first - SEMANTIC_RADIUS)
+            coeff_path = os.path.join(chunk_dir, 'chunk_{:04d}.mat'.format(index))
+            savemat(coeff_path, {'coeff_3dmm': blended[context:min(num_frames, last + SEMANTIC_RADIUS)]})
 
+            audio_path = os.path.join(chunk_dir, 'audio.wav')
+            sound[first * 1000 // FPS:last * 1000 // FPS].export(audio_path, format='wav')
 
+            jobs.append(dict(coeff_path=coeff_path, crop_pic_path=crop_pic_path, first_coeff_path=first_coeff_path,
+                             audio_path=audio_path, save_dir=chunk_dir, source_image=source_image,
+                             crop_info=crop_info, data_options=data_options, render_options=render_options,
+                             lead=first - context, frames=last - first, silent=silent[first:last], idle=idle))
 
+        pool = self.render_pool(workers) if len(jobs) > 1 else None
+        if pool is None:
+            paths = [self.render_coeffs(**job) for job in jobs]
+        else:
+            paths = list(pool.map(render_chunk, [self.model_options] * len(jobs), jobs))
+        timings['facerender'] = time.perf_counter() - start
+
+        return concat_videos(paths, driven_audio, os.path.join(save_dir, 'chunks.mp4'))
+
+    def render_coeffs(self, coeff_path, crop_pic_path, first_coeff_path, audio_path, save_dir, source_image,
+                      crop_info, data_options, render_options, lead=0, frames=None, silent=None, idle=None):
+        """
+        Render the frames `lead` to `lead + frames` of a coefficient file, muxed with `audio_path`.
+
+        The frames flagged in `silent` are taken from the `idle` loop video instead of being rendered.
+        """
+        data = get_facerender_data(coeff_path, crop_pic_path, first_coeff_path, audio_path, 1, **data_options)
+        if frames is not None:
+            trim_facerender_data(data, lead, frames)
+
+        if idle and silent is not None and silent.any():
+            count = data['frame_num']
+            data['silent'] = np.pad(silent[:count], (0, max(0, count - len(silent))))
+            data['idle'] = idle
+
+        return self.animate_from_coeff.generate(data, save_dir, source_image, crop_info, **render_options)
+
+    def idle_loop(self, source, save_dir, still, data_options, render_options):
+        """
+        Return the idle loop video of a source: the face rendered on a few seconds of silence, blinking.
+
+        The loop is kept next to the coefficients of the source, in the avatar cache when the source was
+        preprocessed ahead, so it is rendered once per avatar and every silent stretch of the audio after
+        that is filled from it without running the renderer.
+        """
+        first_coeff_path, crop_pic_path, crop_info = source
+        path = os.path.join(os.path.dirname(first_coeff_path),
+                            'idle_{}{}.mp4'.format(self.facerender, '_still' if still else ''))
+        if os.path.exists(path):
+            return path
+
+        print('Rendering the idle loop of the source image')
+        idle_dir = os.path.join(save_dir, 'idle')
+        os.makedirs(idle_dir, exist_ok=True)
+        audio_path = os.path.join(idle_dir, 'idle.wav')
+        wavfile.write(audio_path, 16000, np.zeros(IDLE_SECONDS * 16000, dtype=np.int16))
+
+        batch = get_data(first_coeff_path, audio_path, self.device, None, still=still)
+        coeff_path = self.audio_to_coeff.generate(batch, idle_dir, 0)
+        data = get_facerender_data(coeff_path, crop_pic_path, first_coeff_path, audio_path, 1, **data_options)
+
+        tmp = '{}.{}.mp4'.format(os.path.splitext(path)[0], uuid.uuid4().hex)
+        try:
+            write_frames(tmp, self.animate_from_coeff.iter_video(data, crop_info, render_options['img_size'],
+                                                                 render_options['frame_chunk']), fps=FPS)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        return path
+
+    def render_pool(self, workers):
+        """
+        The pool of processes rendering the chunks of this configuration, None to render them here.
+
+        The pool is kept between jobs, since every process holds its own copy of the models. Daemonic
+        processes, like the Celery pool workers, cannot start one and render in process.
+        """
+        if workers <= 1:
+            return None
+        if multiprocessing.current_process().daemon:
+            print('Rendering the chunks in process, a daemonic process cannot start render workers')
+            return None
+
+        key = (tuple(sorted(self.model_options.items())), workers)
+        with _models_lock:
+            if key not in _render_pools:
+                threads = max(1, (os.cpu_count() or 1) // workers)
+                _render_pools[key] = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                                         initializer=init_render_worker,
+                                                         initargs=(self.model_options, threads))
+            return _render_pools[key]
+
+
+def audio_frames(audio_path):
+    return len(AudioSegment.from_file(audio_path)) * FPS // 1000
+
+
+def split_frames(num_frames, chunk_frames, overlap):
+    """
+    Split the frames into (first, last) ranges of `chunk_frames`, merging a tail too short to be blended
+    into the chunk before it.
+    """
+    bounds = list(range(0, num_frames, chunk_frames)) + [num_frames]
+    if len(bounds) > 2 and bounds[-1] - bounds[-2] < 2 * overlap:
+        del bounds[-2]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def fit_frames(coeffs, frames):
+    """
+    Cut or pad with its last frame a coefficient sequence to exactly `frames` frames.
+    """
+    if len(coeffs) < frames:
+        coeffs = np.concatenate([coeffs, np.repeat(coeffs[-1:], frames - len(coeffs), axis=0)])
+    return coeffs[:frames]
+
+
+def blend_coeffs(chunks, num_frames, overlap):
+    """
+    Join the (first, coeffs) chunks of coefficients into one sequence, crossfading linearly the 2 * overlap
+    frames two consecutive chunks share.
+    """
+    total = np.zeros((num_frames, chunks[0][1].shape[1]))
+    weights = np.zeros((num_frames, 1))
+    ramp = (np.arange(2 * overlap) + 0.5) / (2 * overlap) if overlap else np.zeros(0)
+    for index, (first, coeffs) in enumerate(chunks):
+        weight = np.ones(len(coeffs))
+        if overlap and index > 0:
+            weight[:2 * overlap] = ramp
+        if overlap and index < len(chunks) - 1:
+            weight[-2 * overlap:] = np.minimum(weight[-2 * overlap:], ramp[::-1])
+        total[first:first + len(coeffs)] += weight[:, None] * coeffs
+        weights[first:first + len(coeffs), 0] += weight
+    return total / np.maximum(weights, 1e-8)
+
+
+def init_render_worker(model_options, threads):
+    torch.set_num_threads(threads)
+    get_models(**model_options)
+
+
+def render_chunk(model_options, job):
+    return get_models(**model_options).render_coeffs(**job)
+
+
+def get_models(checkpoint_dir='./checkpoints', size=256, old_version=None, preprocess='crop',
+               facerender='facevid2vid', cpu=False):
+    """
+    Return the resident models of a configuration, loading them on first use.
+
+    A configuration is loaded under its own lock, so the loaded configurations and `loaded_models` are
+    served while another one loads, and concurrent callers of the same one wait for a single load.
+    """
+    key = (os.path.abspath(checkpoint_dir), size, old_version, 'full' in preprocess, facerender, cpu)
+    with _models_lock:
+        if key in _models:
+            return _models[key]
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+
+    with load_lock:
+        with _models_lock:
+            if key in _models:
+                return _models[key]
+
+        models = LipSyncModels(checkpoint_dir, size, old_version, preprocess, facerender, cpu)
+        print('Loaded the lip-sync models in {:.2f}s'.format(models.load_time))
+        with _models_lock:
+            _models[key] = models
+        return models
+
+
+def loaded_models():
+    with _models_lock:
+        return list(_models.values())
+
+
+def lip(source_image,   result_dir = './results', pose_style= 0 , cpu=False, batch_size = 2, input_yaw = None,
+        input_pitch = None, input_roll = None, ref_eyeblink = None, ref_pose = None, checkpoint_dir = './checkpoints',
+        preprocess = 'crop', still = True, size = 256, verbose = True, enhancer = None, background_enhancer = None,
+        expression_scale = 1, driven_audio = './examples/driven_audio/bus_chinese.wav', old_version = None,
+        face3dvis = None, facerender = 'facevid2vid', frame_chunk = 1):
 
+    models = get_models(checkpoint_dir, size, old_version, preprocess, facerender, cpu)
+    result, timings = models.generate(source_image, driven_audio, result_dir=result_dir, pose_style=pose_style,
+                                      batch_size=batch_size, input_yaw=input_yaw, input_pitch=input_pitch,
+                                      input_roll=input_roll, ref_eyeblink=ref_eyeblink, ref_pose=ref_pose,
+                                      preprocess=preprocess, still=still, size=size, verbose=verbose,
+                                      enhancer=enhancer, background_enhancer=background_enhancer,
+                                      expression_scale=expression_scale, face3dvis=face3dvis,
+                                      frame_chunk=frame_chunk)
+    print('Lip-sync stage timings:', {stage: round(seconds, 2) for stage, seconds in timings.items()})
+    return result
@@ -1,27 +1,21 @@
 import os
-import cv2
 import yaml
-import numpy as np
 import warnings
-from skimage import img_as_ubyte
-import safetensors
-import safetensors.torch 
 warnings.filterwarnings('ignore')
 
 
-import imageio
 import torch
 
 
 from ..facerender.modules.keypoint_detector import HEEstimator, KPDetector
 from ..facerender.modules.mapping import MappingNet
 from ..facerender.modules.generator import OcclusionAwareSPADEGenerator
-from ..facerender.modules.make_animation import make_animation
+from ..facerender.modules.make_animation import iter_animation
+from ..utils.safetensor_helper import get_checkpoint
 
-from pydub import AudioSegment 
-from ..utils.face_enhancer import enhancer_generator_with_len, enhancer_list
-from ..utils.paste_pic import paste_pic
-from ..utils.videoio import save_video_with_watermark
+from ..utils.face_enhancer import enhancer_generator_no_len
+from ..utils.paste_pic import paste_frames
+from ..utils.videoio import iter_tensor_frames, loop_video_frames, splice_frames, write_frames
 
 try:
     in_webui = True
@@ -58,7 +52,7 @@ class AnimateFromCoeff():
 
         if sadtalker_path is not None:
             if 'checkpoint' in sadtalker_path: # use safe tensor
-                self.load_cpk_facevid2vid_safetensor(sadtalker_path['checkpoint'], kp_detector=kp_extractor, generator=generator, he_estimator=None)
+                self.load_cpk_facevid2vid_safetensor(sadtalker_path['checkpoint'], kp_detector=kp_extractor, generator=generator, he_estimator=None, device=device)
             else:
                 self.load_cpk_facevid2vid(sadtalker_path['free_view_checkpoint'], kp_detector=kp_extractor, generator=generator, he_estimator=he_estimator)
         else:
@@ -85,26 +79,15 @@ class AnimateFromCoeff():
                         kp_detector=None, he_estimator=None,  
                         device="cpu"):
 
-        checkpoint = safetensors.torch.load_file(checkpoint_path)
+        checkpoint = get_checkpoint(checkpoint_path)
+        share = device == 'cpu'
 
         if generator is not None:
-            x_generator = {}
-            for k,v in checkpoint.items():
-                if 'generator' in k:
-                    x_generator[k.replace('generator.', '')] = v
-            generator.load_state_dict(x_generator)
+            checkpoint.load(generator, 'generator', share)
         if kp_detector is not None:
-            x_generator = {}
-            for k,v in checkpoint.items():
-                if 'kp_extractor' in k:
-                    x_generator[k.replace('kp_extractor.', '')] = v
-            kp_detector.load_state_dict(x_generator)
+            checkpoint.load(kp_detector, 'kp_extractor', share)
         if he_estimator is not None:
-            x_generator = {}
-            for k,v in checkpoint.items():
-                if 'he_estimator' in k:
-                    x_generator[k.replace('he_estimator.', '')] = v
-            he_estimator.load_state_dict(x_generator)
+            checkpoint.load(he_estimator, 'he_estimator', share)
         
         return None
 
@@ -152,8 +135,14 @@ class AnimateFromCoeff():
 
         return checkpoint['epoch']
 
-    def generate(self, x, video_save_dir, pic_path, crop_info, enhancer=None, background_enhancer=None, preprocess='crop', img_size=256):
 
+    def iter_video(self, x, crop_info, img_size=256, frame_chunk=1):
+        """
+        The uint8 RGB frames of the video of a batch of size 1, resized to keep the aspect ratio of the crop.
+
+        The frames flagged in x['silent'], if any, are not rendered but taken in turn from the idle loop
+        video x['idle'].
+        """
         source_image=x['source_image'].type(torch.FloatTensor)
         source_semantics=x['source_semantics'].type(torch.FloatTensor)
         target_semantics=x['target_semantics_list'].type(torch.FloatTensor) 
@@ -178,78 +167,50 @@ class AnimateFromCoeff():
 
         frame_num = x['frame_num']
 
-        predictions_video = make_animation(source_image, source_semantics, target_semantics,
-                                        self.generator, self.kp_extractor, self.he_estimator, self.mapping, 
-                                        yaw_c_seq, pitch_c_seq, roll_c_seq, use_exp = True)
-
-        predictions_video = predictions_video.reshape((-1,)+predictions_video.shape[2:])
-        predictions_video = predictions_video[:frame_num]
+        silent = x.get('silent')
+        if silent is not None:
+            rendered = torch.from_numpy(~silent)
+            target_semantics = target_semantics[:, rendered]
+            yaw_c_seq, pitch_c_seq, roll_c_seq = [None if seq is None else seq[:, rendered]
+                                                  for seq in (yaw_c_seq, pitch_c_seq, roll_c_seq)]
+            frame_num = int(rendered.sum())
 
-        video = []
-        for idx in range(predictions_video.shape[0]):
-            image = predictions_video[idx]
-            image = np.transpose(image.data.cpu().numpy(), [1, 2, 0]).astype(np.float32)
-            video.append(image)
-        result = img_as_ubyte(video)
+        chunks = iter_animation(source_image, source_semantics, target_semantics,
+                                self.generator, self.kp_extractor, self.he_estimator, self.mapping,
+                                yaw_c_seq, pitch_c_seq, roll_c_seq, use_exp = True, frame_chunk=frame_chunk)
 
         ### the generated video is 256x256, so we keep the aspect ratio, 
         original_size = crop_info[0]
-        if original_size:
-            result = [ cv2.resize(result_i,(img_size, int(img_size * original_size[1]/original_size[0]) )) for result_i in result ]
-        
-        video_name = x['video_name']  + '.mp4'
-        path = os.path.join(video_save_dir, 'temp_'+video_name)
-        
-        imageio.mimsave(path, result,  fps=float(25))
+        size = (img_size, int(img_size * original_size[1]/original_size[0])) if original_size else None
 
-        av_path = os.path.join(video_save_dir, video_name)
-        return_path = av_path 
-        
-        audio_path =  x['audio_path'] 
-        audio_name = os.path.splitext(os.path.split(audio_path)[-1])[0]
-        new_audio_path = os.path.join(video_save_dir, audio_name+'.wav')
-        start_time = 0
-        # cog will not keep the .mp3 filename
-        sound = AudioSegment.from_file(audio_path)
-        frames = frame_num 
-        end_time = start_time + frames*1/25*1000
-        word1=sound.set_frame_rate(16000)
-        word = word1[start_time:end_time]
-        word.export(new_audio_path, format="wav")
-
-        save_video_with_watermark(path, new_audio_path, av_path, watermark= False)
-        print(f'The generated video is named {video_save_dir}/{video_name}') 
+        frames = iter_tensor_frames(chunks, frame_num, size)
+        if silent is not None:
+            frames = splice_frames(frames, silent, loop_video_frames(x['idle']))
+        return frames
+
+    def generate(self, x, video_save_dir, pic_path, crop_info, enhancer=None, background_enhancer=None, preprocess='crop', img_size=256,
+                 frame_chunk=1):
+
+        frame_num = x['frame_num']
+        frames = self.iter_video(x, crop_info, img_size, frame_chunk)
+
+        video_name = x['video_name']  + '.mp4'
+        return_path = os.path.join(video_save_dir, video_name)
 
         if 'full' in preprocess.lower():
-            # only add watermark to the full image.
-            video_name_full = x['video_name']  + '_full.mp4'
-            full_video_path = os.path.join(video_save_dir, video_name_full)
-            return_path = full_video_path
-            paste_pic(path, pic_path, crop_info, new_audio_path, full_video_path, extended_crop= True if 'ext' in preprocess.lower() else False)
-            print(f'The generated video is named {video_save_dir}/{video_name_full}') 
-        else:
-            full_video_path = av_path 
+            video_name = x['video_name']  + '_full.mp4'
+            return_path = os.path.join(video_save_dir, video_name)
+            frames = paste_frames(frames, pic_path, crop_info, extended_crop= True if 'ext' in preprocess.lower() else False)
 
         #### paste back then enhancers
         if enhancer:
-            video_name_enhancer = x['video_name']  + '_enhanced.mp4'
-            enhanced_path = os.path.join(video_save_dir, 'temp_'+video_name_enhancer)
-            av_path_enhancer = os.path.join(video_save_dir, video_name_enhancer) 
-            return_path = av_path_enhancer
+            video_name = x['video_name']  + '_enhanced.mp4'
+            return_path = os.path.join(video_save_dir, video_name)
+            frames = enhancer_generator_no_len(frames, method=enhancer, bg_upsampler=background_enhancer)
 
-            try:
-                enhanced_images_gen_with_len = enhancer_generator_with_len(full_video_path, method=enhancer, bg_upsampler=background_enhancer)
-                imageio.mimsave(enhanced_path, enhanced_images_gen_with_len, fps=float(25))
-            except:
-                enhanced_images_gen_with_len = enhancer_list(full_video_path, method=enhancer, bg_upsampler=background_enhancer)
-                imageio.mimsave(enhanced_path, enhanced_images_gen_with_len, fps=float(25))
-            
-            save_video_with_watermark(enhanced_path, new_audio_path, av_path_enhancer, watermark= False)
-            print(f'The generated video is named {video_save_dir}/{video_name_enhancer}')
-            os.remove(enhanced_path)
-
-        os.remove(path)
-        os.remove(new_audio_path)
+        # the frames are rendered, pasted, enhanced and encoded with the first frame_num/25 seconds of the
+        # audio, resampled to 16kHz, by a single ffmpeg process
+        write_frames(return_path, frames, fps=25, audio=x['audio_path'], audio_duration=frame_num / 25)
+        print(f'The generated video is named {video_save_dir}/{video_name}') 
 
         return return_path
-
@@ -99,44 +99,71 @@ def keypoint_transformation(kp_canonical, he, wo_exp=False):
 
 
 
+def repeat_frames(x, n):
+    """
+    Repeat every batch item of a tensor, or of every tensor of a dict, n times: (B, ...) -> (B*n, ...).
+    """
+    if isinstance(x, dict):
+        return {k: repeat_frames(v, n) for k, v in x.items()}
+    if x is None or n == 1:
+        return x
+    return x.unsqueeze(1).expand(x.shape[0], n, *x.shape[1:]).reshape(x.shape[0] * n, *x.shape[1:])
+
+def flatten_frames(x):
+    """
+    Merge the frame dimension into the batch dimension: (B, n, ...) -> (B*n, ...).
+    """
+    return x.reshape(x.shape[0] * x.shape[1], *x.shape[2:])
+
+def unflatten_frames(x, n):
+    return x.reshape(x.shape[0] // n, n, *x.shape[1:])
+
 def make_animation(source_image, source_semantics, target_semantics,
                             generator, kp_detector, he_estimator, mapping, 
                             yaw_c_seq=None, pitch_c_seq=None, roll_c_seq=None,
-                            use_exp=True, use_half=False):
-    with torch.no_grad():
-        predictions = []
+                            use_exp=True, use_half=False, frame_chunk=1):
+    """
+    Render the frames of the target semantics, `frame_chunk` frames per generator call.
 
+    The keypoints and the features of the source image are computed once and repeated for every frame of
+    a chunk, so larger chunks trade memory for fewer, wider calls to the generator.
+    """
+    return torch.cat(list(iter_animation(source_image, source_semantics, target_semantics, generator, kp_detector,
+                                         he_estimator, mapping, yaw_c_seq, pitch_c_seq, roll_c_seq, use_exp,
+                                         use_half, frame_chunk)), dim=1)
+
+def iter_animation(source_image, source_semantics, target_semantics,
+                   generator, kp_detector, he_estimator, mapping,
+                   yaw_c_seq=None, pitch_c_seq=None, roll_c_seq=None,
+                   use_exp=True, use_half=False, frame_chunk=1):
+    """
+    Same as make_animation, yielding the (B, n, 3, H, W) frames of every chunk as soon as it is rendered.
+    """
+    with torch.no_grad():
         kp_canonical = kp_detector(source_image)
         he_source = mapping(source_semantics)
         kp_source = keypoint_transformation(kp_canonical, he_source)
-    
-        for frame_idx in tqdm(range(target_semantics.shape[1]), 'Face Renderer:'):
-            # still check the dimension
-            # print(target_semantics.shape, source_semantics.shape)
-            target_semantics_frame = target_semantics[:, frame_idx]
-            he_driving = mapping(target_semantics_frame)
+        source_features = generator.encode_source(source_image)
+
+        frame_chunk = max(1, int(frame_chunk))
+        frame_count = target_semantics.shape[1]
+        for start in tqdm(range(0, frame_count, frame_chunk), 'Face Renderer:'):
+            end = min(start + frame_chunk, frame_count)
+            n = end - start
+
+            he_driving = mapping(flatten_frames(target_semantics[:, start:end]))
             if yaw_c_seq is not None:
-                he_driving['yaw_in'] = yaw_c_seq[:, frame_idx]
+                he_driving['yaw_in'] = flatten_frames(yaw_c_seq[:, start:end])
             if pitch_c_seq is not None:
-                he_driving['pitch_in'] = pitch_c_seq[:, frame_idx] 
+                he_driving['pitch_in'] = flatten_frames(pitch_c_seq[:, start:end])
             if roll_c_seq is not None:
-                he_driving['roll_in'] = roll_c_seq[:, frame_idx] 
-            
-            kp_driving = keypoint_transformation(kp_canonical, he_driving)
-                
-            kp_norm = kp_driving
-            out = generator(source_image, kp_source=kp_source, kp_driving=kp_norm)
-            '''
-            source_image_new = out['prediction'].squeeze(1)
-            kp_canonical_new =  kp_detector(source_image_new)
-            he_source_new = he_estimator(source_image_new) 
-            kp_source_new = keypoint_transformation(kp_canonical_new, he_source_new, wo_exp=True)
-            kp_driving_new = keypoint_transformation(kp_canonical_new, he_driving, wo_exp=True)
-            out = generator(source_image_new, kp_source=kp_source_new, kp_driving=kp_driving_new)
-            '''
-            predictions.append(out['prediction'])
-        predictions_ts = torch.stack(predictions, dim=1)
-    return predictions_ts
+                he_driving['roll_in'] = flatten_frames(roll_c_seq[:, start:end])
+
+            kp_driving = keypoint_transformation(repeat_frames(kp_canonical, n), he_driving)
+
+            out = generator(repeat_frames(source_image, n), kp_source=repeat_frames(kp_source, n),
+                            kp_driving=kp_driving, feature_3d=repeat_frames(source_features, n))
+            yield unflatten_frames(out['prediction'], n)
 
 class AnimateModel(torch.nn.Module):
     """
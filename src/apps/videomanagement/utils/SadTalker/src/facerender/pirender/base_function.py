@@ -32,8 +32,8 @@ class ADAINHourglass(nn.Module):
         self.decoder = ADAINDecoder(pose_nc, ngf, img_f, encoder_layers, decoder_layers, True, nonlinearity, use_spect)
         self.output_nc = self.decoder.output_nc
 
-    def forward(self, x, z):
-        return self.decoder(self.encoder(x, z), z)                 
+    def forward(self, x, z, source=None):
+        return self.decoder(self.encoder(x, z, source), z)                 
 
 
 
@@ -49,12 +49,22 @@ class ADAINEncoder(nn.Module):
             setattr(self, 'encoder' + str(i), model)
         self.output_nc = out_channels
         
-    def forward(self, x, z):
+    def encode_source(self, x):
+        """
+        The part of the encoder that does not depend on the driving features: the input layer and the
+        normalization of its output, before the first ADAIN modulation.
+        """
         out = self.input_layer(x)
+        return {'input': out, 'normalized': self.encoder0.norm_0.param_free_norm(out)}
+
+    def forward(self, x, z, source=None):
+        if source is None:
+            source = self.encode_source(x)
+        out = source['input']
         out_list = [out]
         for i in range(self.layers):
             model = getattr(self, 'encoder' + str(i))
-            out = model(out, z)
+            out = model(out, z, normalized=source['normalized'] if i == 0 else None)
             out_list.append(out)
         return out_list
         
@@ -100,8 +110,8 @@ class ADAINEncoderBlock(nn.Module):
         self.norm_1 = ADAIN(output_nc, feature_nc)
         self.actvn = nonlinearity
 
-    def forward(self, x, z):
-        x = self.conv_0(self.actvn(self.norm_0(x, z)))
+    def forward(self, x, z, normalized=None):
+        x = self.conv_0(self.actvn(self.norm_0(x, z, normalized)))
         x = self.conv_1(self.actvn(self.norm_1(x, z)))
         return x
 
@@ -169,10 +179,11 @@ class ADAIN(nn.Module):
         self.mlp_gamma = nn.Linear(nhidden, norm_nc, bias=use_bias)    
         self.mlp_beta = nn.Linear(nhidden, norm_nc, bias=use_bias)    
 
-    def forward(self, x, feature):
+    def forward(self, x, feature, normalized=None):
 
-        # Part 1. generate parameter-free normalized activations
-        normalized = self.param_free_norm(x)
+        # Part 1. generate parameter-free normalized activations, unless they were computed ahead
+        if normalized is None:
+            normalized = self.param_free_norm(x)
 
         # Part 2. produce scaling and bias conditioned on feature
         feature = feature.view(feature.size(0), -1)
@@ -201,7 +212,28 @@ class FineEncoder(nn.Module):
         self.output_nc = out_channels
 
     def forward(self, x):
-        x = self.first(x)
+        return self.down(self.first(x))
+
+    def encode_source(self, source):
+        """
+        The part of the first convolution that only sees `source`, for inputs made of `source` concatenated
+        with other channels, or None if the weights are reparametrized by spectral norm.
+        """
+        conv = self.first.model[0]
+        if not isinstance(conv, nn.Conv2d) or hasattr(conv, 'weight_orig'):
+            return None
+        return F.conv2d(source, conv.weight[:, :source.shape[1]], conv.bias, conv.stride, conv.padding)
+
+    def forward_split(self, source_features, other):
+        """
+        Same as forward(torch.cat([source, other], 1)) with the source part given by encode_source.
+        """
+        conv = self.first.model[0]
+        n = conv.in_channels - other.shape[1]
+        x = source_features + F.conv2d(other, conv.weight[:, n:], None, conv.stride, conv.padding)
+        return self.down(self.first.model[1:](x))
+
+    def down(self, x):
         out=[x]
         for i in range(self.layers):
             model = getattr(self, 'down'+str(i))
@@ -72,20 +72,35 @@ class FaceGenerator(nn.Module):
         self.warpping_net = WarpingNet(**warpping_net, **common)
         self.editing_net = EditingNet(**editing_net, **common)
  
+    def encode_source(self, input_image):
+        r"""compute the work of the generator that only depends on the source image.
+
+        Args:
+            input_image (tensor): The source images
+        Returns:
+            source (dict): The source encoding, to pass to `drive` for every frame of the same source
+        """
+        return {
+            'image': input_image,
+            'warp': self.warpping_net.encode_source(input_image),
+            'edit': self.editing_net.encode_source(input_image),
+        }
+
+    def drive(self, source, driving_source, stage=None):
+        descriptor = self.mapping_net(driving_source)
+        output = self.warpping_net(source['image'], descriptor, source=source['warp'])
+        if stage != 'warp':
+            output['fake_image'] = self.editing_net(source['image'], output['warp_image'], descriptor,
+                                                    source=source['edit'])
+        return output
+
     def forward(
         self, 
         input_image, 
         driving_source, 
         stage=None
         ):
-        if stage == 'warp':
-            descriptor = self.mapping_net(driving_source)
-            output = self.warpping_net(input_image, descriptor)
-        else:
-            descriptor = self.mapping_net(driving_source)
-            output = self.warpping_net(input_image, descriptor)
-            output['fake_image'] = self.editing_net(input_image, output['warp_image'], descriptor)
-        return output
+        return self.drive(self.encode_source(input_image), driving_source, stage)
 
 class MappingNet(nn.Module):
     def __init__(self, coeff_nc, descriptor_nc, layer):
@@ -140,9 +155,12 @@ class WarpingNet(nn.Module):
 
         self.pool = nn.AdaptiveAvgPool2d(1)
 
-    def forward(self, input_image, descriptor):
+    def encode_source(self, input_image):
+        return self.hourglass.encoder.encode_source(input_image)
+
+    def forward(self, input_image, descriptor, source=None):
         final_output={}
-        output = self.hourglass(input_image, descriptor)
+        output = self.hourglass(input_image, descriptor, source)
         final_output['flow_field'] = self.flow_out(output)
 
         deformation = convert_flow_to_deformation(final_output['flow_field'])
@@ -171,8 +189,13 @@ class EditingNet(nn.Module):
         self.encoder = FineEncoder(image_nc*2, base_nc, max_nc, layer, **kwargs)
         self.decoder = FineDecoder(image_nc, self.descriptor_nc, base_nc, max_nc, layer, num_res_blocks, **kwargs)
 
-    def forward(self, input_image, warp_image, descriptor):
-        x = torch.cat([input_image, warp_image], 1)
-        x = self.encoder(x)
+    def encode_source(self, input_image):
+        return self.encoder.encode_source(input_image)
+
+    def forward(self, input_image, warp_image, descriptor, source=None):
+        if source is None:
+            x = self.encoder(torch.cat([input_image, warp_image], 1))
+        else:
+            x = self.encoder.forward_split(source, warp_image)
         gen_image = self.decoder(x, descriptor)
         return gen_image
@@ -1,22 +1,18 @@
 import os
-import cv2
 from tqdm import tqdm
-import numpy as np
 import warnings
-from skimage import img_as_ubyte
 warnings.filterwarnings('ignore')
 
 
-import imageio
 import torch
 
 from ..facerender.pirender.config import Config
 from ..facerender.pirender.face_model import FaceGenerator
+from ..facerender.modules.make_animation import flatten_frames, repeat_frames, unflatten_frames
 
-from pydub import AudioSegment 
-from ..utils.face_enhancer import enhancer_generator_with_len, enhancer_list
-from ..utils.paste_pic import paste_pic
-from ..utils.videoio import save_video_with_watermark
+from ..utils.face_enhancer import enhancer_generator_no_len
+from ..utils.paste_pic import paste_frames
+from ..utils.videoio import iter_tensor_frames, loop_video_frames, splice_frames, write_frames
 
 try:
     in_webui = True
@@ -38,89 +34,82 @@ class AnimateFromCoeff_PIRender():
         self.device = device
     
 
-    def generate(self, x, video_save_dir, pic_path, crop_info, enhancer=None, background_enhancer=None, preprocess='crop', img_size=256):
+    def render_frames(self, source_image, target_semantics, frame_chunk=1):
+        """
+        Render the frames of the target semantics, `frame_chunk` frames per call of the generator.
 
+        Returns the frames as a (B, T, 3, H, W) tensor.
+        """
+        return torch.cat(list(self.iter_frames(source_image, target_semantics, frame_chunk)), dim=1)
+
+    def iter_frames(self, source_image, target_semantics, frame_chunk=1):
+        """
+        Same as render_frames, yielding the (B, n, 3, H, W) frames of every chunk as soon as it is rendered.
+
+        The source image is encoded once and the encoding is reused for every frame.
+        """
+        frame_chunk = max(1, int(frame_chunk))
+        frame_count = target_semantics.shape[1]
+        with torch.no_grad():
+            source = self.net_G.encode_source(source_image)
+            for start in tqdm(range(0, frame_count, frame_chunk), 'FaceRender:'):
+                end = min(start + frame_chunk, frame_count)
+                n = end - start
+                output = self.net_G.drive(repeat_frames(source, n),
+                                          flatten_frames(target_semantics[:, start:end]))['fake_image']
+                yield unflatten_frames(output, n)
+
+
+    def iter_video(self, x, crop_info, img_size=256, frame_chunk=1):
+        """
+        The uint8 RGB frames of the video of a batch of size 1, resized to keep the aspect ratio of the crop.
+
+        The frames flagged in x['silent'], if any, are not rendered but taken in turn from the idle loop
+        video x['idle'].
+        """
         source_image=x['source_image'].type(torch.FloatTensor)
-        source_semantics=x['source_semantics'].type(torch.FloatTensor)
         target_semantics=x['target_semantics_list'].type(torch.FloatTensor) 
         source_image=source_image.to(self.device)
-        source_semantics=source_semantics.to(self.device)
         target_semantics=target_semantics.to(self.device)
-        frame_num = x['frame_num']
-        
-        with torch.no_grad():
-            predictions_video = []
-            for i in tqdm(range(target_semantics.shape[1]), 'FaceRender:'):
-                 predictions_video.append(self.net_G(source_image, target_semantics[:, i])['fake_image'])
-        
-        predictions_video = torch.stack(predictions_video, dim=1)
-        predictions_video = predictions_video.reshape((-1,)+predictions_video.shape[2:])
-
-        video = []
-        for idx in range(len(predictions_video)):
-            image = predictions_video[idx]
-            image = np.transpose(image.data.cpu().numpy(), [1, 2, 0]).astype(np.float32)
-            video.append(image)
-        result = img_as_ubyte(video)
+
+        silent = x.get('silent')
+        if silent is not None:
+            target_semantics = target_semantics[:, torch.from_numpy(~silent)]
+
+        chunks = self.iter_frames(source_image, target_semantics, frame_chunk)
 
         ### the generated video is 256x256, so we keep the aspect ratio, 
         original_size = crop_info[0]
-        if original_size:
-            result = [ cv2.resize(result_i,(img_size, int(img_size * original_size[1]/original_size[0]) )) for result_i in result ]
-        
+        size = (img_size, int(img_size * original_size[1]/original_size[0])) if original_size else None
+
+        frames = iter_tensor_frames(chunks, None, size)
+        if silent is not None:
+            frames = splice_frames(frames, silent, loop_video_frames(x['idle']))
+        return frames
+
+    def generate(self, x, video_save_dir, pic_path, crop_info, enhancer=None, background_enhancer=None, preprocess='crop', img_size=256,
+                 frame_chunk=1):
+
+        frame_num = x['frame_num']
+        frames = self.iter_video(x, crop_info, img_size, frame_chunk)
+
         video_name = x['video_name']  + '.mp4'
-        path = os.path.join(video_save_dir, 'temp_'+video_name)
-        
-        imageio.mimsave(path, result,  fps=float(25))
-
-        av_path = os.path.join(video_save_dir, video_name)
-        return_path = av_path 
-        
-        audio_path =  x['audio_path'] 
-        audio_name = os.path.splitext(os.path.split(audio_path)[-1])[0]
-        new_audio_path = os.path.join(video_save_dir, audio_name+'.wav')
-        start_time = 0
-        # cog will not keep the .mp3 filename
-        sound = AudioSegment.from_file(audio_path)
-        frames = frame_num 
-        end_time = start_time + frames*1/25*1000
-        word1=sound.set_frame_rate(16000)
-        word = word1[start_time:end_time]
-        word.export(new_audio_path, format="wav")
-
-        save_video_with_watermark(path, new_audio_path, av_path, watermark= False)
-        print(f'The generated video is named {video_save_dir}/{video_name}') 
+        return_path = os.path.join(video_save_dir, video_name)
 
         if 'full' in preprocess.lower():
-            # only add watermark to the full image.
-            video_name_full = x['video_name']  + '_full.mp4'
-            full_video_path = os.path.join(video_save_dir, video_name_full)
-            return_path = full_video_path
-            paste_pic(path, pic_path, crop_info, new_audio_path, full_video_path, extended_crop= True if 'ext' in preprocess.lower() else False)
-            print(f'The generated video is named {video_save_dir}/{video_name_full}') 
-        else:
-            full_video_path = av_path 
+            video_name = x['video_name']  + '_full.mp4'
+            return_path = os.path.join(video_save_dir, video_name)
+            frames = paste_frames(frames, pic_path, crop_info, extended_crop= True if 'ext' in preprocess.lower() else False)
 
         #### paste back then enhancers
         if enhancer:
-            video_name_enhancer = x['video_name']  + '_enhanced.mp4'
-            enhanced_path = os.path.join(video_save_dir, 'temp_'+video_name_enhancer)
-            av_path_enhancer = os.path.join(video_save_dir, video_name_enhancer) 
-            return_path = av_path_enhancer
-
-            try:
-                enhanced_images_gen_with_len = enhancer_generator_with_len(full_video_path, method=enhancer, bg_upsampler=background_enhancer)
-                imageio.mimsave(enhanced_path, enhanced_images_gen_with_len, fps=float(25))
-            except:
-                enhanced_images_gen_with_len = enhancer_list(full_video_path, method=enhancer, bg_upsampler=background_enhancer)
-                imageio.mimsave(enhanced_path, enhanced_images_gen_with_len, fps=float(25))
-            
-            save_video_with_watermark(enhanced_path, new_audio_path, av_path_enhancer, watermark= False)
-            print(f'The generated video is named {video_save_dir}/{video_name_enhancer}')
-            os.remove(enhanced_path)
-
-        os.remove(path)
-        os.remove(new_audio_path)
+            video_name = x['video_name']  + '_enhanced.mp4'
+            return_path = os.path.join(video_save_dir, video_name)
+            frames = enhancer_generator_no_len(frames, method=enhancer, bg_upsampler=background_enhancer)
 
-        return return_path
+        # the frames are rendered, pasted, enhanced and encoded with the first frame_num/25 seconds of the
+        # audio, resampled to 16kHz, by a single ffmpeg process
+        write_frames(return_path, frames, fps=25, audio=x['audio_path'], audio_duration=frame_num / 25)
+        print(f'The generated video is named {video_save_dir}/{video_name}') 
 
+        return return_path
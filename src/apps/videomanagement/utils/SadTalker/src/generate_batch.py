@@ -1,6 +1,5 @@
 import os
 
-from tqdm import tqdm
 import torch
 import numpy as np
 import random
@@ -48,6 +47,33 @@ def generate_blink_seq_randomly(num_frames):
             break
     return ratio
 
+def mel_windows(spec, num_frames, fps=25, step_size=16):
+    """
+    Gather the mel window of every video frame in one indexing operation: (nframes, 80) -> (T, 80, step_size).
+
+    The window of frame i starts int(80 * (i - 2) / fps) mel frames in, and the indices past either end of
+    the spectrogram are clamped to its first and last frame.
+    """
+    starts = (80. * ((np.arange(num_frames) - 2) / float(fps))).astype(np.int64)
+    index = np.clip(starts[:, None] + np.arange(step_size), 0, spec.shape[0] - 1)
+    return spec[index].transpose(0, 2, 1)
+
+def silent_frames(indiv_mels, threshold=-3.0, min_frames=25, margin=4):
+    """
+    Flag the frames of the silent stretches of the audio, from the mel windows of get_data: (T, 80, 16) -> (T,).
+
+    A frame is silent when its whole mel window is below `threshold`, on the [-4, 4] scale of the normalized
+    mel spectrogram, about -67 dB. Only runs of at least `min_frames` silent frames are kept, less `margin`
+    frames at both ends, so the mouth still closes and opens through the renderer.
+    """
+    silent = indiv_mels.reshape(len(indiv_mels), -1).max(axis=1) < threshold
+    edges = np.diff(np.concatenate([[0], silent.astype(np.int8), [0]]))
+    flags = np.zeros(len(silent), dtype=bool)
+    for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+        if end - start >= min_frames:
+            flags[start + margin:end - margin] = True
+    return flags
+
 def get_data(first_coeff_path, audio_path, device, ref_eyeblink_coeff_path, still=False, idlemode=False, length_of_audio=False, use_blink=True):
 
     syncnet_mel_step_size = 16
@@ -65,18 +91,8 @@ def get_data(first_coeff_path, audio_path, device, ref_eyeblink_coeff_path, stil
         wav_length, num_frames = parse_audio_length(len(wav), 16000, 25)
         wav = crop_pad_audio(wav, wav_length)
         orig_mel = audio.melspectrogram(wav).T
-        spec = orig_mel.copy()         # nframes 80
-        indiv_mels = []
-
-        for i in tqdm(range(num_frames), 'mel:'):
-            start_frame_num = i-2
-            start_idx = int(80. * (start_frame_num / float(fps)))
-            end_idx = start_idx + syncnet_mel_step_size
-            seq = list(range(start_idx, end_idx))
-            seq = [ min(max(item, 0), orig_mel.shape[0]-1) for item in seq ]
-            m = spec[seq, :]
-            indiv_mels.append(m.T)
-        indiv_mels = np.asarray(indiv_mels)         # T 80 16
+        indiv_mels = mel_windows(orig_mel, num_frames, fps, syncnet_mel_step_size)         # T 80 16
+    silent = silent_frames(indiv_mels) if not idlemode else np.ones(num_frames, dtype=bool)
 
     ratio = generate_blink_seq_randomly(num_frames)      # T
     source_semantics_path = first_coeff_path
@@ -116,5 +132,6 @@ def get_data(first_coeff_path, audio_path, device, ref_eyeblink_coeff_path, stil
             'ref': ref_coeff, 
             'num_frames': num_frames, 
             'ratio_gt': ratio,
+            'silent': silent,
             'audio_name': audio_name, 'pic_name': pic_name}
 
@@ -7,7 +7,8 @@ import scipy.io as scio
 
 def get_facerender_data(coeff_path, pic_path, first_coeff_path, audio_path, 
                         batch_size, input_yaw_list=None, input_pitch_list=None, input_roll_list=None, 
-                        expression_scale=1.0, still_mode = False, preprocess='crop', size = 256, facemodel='pirender'):
+                        expression_scale=1.0, still_mode = False, preprocess='crop', size = 256, facemodel='pirender',
+                        dump_txt=False):
 
     semantic_radius = 13
     video_name = os.path.splitext(os.path.split(coeff_path)[-1])[0]
@@ -49,25 +50,19 @@ def get_facerender_data(coeff_path, pic_path, first_coeff_path, audio_path,
     if still_mode:
         generated_3dmm[:, 64:] = np.repeat(source_semantics[:, 64:], generated_3dmm.shape[0], axis=0)
 
-    with open(txt_path+'.txt', 'w') as f:
-        for coeff in generated_3dmm:
-            for i in coeff:
-                f.write(str(i)[:7]   + '  '+'\t')
-            f.write('\n')
+    if dump_txt:
+        # the coefficients as text, for inspection only
+        np.savetxt(txt_path+'.txt', generated_3dmm, fmt='%.7s  \t', delimiter='')
 
-    target_semantics_list = [] 
     frame_num = generated_3dmm.shape[0]
     data['frame_num'] = frame_num
-    for frame_idx in range(frame_num):
-        target_semantics = transform_semantic_target(generated_3dmm, frame_idx, semantic_radius)
-        target_semantics_list.append(target_semantics)
+    target_semantics_np = semantic_windows(generated_3dmm, semantic_radius)             #frame_num 70 semantic_radius*2+1
 
     remainder = frame_num%batch_size
     if remainder!=0:
-        for _ in range(batch_size-remainder):
-            target_semantics_list.append(target_semantics)
+        padding = np.repeat(target_semantics_np[-1:], batch_size-remainder, axis=0)
+        target_semantics_np = np.concatenate([target_semantics_np, padding], axis=0)
 
-    target_semantics_np = np.array(target_semantics_list)             #frame_num 70 semantic_radius*2+1
     target_semantics_np = target_semantics_np.reshape(batch_size, -1, target_semantics_np.shape[-2], target_semantics_np.shape[-1])
     data['target_semantics_list'] = torch.FloatTensor(target_semantics_np)
     data['video_name'] = video_name
@@ -85,11 +80,29 @@ def get_facerender_data(coeff_path, pic_path, first_coeff_path, audio_path,
  
     return data
 
+def trim_facerender_data(data, start, frames):
+    """
+    Keep the frames `start` to `start + frames` of the data of a batch size of 1.
+    """
+    for key in ('target_semantics_list', 'yaw_c_seq', 'pitch_c_seq', 'roll_c_seq'):
+        if key in data:
+            data[key] = data[key][:, start:start + frames]
+    data['frame_num'] = frames
+    return data
+
 def transform_semantic_1(semantic, semantic_radius):
     semantic_list =  [semantic for i in range(0, semantic_radius*2+1)]
     coeff_3dmm = np.concatenate(semantic_list, 0)
     return coeff_3dmm.transpose(1,0)
 
+def semantic_windows(coeff_3dmm, semantic_radius):
+    """
+    The transform_semantic_target of every frame at once, as a sliding window view over the coefficients
+    padded with copies of the first and last frame: (T, C) -> (T, C, semantic_radius*2+1).
+    """
+    padded = np.pad(coeff_3dmm, ((semantic_radius, semantic_radius), (0, 0)), mode='edge')
+    return np.lib.stride_tricks.sliding_window_view(padded, semantic_radius*2+1, axis=0)
+
 def transform_semantic_target(coeff_3dmm, frame_index, semantic_radius):
     num_frames = coeff_3dmm.shape[0]
     seq = list(range(frame_index- semantic_radius, frame_index + semantic_radius+1))
@@ -5,13 +5,11 @@ from scipy.io import savemat, loadmat
 from yacs.config import CfgNode as CN
 from scipy.signal import savgol_filter
 
-import safetensors
-import safetensors.torch 
 
 from .audio2pose_models.audio2pose import Audio2Pose
 from .audio2exp_models.networks import SimpleWrapperV2
 from .audio2exp_models.audio2exp import Audio2Exp
-from .utils.safetensor_helper import load_x_from_safetensor
+from .utils.safetensor_helper import get_checkpoint
 
 def load_cpk(checkpoint_path, model=None, optimizer=None, device="cpu"):
     checkpoint = torch.load(checkpoint_path, map_location=torch.device(device))
@@ -42,8 +40,7 @@ class Audio2Coeff():
         
         try:
             if sadtalker_path['use_safetensor']:
-                checkpoints = safetensors.torch.load_file(sadtalker_path['checkpoint'])
-                self.audio2pose_model.load_state_dict(load_x_from_safetensor(checkpoints, 'audio2pose'))
+                get_checkpoint(sadtalker_path['checkpoint']).load(self.audio2pose_model, 'audio2pose', share=device == 'cpu')
             else:
                 load_cpk(sadtalker_path['audio2pose_checkpoint'], model=self.audio2pose_model, device=device)
         except:
@@ -57,8 +54,7 @@ class Audio2Coeff():
         netG.eval()
         try:
             if sadtalker_path['use_safetensor']:
-                checkpoints = safetensors.torch.load_file(sadtalker_path['checkpoint'])
-                netG.load_state_dict(load_x_from_safetensor(checkpoints, 'audio2exp'))
+                get_checkpoint(sadtalker_path['checkpoint']).load(netG, 'audio2exp', share=device == 'cpu')
             else:
                 load_cpk(sadtalker_path['audio2exp_checkpoint'], model=netG, device=device)
         except:
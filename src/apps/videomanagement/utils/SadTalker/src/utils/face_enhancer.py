@@ -5,7 +5,7 @@ from gfpgan import GFPGANer
 
 from tqdm import tqdm
 
-from ..utils.videoio import load_video_to_cv2
+from ..utils.videoio import iter_video_frames, video_frame_count
 
 import cv2
 
@@ -31,12 +31,14 @@ def enhancer_generator_with_len(images, method='gfpgan', bg_upsampler='realesrga
     """ Provide a generator with a __len__ method so that it can passed to functions that
     call len()"""
 
-    if os.path.isfile(images): # handle video to images
-        # TODO: Create a generator version of load_video_to_cv2
-        images = load_video_to_cv2(images)
+    if isinstance(images, str) and os.path.isfile(images): # stream the frames of the video
+        length = video_frame_count(images)
+        images = iter_video_frames(images)
+    else:
+        length = len(images)
 
     gen = enhancer_generator_no_len(images, method=method, bg_upsampler=bg_upsampler)
-    gen_with_len = GeneratorWithLen(gen, len(images))
+    gen_with_len = GeneratorWithLen(gen, length)
     return gen_with_len
 
 def enhancer_generator_no_len(images, method='gfpgan', bg_upsampler='realesrgan'):
@@ -45,8 +47,8 @@ def enhancer_generator_no_len(images, method='gfpgan', bg_upsampler='realesrgan'
     the enhancer function. """
 
     print('face enhancer....')
-    if not isinstance(images, list) and os.path.isfile(images): # handle video to images
-        images = load_video_to_cv2(images)
+    if isinstance(images, str) and os.path.isfile(images): # handle video to images
+        images = iter_video_frames(images)
 
     # ------------------------ set up GFPGAN restorer ------------------------
     if  method == 'gfpgan':
@@ -108,9 +110,9 @@ def enhancer_generator_no_len(images, method='gfpgan', bg_upsampler='realesrgan'
         bg_upsampler=bg_upsampler)
 
     # ------------------------ restore ------------------------
-    for idx in tqdm(range(len(images)), 'Face Enhancer:'):
+    for image in tqdm(images, 'Face Enhancer:'):
         
-        img = cv2.cvtColor(images[idx], cv2.COLOR_RGB2BGR)
+        img = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
         
         # restore faces and background if necessary
         cropped_faces, restored_faces, r_img = restorer.enhance(
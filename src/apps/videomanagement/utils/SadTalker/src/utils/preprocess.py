@@ -6,8 +6,6 @@ from tqdm import tqdm
 from PIL import Image 
 
 # 3dmm extraction
-import safetensors
-import safetensors.torch 
 from ..face3d.util.preprocess import align_img
 from ..face3d.util.load_mats import load_lm3d
 from ..face3d.models import networks
@@ -18,7 +16,7 @@ from ..utils.croper import Preprocesser
 
 import warnings
 
-from ..utils.safetensor_helper import load_x_from_safetensor
+from ..utils.safetensor_helper import get_checkpoint
 warnings.filterwarnings("ignore")
 
 def split_coeff(coeffs):
@@ -52,8 +50,7 @@ class CropAndExtract():
         self.net_recon = networks.define_net_recon(net_recon= 'resnet50', use_last_fc=False, init_path= '').to(device)
         
         if sadtalker_path['use_safetensor']:
-            checkpoint = safetensors.torch.load_file(sadtalker_path['checkpoint'])    
-            self.net_recon.load_state_dict(load_x_from_safetensor(checkpoint, 'face_3drecon'))
+            get_checkpoint(sadtalker_path['checkpoint']).load(self.net_recon, 'face_3drecon', share=device == 'cpu')
         else:
             checkpoint = torch.load(sadtalker_path['path_of_net_recon_model'], map_location=torch.device(device))    
             self.net_recon.load_state_dict(checkpoint['net_recon'])
@@ -115,7 +112,7 @@ class CropAndExtract():
         frames_pil = [Image.fromarray(cv2.resize(frame,(pic_size, pic_size))) for frame in x_full_frames]
         if len(frames_pil) == 0:
             print('No face is detected in the input file')
-            return None, None
+            return None, None, None
 
         # save crop info
         for frame in frames_pil:
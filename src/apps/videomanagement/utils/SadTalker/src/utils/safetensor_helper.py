@@ -1,3 +1,9 @@
+import threading
+
+from safetensors import safe_open
+
+_checkpoints = {}
+_checkpoints_lock = threading.Lock()
 
 
 def load_x_from_safetensor(checkpoint, key):
@@ -5,4 +11,48 @@ def load_x_from_safetensor(checkpoint, key):
     for k,v in checkpoint.items():
         if key in k:
             x_generator[k.replace(key+'.', '')] = v
-    return x_generator
\ No newline at end of file
+    return x_generator
+
+
+class SafetensorCheckpoint():
+    """
+    A memory-mapped safetensors checkpoint, read one sub-model at a time.
+
+    The keys are indexed once by their first component, so the state dict of a sub-model is a lookup
+    rather than a scan of every key, and its tensors are views of the mapped file made on demand. Loaded
+    with `share` on CPU, the parameters stay views of the file, so the worker processes of a host share
+    the weight pages through the page cache instead of each holding a private copy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = safe_open(path, framework='pt', device='cpu')
+        self.prefixes = {}
+        for k in self.handle.keys():
+            self.prefixes.setdefault(k.split('.', 1)[0], []).append(k)
+
+    def state_dict(self, prefix):
+        return {k[len(prefix)+1:]: self.handle.get_tensor(k) for k in self.prefixes.get(prefix, [])}
+
+    def load(self, module, prefix, share=False):
+        state_dict = self.state_dict(prefix)
+        if share:
+            try:
+                # the parameters take the mapped tensors in place of copies of them
+                result = module.load_state_dict(state_dict, assign=True)
+            except TypeError: # torch < 2.1
+                return module.load_state_dict(state_dict)
+            # the sub-models are only used for inference, and torch 2.1 drops requires_grad on assign
+            module.requires_grad_(False)
+            return result
+        return module.load_state_dict(state_dict)
+
+
+def get_checkpoint(path):
+    """
+    Return the checkpoint of a path, opened on first use and shared by all the sub-models of the process.
+    """
+    with _checkpoints_lock:
+        if path not in _checkpoints:
+            _checkpoints[path] = SafetensorCheckpoint(path)
+        return _checkpoints[path]
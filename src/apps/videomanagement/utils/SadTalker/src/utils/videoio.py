@@ -1,26 +1,157 @@
 import shutil
+import subprocess
 import uuid
 
 import os
 
 import cv2
+import numpy as np
 
-def load_video_to_cv2(input_path):
+def iter_video_frames(input_path, rgb=True):
+    """
+    Read the frames of a video one at a time, in RGB order unless `rgb` is False.
+    """
     video_stream = cv2.VideoCapture(input_path)
-    fps = video_stream.get(cv2.CAP_PROP_FPS)
-    full_frames = [] 
+    try:
+        while 1:
+            still_reading, frame = video_stream.read()
+            if not still_reading:
+                break
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if rgb else frame
+    finally:
+        video_stream.release()
+
+def loop_video_frames(input_path, rgb=True):
+    """
+    Read the frames of a video over and over, without end.
+    """
     while 1:
-        still_reading, frame = video_stream.read()
-        if not still_reading:
-            video_stream.release()
-            break 
-        full_frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-    return full_frames
+        empty = True
+        for frame in iter_video_frames(input_path, rgb):
+            empty = False
+            yield frame
+        if empty:
+            return
+
+def splice_frames(frames, mask, fill):
+    """
+    Interleave two frame streams: the frame of `fill` where `mask` is set, the next one of `frames` elsewhere.
+    """
+    frames, fill = iter(frames), iter(fill)
+    for flag in mask:
+        yield next(fill) if flag else next(frames)
+
+def video_frame_count(input_path):
+    video_stream = cv2.VideoCapture(input_path)
+    count = int(video_stream.get(cv2.CAP_PROP_FRAME_COUNT))
+    video_stream.release()
+    return count
+
+def load_video_to_cv2(input_path):
+    return list(iter_video_frames(input_path))
+
+def iter_tensor_frames(chunks, frame_num=None, size=None):
+    """
+    Turn the (B, n, 3, H, W) float chunks of the face renderer into uint8 RGB frames, one at a time.
+
+    `frame_num` caps the number of frames and `size` is the (width, height) the frames are resized to.
+    """
+    count = 0
+    for chunk in chunks:
+        chunk = chunk.reshape((-1,) + tuple(chunk.shape[2:]))
+        chunk = (chunk.clamp(0, 1) * 255).round().byte().permute(0, 2, 3, 1).cpu().numpy()
+        for frame in chunk:
+            if frame_num is not None and count >= frame_num:
+                return
+            yield cv2.resize(frame, size) if size else frame
+            count += 1
+
+class FrameWriter:
+    """
+    Encode frames to a video as they come, through a pipe to ffmpeg, so no more than one frame is held
+    in memory whatever the duration.
+
+    The frame size is taken from the first frame. `pix_fmt` is the layout of the frames written,
+    rgb24 or bgr24 for OpenCV frames. With `audio`, the first `audio_duration` seconds of that file are
+    resampled to `audio_rate` and muxed in the same pass, so the output is the final H.264/AAC video.
+    """
+
+    def __init__(self, path, fps=25, pix_fmt='rgb24', audio=None, audio_duration=None, audio_rate=16000):
+        self.path = path
+        self.fps = fps
+        self.pix_fmt = pix_fmt
+        self.audio = audio
+        self.audio_duration = audio_duration
+        self.audio_rate = audio_rate
+        self.process = None
+        self.frames = 0
+
+    def open(self, width, height):
+        cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', self.pix_fmt, '-s', '%dx%d' % (width, height),
+               '-r', str(self.fps), '-i', '-']
+        if self.audio:
+            if self.audio_duration is not None:
+                cmd += ['-t', '%.3f' % self.audio_duration]
+            cmd += ['-i', self.audio, '-map', '0:v', '-map', '1:a',
+                    '-c:a', 'aac', '-ar', str(self.audio_rate), '-shortest']
+        cmd += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-pix_fmt', 'yuv420p',
+                '-movflags', '+faststart', self.path]
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        if self.process is None:
+            self.open(frame.shape[1], frame.shape[0])
+        self.process.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+        self.frames += 1
+
+    def close(self):
+        if self.process is None:
+            raise RuntimeError('No frames were written to {}'.format(self.path))
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError('ffmpeg failed to encode {}'.format(self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self.process is not None:
+            self.process.kill()
+            self.process.wait()
+
+def write_frames(path, frames, fps=25, pix_fmt='rgb24', audio=None, audio_duration=None):
+    """
+    Stream an iterable of frames to a video file, muxed with `audio` if given, and return the number of
+    frames written.
+    """
+    with FrameWriter(path, fps=fps, pix_fmt=pix_fmt, audio=audio, audio_duration=audio_duration) as writer:
+        for frame in frames:
+            writer.write(frame)
+    return writer.frames
+
+def concat_videos(paths, audio, save_path):
+    """
+    Join videos encoded alike without re-encoding them, under `audio` in place of their own audio.
+    """
+    list_path = os.path.splitext(save_path)[0] + '.txt'
+    with open(list_path, 'w') as f:
+        for path in paths:
+            f.write("file '%s'\n" % os.path.abspath(path).replace("'", "'\\''"))
+
+    cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+           '-i', audio, '-map', '0:v', '-map', '1:a', '-c:v', 'copy', '-c:a', 'aac', '-shortest', save_path]
+    subprocess.run(cmd, check=True)
+    os.remove(list_path)
+    return save_path
 
 def save_video_with_watermark(video, audio, save_path, watermark=False):
     temp_file = str(uuid.uuid4())+'.mp4'
-    cmd = r'ffmpeg -y -hide_banner -loglevel error -i "%s" -i "%s" -vcodec copy "%s"' % (video, audio, temp_file)
-    os.system(cmd)
+    cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-i', video, '-i', audio, '-vcodec', 'copy', temp_file]
+    subprocess.run(cmd, check=True)
 
     if watermark is False:
         shutil.move(temp_file, save_path)
@@ -36,6 +167,9 @@ def save_video_with_watermark(video, audio, save_path, watermark=False):
             dir_path = os.path.dirname(os.path.realpath(__file__))
             watarmark_path = dir_path+"/../../docs/sadtalker_logo.png"
 
-        cmd = r'ffmpeg -y -hide_banner -loglevel error -i "%s" -i "%s" -filter_complex "[1]scale=100:-1[wm];[0][wm]overlay=(main_w-overlay_w)-10:10" "%s"' % (temp_file, watarmark_path, save_path)
-        os.system(cmd)
-        os.remove(temp_file)
\ No newline at end of file
+        cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-i', temp_file, '-i', watarmark_path,
+               '-filter_complex', '[1]scale=100:-1[wm];[0][wm]overlay=(main_w-overlay_w)-10:10', save_path]
+        try:
+            subprocess.run(cmd, check=True)
+        finally:
+            os.remove(temp_file)
\ No newline at end of file
@@ -1,14 +1,27 @@
+import logging
 import uuid
 
-from .tts_utils import save, ApiSyn, create_model
+from django.conf import settings
+
+from .http_utils import report as http_report
+from .tts_utils import (
+    save,
+    save_batch,
+    save_many,
+    ApiSyn,
+    synthesizer_pool,
+    speech_cache,
+)
 from ..models import Scene, Video
+from .exceptions import SpeechFailedException
 from .prompt_utils import determine_fields
-import os
 
+logger = logging.getLogger(__name__)
 
-def make_scene_speech(voice_model, dir_name, prompt, text, is_last) -> Scene:
+
+def make_scene_speech(voice_model, dir_name, prompt, text, is_last, syn=None) -> Scene:
     filename = str(uuid.uuid4())
-    syn = get_syn(voice_model)
+    syn = get_syn(voice_model) if syn is None else syn
     sound = save(syn, text, save_path=f"{dir_name}/dialogues/{filename}.wav")
     scene = Scene.objects.create(
         file=sound, prompt=prompt, text=text.strip(), is_last=is_last
@@ -20,7 +33,7 @@ def get_syn(voice_model):
     syn = None
     path = voice_model.path
     if voice_model.type.lower() == "local":
-        syn = create_model(model=path)
+        syn = synthesizer_pool.get(model=path)
 
     if voice_model.type.lower() == "api":
         syn = ApiSyn(provider=voice_model.provider, path=path)
@@ -28,6 +41,58 @@ def get_syn(voice_model):
     return syn
 
 
+def get_script_lines(video: Video) -> list[tuple[str, bool]]:
+    """
+    Return the narration lines of the video script in order, each with its `is_last` flag.
+    """
+    gpt_answer = video.gpt_answer
+    first_scene = gpt_answer["scenes"][0]
+    search_field, narration_field = determine_fields(first_scene)
+    is_sentenced = (
+        True if video.prompt.template is None else video.prompt.template.is_sentenced
+    )
+
+    lines = []
+    for j in gpt_answer["scenes"]:
+        if is_sentenced:
+            for index, sentence in enumerate(j[search_field]):
+                lines.append(
+                    (sentence[narration_field], index == len(j[search_field]) - 1)
+                )
+
+        else:
+            lines.append((j["dialogue"], False))
+
+    return lines
+
+
+def make_scenes_speech_batched(
+    video: Video, syn, lines: list[tuple[str, bool]]
+) -> list[Scene]:
+    """
+    Synthesize every line of the script through the local model in mini-batches, then create the scenes.
+
+    The scenes are only created once every line has been synthesized, so a failure leaves no partial scenes
+    behind and the caller can fall back to per-sentence synthesis.
+    """
+    save_paths = [
+        f"{video.dir_name}/dialogues/{uuid.uuid4()}.wav" for _ in range(len(lines))
+    ]
+    save_batch(
+        syn,
+        [text for text, _ in lines],
+        save_paths,
+        batch_size=settings.TTS_BATCH_SIZE,
+    )
+
+    return [
+        Scene.objects.create(
+            file=path, prompt=video.prompt, text=text.strip(), is_last=is_last
+        )
+        for path, (text, is_last) in zip(save_paths, lines)
+    ]
+
+
 def make_scenes_speech(video: Video) -> None:
     """
     Generate speech audio files for scenes based on the provided video.
@@ -47,32 +112,60 @@ def make_scenes_speech(video: Video) -> None:
     - The speech synthesis can be performed using either a local model or an API, depending on the settings in
       the video object.
     - Each scene's dialogue or narration text is converted to speech and saved as a WAV file in the video's directory.
+    - Api voices are synthesized concurrently, within the limits of their provider, and the scenes are
+      created in script order once every call has returned; if any call failed, none is created.
+    - Local voice models with `batched` enabled synthesize the whole script in mini-batches, falling back to
+      per-sentence synthesis if the batched run fails.
     """
 
     voice_model = video.voice_model
-    gpt_answer = video.gpt_answer
-    first_scene = gpt_answer["scenes"][0]
-    search_field, narration_field = determine_fields(first_scene)
-    is_sentenced = (
-        True if video.prompt.template is None else video.prompt.template.is_sentenced
-    )
+    lines = get_script_lines(video)
+    syn = get_syn(voice_model)
 
-    for j in gpt_answer["scenes"]:
-        if is_sentenced:
-            for index, sentence in enumerate(j[search_field]):
-                make_scene_speech(
-                    voice_model,
-                    video.dir_name,
-                    video.prompt,
-                    sentence[narration_field],
-                    index == len(j[search_field]) - 1,
-                )
+    if voice_model.batched and voice_model.type.lower() == "local" and syn:
+        try:
+            make_scenes_speech_batched(video, syn, lines)
+            log_speech_stats()
+            return
+
+        except Exception as exc:
+            logger.warning(f"Batched synthesis failed, falling back: {exc}")
+
+    if isinstance(syn, ApiSyn):
+        save_paths = save_many(
+            syn,
+            [text for text, _ in lines],
+            [f"{video.dir_name}/dialogues/{uuid.uuid4()}.wav" for _ in lines],
+        )
+        check_saved(save_paths)
+        for sound, (text, is_last) in zip(save_paths, lines):
+            Scene.objects.create(
+                file=sound, prompt=video.prompt, text=text.strip(), is_last=is_last
+            )
 
-        else:
+    else:
+        for text, is_last in lines:
             make_scene_speech(
-                voice_model, video.dir_name, video.prompt, j["dialogue"], False
+                voice_model, video.dir_name, video.prompt, text, is_last, syn=syn
             )
 
+    log_speech_stats()
+
+
+def check_saved(save_paths: list) -> None:
+    """
+    Raise if any text failed to synthesize, before a scene is created or updated without its audio.
+    """
+    failed = sum(path is None for path in save_paths)
+    if failed:
+        raise SpeechFailedException(failed)
+
+
+def log_speech_stats() -> None:
+    logger.info(f"Synthesizer pool stats: {synthesizer_pool.report()}")
+    logger.info(f"Speech cache stats: {speech_cache.report()}")
+    logger.info(f"HTTP pool stats: {http_report()}")
+
 
 def update_scene(scene: Scene) -> None:
     """
@@ -96,21 +189,36 @@ def update_scene(scene: Scene) -> None:
     video = Video.objects.get(prompt__id=scene.prompt.id)
     dir_name = video.dir_name
     voice_model = video.voice_model
-    syn = voice_model.path
-
-    if video.avatar and os.path.exists(
-        rf"{os.getcwd()}\{video.dir_name}\output_avatar.mp4"
-    ):
-        os.remove(rf"{os.getcwd()}\{video.dir_name}\output_avatar.mp4")
-
-    if voice_model.type == "Local" or voice_model.type == "LOCAL":
-        syn = create_model(model=syn)
-
-    elif voice_model.type.lower() == "api":
-        syn = ApiSyn(provider=video.voice_model.provider, path=video.voice_model.path)
 
+    syn = get_syn(voice_model)
     filename = str(uuid.uuid4())
 
     sound = save(syn, scene.text, save_path=f"{dir_name}/dialogues/{filename}.wav")
     scene.file = sound
     scene.save()
+
+
+def update_scenes(video: Video, scenes: list[Scene]) -> None:
+    """
+    Update the speech audio files of several scenes of the same video.
+
+    Api voices are synthesized concurrently within the limits of their provider, every other voice goes
+    through `update_scene` one scene at a time. If any text fails, no scene is updated and the scenes
+    keep their previous audio.
+    """
+    syn = get_syn(video.voice_model)
+    if not isinstance(syn, ApiSyn):
+        for scene in scenes:
+            update_scene(scene)
+
+        return
+
+    save_paths = save_many(
+        syn,
+        [scene.text for scene in scenes],
+        [f"{video.dir_name}/dialogues/{uuid.uuid4()}.wav" for _ in scenes],
+    )
+    check_saved(save_paths)
+    for scene, sound in zip(scenes, save_paths):
+        scene.file = sound
+        scene.save()
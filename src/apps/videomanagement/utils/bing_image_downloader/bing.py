@@ -2,10 +2,12 @@ import os
 import posixpath
 import re
 import urllib
-import urllib.request
+import urllib.parse
 import uuid
 import imghdr
 
+from ..http_utils import session
+
 """
 Python api to download image form Bing.
 Author: Guru Prasad (g.gaurav541@gmail.com)
@@ -57,8 +59,9 @@ class Bing:
             return ""
 
     def save_image(self, link, file_path):
-        request = urllib.request.Request(link, None, self.headers)
-        image = urllib.request.urlopen(request, timeout=self.timeout).read()
+        response = session.get(link, headers=self.headers, timeout=self.timeout)
+        response.raise_for_status()
+        image = response.content
         if not imghdr.what(None, image):
             print("[Error]Invalid image, not saving {}\n".format(link))
             raise ValueError("Invalid image, not saving {}\n".format(link))
@@ -130,9 +133,11 @@ class Bing:
                 + "&qft="
                 + ("" if self.filter is None else self.get_filter(self.filter))
             )
-            request = urllib.request.Request(request_url, None, headers=self.headers)
-            response = urllib.request.urlopen(request)
-            html = response.read().decode("utf8")
+            response = session.get(
+                request_url, headers=self.headers, timeout=self.timeout
+            )
+            response.raise_for_status()
+            html = response.content.decode("utf8")
             if html == "":
                 print("[%] No more images are available")
                 break
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Union
+
+logger = logging.getLogger(__name__)
+
+
+def hash_key(*parts) -> str:
+    """
+    Build a content-addressed cache key from the given parts.
+
+    Parameters:
+    -----------
+    *parts : any
+        JSON serializable values that identify the cached content.
+
+    Returns:
+    --------
+    str
+        The sha256 hex digest of the parts.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Return the sha256 hex digest of the content of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def file_signature(path: str) -> tuple[str, int, int]:
+    """
+    Return a cheap signature of a file, its absolute path, size and modification time, which changes
+    whenever the file is replaced or edited without having to read it.
+    """
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class DiskCache:
+    """
+    A content-addressed file cache on local disk with size-based LRU eviction.
+
+    Every entry is a single file named after its key. Reading an entry refreshes its modification time, so
+    the least recently used entries are the ones evicted once the cache grows past `max_size` bytes.
+
+    The cache keeps a running total of its size, counted from the directory on first use and then from
+    the files it stores, so neither storing nor reporting walks the directory again until the total goes
+    past `max_size`.
+    The walk of an eviction also counts the entries stored by the other processes.
+
+    Attributes:
+    -----------
+    directory : str
+        The directory holding the cached files.
+    max_size : int
+        The maximum total size of the cached files, in bytes.
+    stats : CacheStats
+        The hit/miss counters of the cache for this process.
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        self.directory = directory
+        self.max_size = max_size
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._size = None
+
+    def path(self, key: str, suffix: str = "") -> str:
+        return os.path.join(self.directory, key[:2], f"{key}{suffix}")
+
+    def get(self, key: str, dest: str, suffix: str = "") -> Union[str, None]:
+        """
+        Copy the cached file of the key to `dest`.
+
+        Returns:
+        --------
+        str or None
+            `dest` if the key was in the cache, None otherwise.
+        """
+        cached = self.path(key, suffix)
+        try:
+            os.utime(cached)
+            copy_file(cached, dest)
+
+        except OSError:
+            with self._lock:
+                self.stats.misses += 1
+
+            return None
+
+        with self._lock:
+            self.stats.hits += 1
+
+        return dest
+
+    def lookup(self, key: str, suffix: str = "") -> Union[str, None]:
+        """
+        Return the path of the cached file of the key without copying it, or None if it is not cached.
+        """
+        cached = self.path(key, suffix)
+        try:
+            os.utime(cached)
+
+        except OSError:
+            with self._lock:
+                self.stats.misses += 1
+
+            return None
+
+        with self._lock:
+            self.stats.hits += 1
+
+        return cached
+
+    def put(self, key: str, src: str, suffix: str = "") -> Union[str, None]:
+        """
+        Store a copy of the file `src` under the key and evict old entries if the cache is full.
+
+        Returns:
+        --------
+        str or None
+            The path of the cached file, or None if it could not be stored.
+        """
+        cached = self.path(key, suffix)
+        tmp = f"{cached}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            shutil.copyfile(src, tmp)
+            added = os.path.getsize(tmp)
+            if os.path.exists(cached):
+                added -= os.path.getsize(cached)
+
+            os.replace(tmp, cached)
+
+        except OSError as exc:
+            logger.warning(f"Could not store {src} in cache: {exc}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+            return None
+
+        with self._lock:
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += added
+
+            full = self._size > self.max_size
+
+        if full:
+            self.evict()
+
+        return cached
+
+    def size(self) -> int:
+        return sum(entry[2] for entry in self._entries())
+
+    def evict(self) -> None:
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[1])
+            total = sum(entry[2] for entry in entries)
+
+            for path, _, size in entries:
+                if total <= self.max_size:
+                    break
+
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+
+                total -= size
+                self.stats.evictions += 1
+
+            self._size = total
+
+    def report(self) -> dict:
+        with self._lock:
+            if self._size is None:
+                self._size = self.size()
+
+            size = self._size
+
+        return {
+            "directory": self.directory,
+            "size": size,
+            "hits": self.stats.hits,
+            "misses": self.stats.misses,
+            "hit_ratio": self.stats.hit_ratio,
+            "evictions": self.stats.evictions,
+        }
+
+    def _entries(self) -> list[tuple[str, float, int]]:
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+
+                entries.append((path, stat.st_mtime, stat.st_size))
+
+        return entries
+
+
+def copy_file(src: str, dest: str) -> None:
+    """
+    Copy a file, creating the destination directory if needed.
+
+    The copy never shares its inode with the cached file, so callers are free to edit or delete it.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    shutil.copyfile(src, dest)
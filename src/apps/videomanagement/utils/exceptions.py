@@ -11,6 +11,12 @@ class FileNotDownloadedException(Exception):
         self.message = "could not download the video"
 
 
+class SpeechFailedException(Exception):
+    def __init__(self, count: int):
+        self.message = f"could not synthesize the speech of {count} scenes"
+        super().__init__(self.message)
+
+
 class GameNotFound(APIException):
     status_code = 404
     default_detail = "Could not find a game with that name"
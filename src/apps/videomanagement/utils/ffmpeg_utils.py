@@ -0,0 +1,606 @@
+import json
+import logging
+import os
+import re
+import subprocess
+import textwrap
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Union
+
+from PIL import Image
+
+from ..models import Background, Scene, SceneImage, Video
+from .cache_utils import hash_key
+from .exceptions import RenderFailedException
+from .file_utils import check_if_image, check_if_video
+
+if TYPE_CHECKING:
+    from .timeline_utils import AudioTimeline
+
+logger = logging.getLogger(__name__)
+
+FPS = 24
+FRAME_SIZE = (1920, 1080)
+SAMPLE_RATE = 44100
+BLANK_AUDIO = "assets/blank.wav"
+# How far past the similarity of a background the colors of the scenes fade from keyed to opaque.
+KEY_BLEND = 0.03
+AUDIO_FORMAT = (
+    f"aresample={SAMPLE_RATE},aformat=sample_fmts=fltp:channel_layouts=stereo"
+)
+VIDEO_ENCODING = [
+    "-c:v",
+    "libx264",
+    "-preset",
+    "medium",
+    "-pix_fmt",
+    "yuv420p",
+    "-r",
+    str(FPS),
+]
+
+
+def run_ffmpeg(
+    args: list[str], binary: str = "ffmpeg", text: bool = True
+) -> subprocess.CompletedProcess:
+    """
+    Run ffmpeg (or ffprobe) without a shell and raise if it fails. With `text` False the output is kept
+    as bytes, for raw samples or frames written to stdout.
+
+    Raises:
+    -------
+    RenderFailedException
+        If the process exits with a non zero return code.
+    """
+    command = [binary, "-hide_banner", *args]
+    result = subprocess.run(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=text
+    )
+    if result.returncode != 0:
+        stderr = result.stderr if text else result.stderr.decode(errors="replace")
+        logger.error(f"{binary} error: {stderr[-2000:]}")
+        raise RenderFailedException(f"{binary} exited with code {result.returncode}")
+
+    return result
+
+
+def probe(path: str) -> dict:
+    result = run_ffmpeg(
+        ["-v", "error", "-show_format", "-show_streams", "-of", "json", path],
+        binary="ffprobe",
+    )
+    return json.loads(result.stdout)
+
+
+def media_duration(path: str) -> float:
+    return float(probe(path)["format"]["duration"])
+
+
+def has_audio(path: str) -> bool:
+    return any(stream.get("codec_type") == "audio" for stream in probe(path)["streams"])
+
+
+def even(value: float) -> int:
+    return int(value) - int(value) % 2
+
+
+def hex_color(color: str) -> str:
+    return "0x" + "".join(f"{int(x):02x}" for x in color.split(","))
+
+
+def key_similarity(background: Background) -> float:
+    return max(float(background.through) / 255.0, 0.01)
+
+
+@dataclass
+class ScenePlan:
+    """
+    The resolved inputs and timing of a scene, shared by the filter graphs of the ffmpeg renderer.
+
+    `duration` is the length of the span of the scene in the audio timeline, set by `build_timeline` from
+    the decoded audio, so the video of every renderer is cut to the length of its sound.
+    """
+
+    scene: Scene
+    scene_image: Union[SceneImage, None]
+    duration: float = 0.0
+    speech: Union[str, None] = None
+    tail: list[str] = field(default_factory=list)
+    mix_visual_audio: bool = False
+
+    @property
+    def visual(self) -> Union[str, None]:
+        if self.scene_image and self.scene_image.file:
+            return self.scene_image.file.path
+
+        return None
+
+    @property
+    def kind(self) -> str:
+        if self.visual and check_if_image(self.visual):
+            return "image"
+
+        if self.visual and check_if_video(self.visual):
+            return "video"
+
+        return "black"
+
+
+class FilterGraph:
+    """
+    A small builder for ffmpeg commands with a `-filter_complex` graph.
+
+    Inputs are added with their own input options and referenced by index, filters are chained with
+    generated labels, so the graph can be assembled scene by scene.
+    """
+
+    def __init__(self):
+        self.inputs = []
+        self.filters = []
+        self._labels = 0
+
+    def add_input(self, path: str, *options: str) -> int:
+        self.inputs.append([*options, "-i", path])
+        return len(self.inputs) - 1
+
+    def label(self, prefix: str = "s") -> str:
+        self._labels += 1
+        return f"{prefix}{self._labels}"
+
+    def add(self, sources: Union[str, list[str]], chain: str, prefix: str = "s") -> str:
+        sources = [sources] if isinstance(sources, str) else sources
+        out = self.label(prefix)
+        self.filters.append(f"{''.join(f'[{s}]' for s in sources)}{chain}[{out}]")
+        return out
+
+    def command(self, maps: list[str], output: str, *output_options: str) -> list[str]:
+        args = ["-y"]
+        for options in self.inputs:
+            args.extend(options)
+
+        args.extend(["-filter_complex", ";".join(self.filters)])
+        for stream in maps:
+            args.extend(["-map", f"[{stream}]"])
+
+        args.extend([*output_options, output])
+        return args
+
+
+def plan_scenes(video: Video) -> list[ScenePlan]:
+    """
+    Resolve the audio parts of every scene of the video, following the MoviePy renderer.
+
+    - The scene speech is used as is; a scene video with audio is mixed on top of it.
+    - The last scene of a section gets two silences appended, unless its video brings its own audio.
+    - A scene without any audio lasts one silence.
+
+    The durations are not probed here: `build_timeline` sets them from the decoded audio of the parts.
+    """
+    plans = []
+
+    for scene in video.prompt.scenes.all():
+        scene_image = SceneImage.objects.filter(scene=scene).first()
+        plan = ScenePlan(scene=scene, scene_image=scene_image)
+
+        if scene.file and os.path.exists(scene.file.path):
+            plan.speech = scene.file.path
+
+        if scene_image and scene_image.with_audio and plan.kind == "video":
+            plan.mix_visual_audio = has_audio(plan.visual)
+
+        if scene_image and scene.is_last and not scene_image.with_audio:
+            plan.tail = [BLANK_AUDIO, BLANK_AUDIO]
+
+        if not plan.speech and not plan.mix_visual_audio and not plan.tail:
+            plan.tail = [BLANK_AUDIO]
+
+        plans.append(plan)
+
+    return plans
+
+
+def scene_frame_size(background: Union[Background, None]) -> tuple[int, int]:
+    if not background:
+        return FRAME_SIZE
+
+    if check_if_image(background.file.path):
+        w, h = Image.open(background.file.path).size
+    else:
+        stream = next(
+            s
+            for s in probe(background.file.path)["streams"]
+            if s.get("codec_type") == "video"
+        )
+        w, h = stream["width"], stream["height"]
+
+    return even(w * 0.65), even(h * 0.65)
+
+
+def add_scene_visual(graph: FilterGraph, plan: ScenePlan, size: tuple[int, int]) -> str:
+    w, h = size
+    d = plan.duration
+    fade = f"fade=t=in:st=0:d={d * 0.2:.3f},fade=t=out:st={d * 0.8:.3f}:d={d * 0.2:.3f}"
+    normalize = f"scale={w}:{h},setsar=1,fps={FPS},format=yuv420p"
+
+    if plan.kind == "image":
+        index = graph.add_input(
+            plan.visual, "-loop", "1", "-framerate", str(FPS), "-t", f"{d:.3f}"
+        )
+        return graph.add(f"{index}:v", f"{normalize},{fade}", "v")
+
+    if plan.kind == "video":
+        index = graph.add_input(plan.visual)
+        return graph.add(
+            f"{index}:v",
+            f"trim=0:{d:.3f},setpts=PTS-STARTPTS,{normalize},"
+            f"tpad=stop_mode=clone:stop_duration={d:.3f},trim=0:{d:.3f},{fade}",
+            "v",
+        )
+
+    index = graph.add_input(f"color=c=black:s={w}x{h}:r={FPS}:d={d:.3f}", "-f", "lavfi")
+    return graph.add(f"{index}:v", "setsar=1,format=yuv420p", "v")
+
+
+def add_background(
+    graph: FilterGraph,
+    body: str,
+    background: Background,
+    duration: float,
+    offset: float = 0.0,
+    fade_in: bool = True,
+) -> str:
+    """
+    Key the background color out of the scenes and lay them, with their margins, over the background.
+
+    `offset` is the start of `body` in the timeline of the video, so a single scene can be composed on
+    the same part of a video background, and the fade in, with the one it gets in the full render. An
+    image background and a scene past the fade in do not depend on it, so their graphs stay the same
+    when the scenes before them change length. With `fade_in` off the caller fades the video in itself.
+    """
+    start = offset
+    if check_if_image(background.file.path):
+        index = graph.add_input(
+            background.file.path, "-loop", "1", "-framerate", str(FPS)
+        )
+        start = 0.0
+    else:
+        index = graph.add_input(background.file.path, "-stream_loop", "-1")
+
+    bg = graph.add(
+        f"{index}:v",
+        f"scale={FRAME_SIZE[0]}:{FRAME_SIZE[1]},setsar=1,fps={FPS},"
+        f"trim={start:.3f}:{start + duration:.3f},setpts=PTS-STARTPTS,format=yuv420p",
+        "v",
+    )
+    similarity = key_similarity(background)
+    keyed = graph.add(
+        body,
+        f"pad=iw+{background.image_pos_left}:ih+{background.image_pos_top}:"
+        f"{background.image_pos_left}:{background.image_pos_top}:color=black,"
+        f"format=yuva420p,colorkey=color={hex_color(background.color)}:"
+        f"similarity={similarity:.4f}:blend={KEY_BLEND}",
+        "v",
+    )
+    fade = ""
+    if fade_in and offset < 2:
+        fade = f"{timeline_fades(offset, 'fade=t=in:st=0:d=2')},"
+
+    return graph.add(
+        [bg, keyed],
+        f"overlay=x=(W-w)/2:y=(H-h)/2:shortest=1,{fade}format=yuv420p",
+        "v",
+    )
+
+
+def timeline_fades(offset: float, fades: str) -> str:
+    """
+    Apply fades given in the timeline of the whole video to a stream that starts at `offset` in it.
+    """
+    if not offset:
+        return fades
+
+    return f"setpts=PTS+{offset:.3f}/TB,{fades},setpts=PTS-STARTPTS"
+
+
+def render_keyed_scene(
+    plan: ScenePlan, background: Background, offset: float, output: str
+) -> str:
+    """
+    Encode a scene keyed over its background, with the colorkey and overlay filters of ffmpeg.
+
+    This is how the MoviePy renderer composes the scenes that cannot be composed once ahead of time, the
+    scene videos and every scene over a video background, instead of masking them frame by frame.
+
+    Parameters:
+    -----------
+    plan : ScenePlan
+        The resolved inputs and duration of the scene.
+    background : Background
+        The background of the video.
+    offset : float
+        The start of the scene in the timeline of the video, which places it on a video background.
+    output : str
+        The file path of the encoded scene, without audio.
+
+    Returns:
+    --------
+    str
+        The file path of the encoded scene.
+    """
+    graph = FilterGraph()
+    body = add_scene_visual(graph, plan, scene_frame_size(background))
+    keyed = add_background(
+        graph, body, background, plan.duration, offset, fade_in=False
+    )
+    run_ffmpeg(graph.command([keyed], output, *VIDEO_ENCODING, "-an"))
+    return output
+
+
+def add_avatar(
+    graph: FilterGraph,
+    base: str,
+    avatar_video: str,
+    position: str,
+    offset: float = 0.0,
+    duration: float = None,
+    start: float = 0.0,
+    total: float = None,
+) -> str:
+    """
+    Overlay the avatar video on the base stream.
+
+    The avatar video starts at `start` in the timeline of the video, and the avatar lasts `total` seconds,
+    the length of the avatar video by default. With a `duration`, only the part of the avatar between
+    `offset` and `offset + duration` is used, so a single scene gets the same avatar frames and fades it
+    gets in the full render, from the avatar of the whole narration or from the clip of its own scene.
+    Its graph then only holds the fades that fall in its span.
+    """
+    x_pos, y_pos = (position.split(",") + ["top"])[:2]
+    x = {"left": "0", "center": "(W-w)/2", "right": "W-w"}.get(x_pos.strip(), "W-w")
+    y = {"top": "0", "center": "(H-h)/2", "bottom": "H-h"}.get(y_pos.strip(), "0")
+    total = media_duration(avatar_video) if total is None else total
+    if offset >= total:
+        return base
+
+    options, fades = [], []
+    if duration is not None:
+        options = ["-ss", f"{offset - start:.3f}", "-t", f"{duration:.3f}"]
+
+    if duration is None or offset < 2:
+        fades.append("fade=t=in:st=0:d=2")
+    if duration is None or offset + duration > total - 2:
+        fades.append(f"fade=t=out:st={max(total - 2, 0):.3f}:d=2")
+
+    chain = f"scale=iw*1.5:ih*1.5,setsar=1,fps={FPS},format=yuv420p"
+    if fades:
+        chain += f",{timeline_fades(offset, ','.join(fades))}"
+
+    index = graph.add_input(avatar_video, *options)
+    avatar = graph.add(f"{index}:v", chain, "v")
+    return graph.add(
+        [base, avatar], f"overlay=x={x}:y={y}:eof_action=pass,format=yuv420p", "v"
+    )
+
+
+def concat_clips(
+    paths: list[str], durations: list[float], output: str, list_path: str
+) -> str:
+    """
+    Join clips encoded alike into one video stream without re-encoding them.
+
+    Every clip is placed at the sum of the durations before it, so a clip a few frames shorter than its
+    span does not shift the clips after it.
+    """
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path, duration in zip(paths, durations):
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(
+                f"file '{escaped}'\noutpoint {duration:.3f}\nduration {duration:.3f}\n"
+            )
+
+    run_ffmpeg(
+        [
+            "-y",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            list_path,
+            "-map",
+            "0:v",
+            "-c",
+            "copy",
+            output,
+        ]
+    )
+    return output
+
+
+def add_subtitles(
+    graph: FilterGraph, base: str, plans: list[ScenePlan], video: Video
+) -> str:
+    """
+    Draw the scene texts in a box at the bottom left, each one for the span of its own scene.
+
+    The text files are named after their content, so the graph of a scene only changes with its text.
+    """
+    subtitles_dir = os.path.join(video.dir_name, "subtitles")
+    os.makedirs(subtitles_dir, exist_ok=True)
+
+    chain, start = [], 0.0
+    for plan in plans:
+        end = start + plan.duration
+        text = "\n".join(textwrap.wrap(plan.scene.text.strip(), width=80))
+        text_file = os.path.abspath(
+            os.path.join(subtitles_dir, f"{hash_key(text)[:16]}.txt")
+        )
+        if not os.path.exists(text_file):
+            with open(text_file, "w", encoding="utf-8") as f:
+                f.write(text)
+
+        escaped = re.sub(r"([\\:'])", r"\\\1", text_file)
+        chain.append(
+            f"drawtext=textfile='{escaped}':font=Arial:fontsize=37:fontcolor=blue:"
+            f"box=1:boxcolor=black:boxborderw=10:x=60:y=h-150:"
+            f"enable='between(t,{start:.3f},{end:.3f})'"
+        )
+        start = end
+
+    return graph.add(base, ",".join(chain), "v")
+
+
+def add_bumper(graph: FilterGraph, path: str) -> tuple[str, str]:
+    index = graph.add_input(path)
+    visual = graph.add(
+        f"{index}:v",
+        f"scale={FRAME_SIZE[0]}:{FRAME_SIZE[1]},setsar=1,fps={FPS},format=yuv420p",
+        "v",
+    )
+    if has_audio(path):
+        return visual, graph.add(f"{index}:a", AUDIO_FORMAT, "a")
+
+    silence = graph.add_input(
+        f"anullsrc=r={SAMPLE_RATE}:cl=stereo",
+        "-f",
+        "lavfi",
+        "-t",
+        f"{media_duration(path):.3f}",
+    )
+    return visual, graph.add(f"{silence}:a", AUDIO_FORMAT, "a")
+
+
+def render_with_ffmpeg(
+    video: Video,
+    output: str,
+    avatar_video: Callable[[Video, list[ScenePlan], "AudioTimeline"], str] = None,
+) -> str:
+    """
+    Render the video with a single ffmpeg filter graph, so no frame passes through Python.
+
+    The graph follows the MoviePy renderer step by step: scene visuals with fades, concatenation, the
+    background margin, chroma key and overlay, the avatar overlay, the subtitles, and the intro and
+    outro. The audio is the mix of the narration and the music, written once from the audio timeline.
+
+    Parameters:
+    -----------
+    video : Video
+        The video to render.
+    output : str
+        The file path of the rendered video.
+    avatar_video : Callable, optional
+        Returns the path of the avatar video of a video, from its scene plans and audio timeline, since
+        the avatar is lip-synced to the audio of its scenes.
+
+    Returns:
+    --------
+    str
+        The file path of the rendered video.
+    """
+    plans = plan_scenes(video)
+    if not plans:
+        raise RenderFailedException("No video scenes were processed.")
+
+    # The timeline builds on the scene plans of this module, hence the import here.
+    from .timeline_utils import build_timeline
+
+    timeline = build_timeline(plans)
+    timeline.write_narration(f"{video.dir_name}/output_audio.wav")
+    mix_path = timeline.write_mix(video, f"{video.dir_name}/output_mix.wav")
+    duration = timeline.duration
+    background = video.background
+
+    graph = FilterGraph()
+    size = scene_frame_size(background)
+    visuals = [add_scene_visual(graph, plan, size) for plan in plans]
+    body = graph.add(visuals, f"concat=n={len(visuals)}:v=1:a=0", "v")
+
+    if background:
+        base = add_background(graph, body, background, duration)
+    else:
+        base = graph.add(body, f"scale={FRAME_SIZE[0]}:{FRAME_SIZE[1]},setsar=1", "v")
+
+    audio = graph.add(f"{graph.add_input(mix_path)}:a", AUDIO_FORMAT, "a")
+
+    if getattr(video, "avatar", None) and avatar_video:
+        avatar_path = avatar_video(video, plans, timeline)
+        if avatar_path:
+            base = add_avatar(
+                graph,
+                base,
+                avatar_path,
+                video.settings.get("avatar_position", "right,top"),
+            )
+
+    if video.settings.get("subtitles", False):
+        base = add_subtitles(graph, base, plans, video)
+
+    segments = []
+    if getattr(video, "intro", None):
+        segments.append(add_bumper(graph, video.intro.file.path))
+
+    segments.append((base, audio))
+
+    if getattr(video, "outro", None):
+        segments.append(add_bumper(graph, video.outro.file.path))
+
+    if len(segments) > 1:
+        sources = [label for segment in segments for label in segment]
+        joined = graph.label("v"), graph.label("a")
+        graph.filters.append(
+            f"{''.join(f'[{s}]' for s in sources)}"
+            f"concat=n={len(segments)}:v=1:a=1[{joined[0]}][{joined[1]}]"
+        )
+        base, audio = joined
+
+    run_ffmpeg(
+        graph.command(
+            [base, audio],
+            output,
+            *VIDEO_ENCODING,
+            "-c:a",
+            "aac",
+            "-b:a",
+            "192k",
+            "-movflags",
+            "+faststart",
+        )
+    )
+    return output
+
+
+def compare_videos(first: str, second: str) -> dict:
+    """
+    Compare two renders of the same video by duration, resolution and SSIM.
+
+    Returns:
+    --------
+    dict
+        The durations and sizes of both files and the average SSIM of the second against the first.
+    """
+    info = {}
+    for name, path in (("first", first), ("second", second)):
+        data = probe(path)
+        stream = next(s for s in data["streams"] if s.get("codec_type") == "video")
+        info[name] = {
+            "duration": float(data["format"]["duration"]),
+            "size": (stream["width"], stream["height"]),
+        }
+
+    result = run_ffmpeg(
+        [
+            "-i",
+            first,
+            "-i",
+            second,
+            "-filter_complex",
+            "[1:v][0:v]scale2ref[b][a];[a][b]ssim",
+            "-f",
+            "null",
+            "-",
+        ]
+    )
+    match = re.search(r"All:([0-9.]+)", result.stderr)
+    info["ssim"] = float(match.group(1)) if match else None
+    info["duration_delta"] = abs(info["first"]["duration"] - info["second"]["duration"])
+    return info
@@ -1,13 +1,12 @@
-import urllib.request
 import uuid
 from typing import Union
 import logging
 
-import requests
 from django.conf import settings
 from requests import Response
 
 from ..gpt_utils import select_from_vision
+from ..http_utils import session, download_file
 
 logger = logging.getLogger(__name__)
 
@@ -33,9 +32,7 @@ def build_payload(query: str, start: int = 1, num: int = 1, **params) -> dict:
 
 
 def make_request(payload: dict) -> Response:
-    response = requests.get(
-        "https://www.googleapis.com/customsearch/v1", params=payload
-    )
+    response = session.get("https://www.googleapis.com/customsearch/v1", params=payload)
     if response.status_code != 200:
         raise Exception("Request Failed")
     return response
@@ -66,6 +63,6 @@ def download(q: str, amt: int = 1, path: str = "") -> Union[str, None]:
     filetype = (
         ".png" if "png" in image_url else ".gif" if "gif" in image_url else ".jpg"
     )
-    urllib.request.urlretrieve(image_url, f"{path}\\{filename}{filetype}")
+    download_file(image_url, f"{path}\\{filename}{filetype}")
 
     return f"{path}\\{filename}{filetype}"
@@ -4,19 +4,19 @@ import logging
 import pprint
 import sys
 
-import g4f
-import requests
 from django.conf import settings
-from openai import OpenAI
-import anthropic
 from rest_framework.exceptions import APIException
 from rest_framework import status
 
 
 from .exceptions import InvalidJsonFormatException
-import google.generativeai as genai
+from .http_utils import session, get_openai_client, get_anthropic_client
+from .lazy_utils import lazy_import
 
 logger = logging.getLogger(__name__)
+
+g4f = lazy_import("g4f")
+genai = lazy_import("google.generativeai")
 thismodule = sys.modules[__name__]
 
 model_calls = {"gpt": "gpt_call", "claude": "claude_call", "gemini": "gemini_call"}
@@ -66,7 +66,7 @@ def official_gpt_call(prompt: str, gpt_model=None):
     x = io.StringIO()
     logger.warning("API CALL IN OFFICIAL GPT")
     try:
-        client = OpenAI(api_key=settings.OPEN_API_KEY)
+        client = get_openai_client()
         stream = client.chat.completions.create(
             model=settings.DEFAULT_GPT_MODEL if not gpt_model else gpt_model,
             messages=[
@@ -126,7 +126,7 @@ def gemini_call(prompt: str, model="gemini-1.5-pro"):
 def claude_call(prompt: str, model="claude-3-5-sonnet-20240620"):
     x = io.StringIO()
     try:
-        client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+        client = get_anthropic_client()
         message = client.messages.create(
             model=model,
             max_tokens=1000,
@@ -257,7 +257,7 @@ def get_update_sentence(prompt):
 def select_from_vision(prompt, images):
     logger.warning("API CALL IN OFFICIAL GPT vision")
 
-    client = OpenAI(api_key=settings.OPEN_API_KEY)
+    client = get_openai_client()
 
     messages = [
         {
@@ -297,5 +297,5 @@ def get_voices_from_labs():
         "Content-Type": "application/json",
     }
 
-    response = requests.get(url, headers=headers)
+    response = session.get(url, headers=headers)
     return response.json()["voices"]
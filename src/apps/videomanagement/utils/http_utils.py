@@ -0,0 +1,155 @@
+import logging
+import threading
+from typing import Union
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .lazy_utils import lazy_import
+
+logger = logging.getLogger(__name__)
+
+anthropic = lazy_import("anthropic")
+openai = lazy_import("openai")
+
+
+class PooledSession(requests.Session):
+    """
+    A requests session that keeps connections alive and applies a default timeout to every request.
+
+    Attributes:
+    -----------
+    timeout : Union[float, tuple]
+        The default (connect, read) timeout, used when a request does not set its own.
+    """
+
+    def __init__(
+        self,
+        timeout: Union[float, tuple] = (10, 120),
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        retries: int = 3,
+    ):
+        super().__init__()
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+            pool_block=True,
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+    def report(self) -> dict:
+        """
+        Return, per host, the number of connections opened, the requests sent and the connections reused.
+        """
+        stats = {}
+        for adapter in set(self.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+
+                host = f"{pool.scheme}://{pool.host}:{pool.port}"
+                stats[host] = {
+                    "connections": pool.num_connections,
+                    "requests": pool.num_requests,
+                    "reused": max(pool.num_requests - pool.num_connections, 0),
+                }
+
+        return stats
+
+
+session = PooledSession(
+    timeout=settings.HTTP_TIMEOUT,
+    pool_connections=settings.HTTP_POOL_CONNECTIONS,
+    pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+    retries=settings.HTTP_RETRIES,
+)
+
+clients = {}
+clients_lock = threading.Lock()
+
+
+def get_openai_client():
+    """
+    Return the process-wide OpenAI client, which keeps its own pool of connections alive between calls.
+    """
+    with clients_lock:
+        if "openai" not in clients:
+            clients["openai"] = openai.OpenAI(
+                api_key=settings.OPEN_API_KEY,
+                timeout=settings.HTTP_TIMEOUT[1],
+                max_retries=settings.HTTP_RETRIES,
+            )
+
+        return clients["openai"]
+
+
+def get_anthropic_client():
+    """
+    Return the process-wide Anthropic client, which keeps its own pool of connections alive between calls.
+    """
+    with clients_lock:
+        if "anthropic" not in clients:
+            clients["anthropic"] = anthropic.Anthropic(
+                api_key=settings.ANTHROPIC_API_KEY,
+                timeout=settings.HTTP_TIMEOUT[1],
+                max_retries=settings.HTTP_RETRIES,
+            )
+
+        return clients["anthropic"]
+
+
+def download_file(url: str, path: str, headers: dict = None) -> str:
+    """
+    Download a file through the pooled session, streaming it to `path`.
+
+    Parameters:
+    -----------
+    url : str
+        The URL of the file.
+    path : str
+        The file path where the file will be saved.
+    headers : dict, optional
+        Extra headers of the request.
+
+    Returns:
+    --------
+    str
+        The file path of the downloaded file.
+
+    Raises:
+    -------
+    requests.exceptions.RequestException
+        If the request fails or the server answers with an error status.
+    """
+    with session.get(url, headers=headers, stream=True) as response:
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                if chunk:
+                    f.write(chunk)
+
+    return path
+
+
+def report() -> dict:
+    return session.report()
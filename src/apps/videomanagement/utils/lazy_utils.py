@@ -0,0 +1,65 @@
+import importlib
+import threading
+from types import ModuleType
+
+
+class LazyModule:
+    """
+    A stand-in for a module that is only imported on first use.
+
+    The ML and provider stacks, torch, TTS, moviepy, g4f, the Gemini, OpenAI and Anthropic SDKs, take
+    seconds and hundreds of megabytes to import. The web workers and most management commands never call
+    them, so the modules using them bind a `LazyModule` in place of the module, and the import happens on
+    the first attribute access, in the process that actually needs it.
+
+    Attributes:
+    -----------
+    name : str
+        The dotted name of the module.
+    """
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    object.__setattr__(
+                        self, "_module", importlib.import_module(self.name)
+                    )
+
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+    def __setattr__(self, attr: str, value) -> None:
+        setattr(self.load(), attr, value)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module '{self.name}' ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Return a facade of a module that imports it on first use.
+
+    Parameters:
+    -----------
+    name : str
+        The dotted name of the module, e.g. "TTS.utils.synthesizer".
+
+    Returns:
+    --------
+    LazyModule
+        The facade, forwarding every attribute access to the module.
+    """
+    return LazyModule(name)
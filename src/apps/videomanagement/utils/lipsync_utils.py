@@ -0,0 +1,439 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from multiprocessing.connection import Client, Listener
+from typing import Union
+
+from django.conf import settings
+
+from .cache_utils import hash_file, hash_key
+
+logger = logging.getLogger(__name__)
+
+# The SadTalker configuration used for the avatar videos. Narrations longer than twice `chunk_seconds`
+# are animated in overlapping chunks, rendered by `chunk_workers` processes, and with `idle_loop` the
+# silent stretches are filled from the idle loop of the avatar.
+LIP_OPTIONS = {
+    "facerender": "pirender",
+    "still": True,
+    "enhancer": None,
+    "expression_scale": 1,
+    "frame_chunk": settings.LIPSYNC_FRAME_CHUNK,
+    "chunk_seconds": settings.LIPSYNC_CHUNK_SECONDS,
+    "chunk_overlap": settings.LIPSYNC_CHUNK_OVERLAP,
+    "chunk_workers": settings.LIPSYNC_CHUNK_WORKERS,
+    "idle_loop": settings.LIPSYNC_IDLE_LOOP,
+}
+MODEL_OPTIONS = (
+    "checkpoint_dir",
+    "size",
+    "old_version",
+    "preprocess",
+    "facerender",
+    "cpu",
+)
+LOAD_ONLY_OPTIONS = ("checkpoint_dir", "old_version", "facerender", "cpu")
+# The options that change the frames of an avatar clip, which the clip cache key is built from.
+RENDER_OPTIONS = (
+    "preprocess",
+    "size",
+    "facerender",
+    "still",
+    "enhancer",
+    "expression_scale",
+    "pose_style",
+    "frame_chunk",
+    "chunk_seconds",
+    "chunk_overlap",
+    "idle_loop",
+)
+
+
+class LipSyncError(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+class LipSyncServer:
+    """
+    A long-lived lip-sync worker that keeps the SadTalker models loaded and serves jobs over a local socket.
+
+    Every request is a dict with an `op`, one of "lip", "preprocess", "health" or "warmup", and the reply is a dict with
+    `ok` set. Each connection is served by its own thread, so a health check is answered while a job runs;
+    the jobs themselves run one at a time on the resident models.
+
+    Attributes:
+    -----------
+    address : tuple[str, int]
+        The host and port the server listens on.
+    authkey : bytes
+        The key the clients must authenticate with.
+    options : dict
+        The SadTalker options of the jobs, `LIP_OPTIONS` by default.
+    """
+
+    def __init__(self, address: str, authkey: bytes, options: dict = None):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.options = dict(LIP_OPTIONS if options is None else options)
+        self.started = time.time()
+        self.jobs = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def model_options(self) -> dict:
+        return {k: v for k, v in self.options.items() if k in MODEL_OPTIONS}
+
+    def warm_up(self) -> dict:
+        """
+        Load the models of the configured options and return how long the load took.
+        """
+        from .SadTalker.inference import get_models
+
+        models = get_models(**self.model_options())
+        logger.info(
+            f"Lip-sync models ready on {models.device} in {models.load_time:.2f}s"
+        )
+        return {"device": models.device, "load_time": models.load_time}
+
+    def health(self) -> dict:
+        from .SadTalker.inference import loaded_models
+
+        return {
+            "uptime": time.time() - self.started,
+            "jobs": self.jobs,
+            "failures": self.failures,
+            "models": [
+                {
+                    "device": models.device,
+                    "load_time": models.load_time,
+                    "jobs": models.jobs,
+                    "last_timings": models.last_timings,
+                }
+                for models in loaded_models()
+            ],
+        }
+
+    def lip(self, source_image: str, driven_audio: str, result_dir: str) -> dict:
+        path, timings = run_lip_sync(
+            source_image, driven_audio, result_dir, self.options
+        )
+        if path is None:
+            raise LipSyncError("Could not find a face in the avatar image.")
+
+        logger.info(f"Lip-sync job done: {path} {timings}")
+        return {"path": path, "timings": timings}
+
+    def preprocess(self, source_image: str) -> dict:
+        first_coeff_path, _, _ = preprocess_avatar(source_image, self.options)
+        return {"cached": first_coeff_path is not None}
+
+    def handle(self, conn) -> None:
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                op = request.pop("op", None)
+                try:
+                    if op == "lip":
+                        reply = self.lip(**request)
+                        with self._lock:
+                            self.jobs += 1
+                    elif op == "health":
+                        reply = self.health()
+                    elif op == "preprocess":
+                        reply = self.preprocess(**request)
+                    elif op == "warmup":
+                        reply = self.warm_up()
+                    else:
+                        raise LipSyncError(f"Unknown operation {op}.")
+
+                    conn.send({"ok": True, **reply})
+
+                except Exception as exc:
+                    logger.exception(f"Lip-sync request {op} failed")
+                    if op == "lip":
+                        with self._lock:
+                            self.failures += 1
+
+                    conn.send({"ok": False, "error": str(exc)})
+
+    def serve_forever(self) -> None:
+        with Listener(self.address, authkey=self.authkey) as listener:
+            logger.info(
+                f"Lip-sync server listening on {self.address[0]}:{self.address[1]}"
+            )
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as exc:
+                    logger.warning(f"Rejected a lip-sync connection: {exc}")
+                    continue
+
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+
+class LipSyncClient:
+    """
+    A client of the `LipSyncServer`, opening one connection per request.
+    """
+
+    def __init__(self, address: str, authkey: bytes, timeout: float = 3600):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.timeout = timeout
+
+    def request(self, op: str, timeout: float = None, **kwargs) -> dict:
+        with Client(self.address, authkey=self.authkey) as conn:
+            conn.send({"op": op, **kwargs})
+            if not conn.poll(self.timeout if timeout is None else timeout):
+                raise LipSyncError(f"The lip-sync server did not answer {op} in time.")
+
+            reply = conn.recv()
+
+        if not reply.pop("ok", False):
+            raise LipSyncError(reply.get("error", "Unknown lip-sync server error."))
+
+        return reply
+
+    def lip(self, source_image: str, driven_audio: str, result_dir: str) -> str:
+        reply = self.request(
+            "lip",
+            source_image=source_image,
+            driven_audio=driven_audio,
+            result_dir=result_dir,
+        )
+        logger.info(f"Lip-sync stage timings: {reply['timings']}")
+        return reply["path"]
+
+    def preprocess(self, source_image: str) -> dict:
+        return self.request("preprocess", source_image=source_image)
+
+    def health(self) -> dict:
+        return self.request("health", timeout=10)
+
+    def warm_up(self) -> dict:
+        return self.request("warmup")
+
+
+def get_client() -> Union[LipSyncClient, None]:
+    if not settings.LIPSYNC_SERVER_ADDRESS:
+        return None
+
+    return LipSyncClient(
+        settings.LIPSYNC_SERVER_ADDRESS,
+        settings.LIPSYNC_SERVER_AUTHKEY.encode(),
+        timeout=settings.LIPSYNC_TIMEOUT,
+    )
+
+
+def lip_sync(source_image: str, driven_audio: str, result_dir: str) -> Union[str, None]:
+    """
+    Animate the avatar image with the audio on the lip-sync server, or in this process if no server is
+    configured or it cannot be reached.
+
+    Parameters:
+    -----------
+    source_image : str
+        The file path of the avatar image.
+    driven_audio : str
+        The file path of the narration audio.
+    result_dir : str
+        The directory where the generated video is saved.
+
+    Returns:
+    --------
+    str or None
+        The file path of the generated video, or None if no face was found in the image.
+    """
+    client = get_client()
+    if client:
+        try:
+            return client.lip(
+                os.path.abspath(source_image),
+                os.path.abspath(driven_audio),
+                os.path.abspath(result_dir),
+            )
+
+        except (ConnectionError, OSError) as exc:
+            logger.warning(f"Lip-sync server unreachable, running in process: {exc}")
+
+    path, timings = run_lip_sync(source_image, driven_audio, result_dir)
+    logger.info(f"Lip-sync stage timings: {timings}")
+    return path
+
+
+def run_lip_sync(
+    source_image: str, driven_audio: str, result_dir: str, options: dict = None
+) -> tuple[Union[str, None], dict]:
+    """
+    Animate the avatar image with the audio on the models of this process, using the cached
+    preprocessing of the image.
+
+    Returns:
+    --------
+    tuple[str or None, dict]
+        The file path of the generated video, or None if no face was found in the image, and the time
+        spent in every stage in seconds.
+    """
+    from .SadTalker.inference import get_models
+
+    start = time.perf_counter()
+    options = dict(LIP_OPTIONS if options is None else options)
+    models = get_models(**{k: v for k, v in options.items() if k in MODEL_OPTIONS})
+
+    source = preprocess_avatar(source_image, options)
+    preprocess_time = time.perf_counter() - start
+
+    path, timings = models.generate(
+        source_image,
+        driven_audio,
+        result_dir=result_dir,
+        source=source,
+        **{k: v for k, v in options.items() if k not in LOAD_ONLY_OPTIONS},
+    )
+    timings["preprocess"] = preprocess_time
+    timings["total"] = time.perf_counter() - start
+    return path, timings
+
+
+def avatar_cache_key(source_image: str, options: dict) -> str:
+    return hash_key(
+        hash_file(source_image),
+        options.get("preprocess", "crop"),
+        options.get("size", 256),
+    )
+
+
+def clip_cache_key(audio_path: str, avatar_key: str, options: dict = None) -> str:
+    """
+    Build the cache key of an avatar clip from the content of its audio, the `avatar_cache_key` of the
+    avatar image and every option that changes its frames, so changing any of them animates it again.
+    """
+    options = LIP_OPTIONS if options is None else options
+    return hash_key(
+        hash_file(audio_path),
+        avatar_key,
+        {name: options.get(name) for name in RENDER_OPTIONS},
+    )
+
+
+def preprocess_avatar(
+    source_image: str, options: dict = None
+) -> tuple[Union[str, None], Union[str, None], Union[tuple, None]]:
+    """
+    Return the crop, landmarks and 3DMM coefficients of an avatar image from the avatar cache, extracting
+    them on a miss.
+
+    The entries are keyed by the content hash of the image with the crop mode and size, so an avatar
+    image is only run through face detection, landmarking and the 3DMM reconstruction once, however many
+    videos use it.
+
+    Parameters:
+    -----------
+    source_image : str
+        The file path of the avatar image.
+    options : dict, optional
+        The SadTalker options, `LIP_OPTIONS` by default.
+
+    Returns:
+    --------
+    tuple
+        The (first_coeff_path, crop_pic_path, crop_info) of the image, all None if no face was found.
+    """
+    from .SadTalker.inference import get_models
+
+    options = dict(LIP_OPTIONS if options is None else options)
+    key = avatar_cache_key(source_image, options)
+    entry = os.path.join(settings.AVATAR_CACHE_DIR, key)
+
+    cached = load_avatar_entry(entry)
+    if cached:
+        logger.info(f"Using the cached preprocessing of {source_image}")
+        return cached
+
+    models = get_models(**{k: v for k, v in options.items() if k in MODEL_OPTIONS})
+    tmp = f"{entry}.{uuid.uuid4().hex}.tmp"
+    try:
+        with models.lock:
+            first_coeff_path, _, crop_info = models.extract_source(
+                source_image,
+                tmp,
+                options.get("preprocess", "crop"),
+                options.get("size", 256),
+            )
+
+        if first_coeff_path is None:
+            return None, None, None
+
+        name = os.path.splitext(os.path.basename(source_image))[0]
+        for suffix in (".mat", ".png", "_landmarks.txt"):
+            os.replace(
+                os.path.join(tmp, f"{name}{suffix}"),
+                os.path.join(tmp, f"source{suffix}"),
+            )
+
+        with open(os.path.join(tmp, "crop_info.json"), "w") as f:
+            json.dump(crop_info, f, default=lambda value: value.item())
+
+        try:
+            os.replace(tmp, entry)
+        except OSError:
+            # Another worker stored the same entry first.
+            pass
+
+    finally:
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    return load_avatar_entry(entry)
+
+
+def load_avatar_entry(entry: str) -> Union[tuple[str, str, tuple], None]:
+    try:
+        with open(os.path.join(entry, "crop_info.json")) as f:
+            size, crop, quad = json.load(f)
+
+    except (OSError, ValueError):
+        return None
+
+    crop_info = (
+        tuple(size),
+        tuple(crop) if crop is not None else None,
+        tuple(quad) if quad is not None else None,
+    )
+    return (
+        os.path.join(entry, "source.mat"),
+        os.path.join(entry, "source.png"),
+        crop_info,
+    )
+
+
+def prepare_avatar(source_image: str) -> None:
+    """
+    Fill the avatar cache for an image ahead of its first render, on the lip-sync server if one is
+    configured.
+    """
+    client = get_client()
+    if client:
+        try:
+            client.preprocess(os.path.abspath(source_image))
+            return
+
+        except (ConnectionError, OSError) as exc:
+            logger.warning(f"Lip-sync server unreachable, running in process: {exc}")
+
+    preprocess_avatar(source_image)
@@ -12,3 +12,11 @@ default_providers = {"WEB": "bing", "AI": "DALL-E"}
 
 
 api_providers = {"open_ai": "tts_from_open_api", "eleven_labs": "tts_from_eleven_labs"}
+
+api_provider_settings = {
+    "open_ai": {"model": "tts-1"},
+    "eleven_labs": {
+        "model_id": "eleven_monolingual_v1",
+        "voice_settings": {"stability": 0.5, "similarity_boost": 0.5},
+    },
+}
@@ -0,0 +1,241 @@
+import logging
+import os
+import uuid
+from typing import Union
+
+import numpy as np
+from PIL import Image
+
+from ..models import Background, SceneImage, Video
+from .cache_utils import hash_file, hash_key
+from .exceptions import RenderFailedException
+from .ffmpeg_utils import FRAME_SIZE, KEY_BLEND, key_similarity, scene_frame_size
+from .file_utils import check_if_image
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = "renditions"
+RENDITION_FORMAT = "png"
+SAVE_OPTIONS = {"png": {"optimize": False}, "jpeg": {"quality": 95}}
+
+
+def rendition_path(
+    source: str, size: tuple[int, int], fmt: str = RENDITION_FORMAT
+) -> str:
+    """
+    Return the path of the rendition of an image at a size and format, in the "renditions" directory
+    next to the image.
+
+    The rendition is named after the content hash of the image with the size and the format, so a
+    replaced or edited image gets new renditions and the old ones are never served for it.
+    """
+    key = hash_key(hash_file(source), list(size), fmt)
+    return os.path.join(os.path.dirname(source), RENDITIONS_DIR, f"{key[:32]}.{fmt}")
+
+
+def get_rendition(
+    source: str, size: tuple[int, int], fmt: str = RENDITION_FORMAT
+) -> str:
+    """
+    Return the rendition of an image resized to `size`, creating it on first use.
+
+    The original image is never modified: the renditions are derived files, encoded once from the
+    original, so rendering a video again neither re-encodes the image nor loses quality.
+
+    Parameters:
+    -----------
+    source : str
+        The file path of the original image.
+    size : tuple[int, int]
+        The width and height of the rendition.
+    fmt : str, optional
+        The format of the rendition, "png" (lossless, the default) or "jpeg".
+
+    Returns:
+    --------
+    str
+        The file path of the rendition.
+    """
+    path = rendition_path(source, size, fmt)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with Image.open(source) as image:
+            image.convert("RGB").resize(size, Image.LANCZOS).save(
+                tmp, format=fmt.upper(), **SAVE_OPTIONS.get(fmt, {})
+            )
+
+        # Another worker may have stored the same rendition meanwhile, which is the same file.
+        os.replace(tmp, path)
+
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    logger.info(f"Created the {size[0]}x{size[1]} {fmt} rendition of {source}")
+    return path
+
+
+def colorkey_alpha(
+    pixels: np.ndarray, color: tuple[int, int, int], similarity: float
+) -> np.ndarray:
+    """
+    Compute the opacity of every pixel keyed against a color, as the colorkey filter of ffmpeg does.
+
+    Parameters:
+    -----------
+    pixels : np.ndarray
+        The (height, width, 3) RGB pixels.
+    color : tuple[int, int, int]
+        The RGB key color.
+    similarity : float
+        The distance to the key color, in [0, 1], below which a pixel is fully transparent; pixels fade to
+        opaque over the next `KEY_BLEND`.
+
+    Returns:
+    --------
+    np.ndarray
+        The (height, width, 1) float32 opacity, in [0, 1].
+    """
+    diff = pixels.astype(np.float32) - np.asarray(color, dtype=np.float32)
+    distance = np.sqrt(np.sum(np.square(diff), axis=2) / (3 * 255.0**2))
+    return np.clip((distance - similarity) / KEY_BLEND, 0.0, 1.0)[..., None]
+
+
+def composite_paths(source: str, background: Background) -> tuple[str, str]:
+    """
+    Return the paths of the two frames of a still scene composed over an image background, in the
+    "renditions" directory next to the scene image.
+
+    They are named after the content hashes of both images with everything the composition depends on,
+    so a change of the background image, its key color or its margins gets new frames.
+    """
+    key = hash_key(
+        hash_file(source),
+        hash_file(background.file.path),
+        background.color,
+        background.through,
+        background.image_pos_left,
+        background.image_pos_top,
+        list(FRAME_SIZE),
+    )[:32]
+    directory = os.path.join(os.path.dirname(source), RENDITIONS_DIR)
+    return (
+        os.path.join(directory, f"{key}_base.{RENDITION_FORMAT}"),
+        os.path.join(directory, f"{key}.{RENDITION_FORMAT}"),
+    )
+
+
+def get_composite(source: str, background: Background) -> tuple[str, str]:
+    """
+    Return a still scene keyed and laid over an image background, creating it on first use.
+
+    The scene is composed like `add_background` composes it for the ffmpeg renderers: the rendition of
+    the image at the frame size of the background, padded by the margins with black, keyed against the
+    color of the background and centered over the background scaled to `FRAME_SIZE`. That happens once
+    per scene image and background with NumPy, instead of masking every frame of the video.
+
+    Two frames are stored: the composite itself and the background with the keyed scene cut out of it.
+    Keyed at full brightness, the scene fading from and to black is a crossfade from the second to the
+    first.
+
+    Parameters:
+    -----------
+    source : str
+        The file path of the scene image.
+    background : Background
+        The background of the video, with an image file.
+
+    Returns:
+    --------
+    tuple[str, str]
+        The file paths of the background with the scene cut out and of the composite.
+    """
+    base_path, composite_path = composite_paths(source, background)
+    if os.path.exists(base_path) and os.path.exists(composite_path):
+        return base_path, composite_path
+
+    with Image.open(get_rendition(source, scene_frame_size(background))) as image:
+        scene = np.asarray(image.convert("RGB"), dtype=np.float32)
+
+    with Image.open(background.file.path) as image:
+        frame = np.asarray(
+            image.convert("RGB").resize(FRAME_SIZE, Image.LANCZOS), dtype=np.float32
+        )
+
+    left, top = int(background.image_pos_left), int(background.image_pos_top)
+    layer = np.pad(scene, ((top, 0), (left, 0), (0, 0)))
+    alpha = colorkey_alpha(
+        layer, [int(x) for x in background.color.split(",")], key_similarity(background)
+    )
+
+    # Centered like the overlay filter places it, cropped where the layer is larger than the frame.
+    x, y = (FRAME_SIZE[0] - layer.shape[1]) // 2, (FRAME_SIZE[1] - layer.shape[0]) // 2
+    dst_x, dst_y = max(x, 0), max(y, 0)
+    src_x, src_y = dst_x - x, dst_y - y
+    w = min(layer.shape[1] - src_x, FRAME_SIZE[0] - dst_x)
+    h = min(layer.shape[0] - src_y, FRAME_SIZE[1] - dst_y)
+    layer = layer[src_y : src_y + h, src_x : src_x + w]
+    alpha = alpha[src_y : src_y + h, src_x : src_x + w]
+
+    base = frame.copy()
+    base[dst_y : dst_y + h, dst_x : dst_x + w] *= 1.0 - alpha
+    composite = base.copy()
+    composite[dst_y : dst_y + h, dst_x : dst_x + w] += layer * alpha
+
+    os.makedirs(os.path.dirname(composite_path), exist_ok=True)
+    for path, pixels in ((base_path, base), (composite_path, composite)):
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            Image.fromarray(np.clip(np.rint(pixels), 0, 255).astype(np.uint8)).save(
+                tmp, format=RENDITION_FORMAT.upper(), **SAVE_OPTIONS[RENDITION_FORMAT]
+            )
+            os.replace(tmp, path)
+
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    logger.info(f"Composed {source} over {background.file.path}")
+    return base_path, composite_path
+
+
+def prepare_scene_image(scene_image: SceneImage) -> Union[str, None]:
+    """
+    Create the rendition of a scene image that the renders of its video use, ahead of the first render.
+
+    Only still images placed over a background are resized, to the frame size of that background; the
+    other scene images are rendered as they are. Over an image background, the composite of the scene
+    with the background is created as well.
+
+    Returns:
+    --------
+    str or None
+        The file path of the rendition, or None if the scene image does not need one.
+    """
+    if not scene_image.file or not check_if_image(scene_image.file.path):
+        return None
+
+    video = (
+        Video.objects.filter(prompt_id=scene_image.scene.prompt_id)
+        .select_related("background")
+        .first()
+    )
+    if not video or not video.background:
+        return None
+
+    try:
+        path = get_rendition(scene_image.file.path, scene_frame_size(video.background))
+        if check_if_image(video.background.file.path):
+            get_composite(scene_image.file.path, video.background)
+
+        return path
+
+    except (OSError, RenderFailedException) as exc:
+        logger.warning(
+            f"Could not create the rendition of {scene_image.file.path}: {exc}"
+        )
+        return None
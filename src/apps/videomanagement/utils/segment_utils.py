@@ -0,0 +1,474 @@
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Union
+
+from django.conf import settings
+
+from ..models import Scene, Video
+from .cache_utils import file_signature, hash_key
+from .exceptions import RenderFailedException
+from .ffmpeg_utils import (
+    AUDIO_FORMAT,
+    FPS,
+    FRAME_SIZE,
+    SAMPLE_RATE,
+    VIDEO_ENCODING,
+    FilterGraph,
+    ScenePlan,
+    add_avatar,
+    add_background,
+    add_scene_visual,
+    add_subtitles,
+    has_audio,
+    media_duration,
+    plan_scenes,
+    run_ffmpeg,
+    scene_frame_size,
+)
+from .timeline_utils import AudioTimeline, build_timeline
+
+logger = logging.getLogger(__name__)
+
+# Every segment is written with the same codec, frame rate, size and time base, which is what lets the
+# concat demuxer join them without re-encoding.
+SEGMENT_ENCODING = [
+    *VIDEO_ENCODING,
+    "-g",
+    str(FPS * 2),
+    "-video_track_timescale",
+    str(FPS * 512),
+    "-an",
+]
+
+
+@dataclass
+class Segment:
+    """
+    A part of the final video that is encoded on its own: a scene, the intro or the outro.
+
+    The segment files are named after the fingerprint of the segment, so an unchanged scene is found
+    already encoded by the next render and only the changed scenes are encoded again.
+
+    Attributes:
+    -----------
+    name : str
+        A readable name of the segment, used in the logs.
+    frames : int
+        The exact number of frames of the segment, so the joined segments stay in sync with the audio.
+    graph : FilterGraph
+        The filter graph producing the frames of the segment.
+    label : str
+        The output label of the graph.
+    scene : Scene, optional
+        The scene of the segment, None for the intro and the outro.
+    """
+
+    name: str
+    frames: int
+    graph: FilterGraph
+    label: str
+    scene: Union[Scene, None] = None
+    output: str = ""
+
+    def command(self, output: str, *options: str) -> list[str]:
+        return self.graph.command(
+            [self.label],
+            output,
+            *SEGMENT_ENCODING,
+            "-frames:v",
+            str(self.frames),
+            *options,
+        )
+
+    def fingerprint(self) -> str:
+        """
+        Hash the ffmpeg command of the segment with the signatures of its input files.
+
+        The command holds everything the frames depend on: the filters with their timings, colors and
+        positions, the subtitle text files, named after their text, and the encoding options.
+        """
+        signatures = [
+            file_signature(options[-1])
+            for options in self.graph.inputs
+            if os.path.isfile(options[-1])
+        ]
+        return hash_key(self.command(""), signatures)
+
+
+def to_frames(seconds: float) -> int:
+    return int(round(seconds * FPS))
+
+
+def scene_frames(timeline: AudioTimeline) -> list[int]:
+    """
+    The number of frames of every scene, cut at the frame nearest to the end of its span of the timeline,
+    so the rounding never accumulates over the scenes.
+    """
+    return [
+        to_frames(offset + duration) - to_frames(offset)
+        for offset, duration in zip(timeline.offsets, timeline.durations)
+    ]
+
+
+def build_scene_segment(
+    video: Video,
+    plan: ScenePlan,
+    offset: float,
+    frames: int,
+    size: tuple[int, int],
+    avatar_path: Union[str, None],
+    avatar_total: float = None,
+) -> Segment:
+    """
+    Build the filter graph of a single scene, composed exactly like its span of the full ffmpeg render.
+
+    Parameters:
+    -----------
+    video : Video
+        The video of the scene.
+    plan : ScenePlan
+        The resolved inputs and duration of the scene.
+    offset : float
+        The start of the scene in the timeline of the video, used for the background, the avatar and the
+        fades that span several scenes.
+    frames : int
+        The number of frames of the segment.
+    size : tuple[int, int]
+        The frame size of the scene visual.
+    avatar_path : str or None
+        The avatar clip of the scene, lip-synced to its audio, if any.
+    avatar_total : float, optional
+        The duration of the avatar in the timeline of the video, which places its fades.
+
+    Returns:
+    --------
+    Segment
+    """
+    graph = FilterGraph()
+    base = add_scene_visual(graph, plan, size)
+
+    if video.background:
+        base = add_background(graph, base, video.background, plan.duration, offset)
+    else:
+        base = graph.add(base, f"scale={FRAME_SIZE[0]}:{FRAME_SIZE[1]},setsar=1", "v")
+
+    if avatar_path:
+        base = add_avatar(
+            graph,
+            base,
+            avatar_path,
+            video.settings.get("avatar_position", "right,top"),
+            offset=offset,
+            duration=plan.duration,
+            start=offset,
+            total=avatar_total,
+        )
+
+    if video.settings.get("subtitles", False):
+        base = add_subtitles(graph, base, [plan], video)
+
+    return Segment(
+        name=f"scene {plan.scene.id}",
+        frames=frames,
+        graph=graph,
+        label=graph.add(base, "tpad=stop_mode=clone:stop_duration=1", "v"),
+        scene=plan.scene,
+    )
+
+
+def build_bumper_segment(name: str, path: str) -> Segment:
+    graph = FilterGraph()
+    index = graph.add_input(path)
+    label = graph.add(
+        f"{index}:v",
+        f"scale={FRAME_SIZE[0]}:{FRAME_SIZE[1]},setsar=1,fps={FPS},format=yuv420p,"
+        "tpad=stop_mode=clone:stop_duration=1",
+        "v",
+    )
+    return Segment(
+        name=name,
+        frames=to_frames(media_duration(path)),
+        graph=graph,
+        label=label,
+    )
+
+
+def encode_segment(segment: Segment, threads: int) -> str:
+    """
+    Encode a segment, writing it to a temporary file first so a failed run never leaves a partial segment.
+    """
+    start = time.perf_counter()
+    tmp = f"{segment.output}.{uuid.uuid4().hex}.mp4"
+
+    try:
+        run_ffmpeg(segment.command(tmp, "-threads", str(threads)))
+        os.replace(tmp, segment.output)
+
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    logger.info(
+        f"Rendered {segment.name} ({segment.frames} frames) in {time.perf_counter() - start:.2f}s"
+    )
+    return segment.output
+
+
+def encode_segments(
+    segments: list[Segment], workers: int = None, retries: int = None
+) -> None:
+    """
+    Encode the segments in parallel, retrying every failed segment on its own.
+
+    Every worker drives its own ffmpeg process, so the encoding scales with the cores, while the x264
+    threads of each process are capped to share the cores between the workers.
+
+    Raises:
+    -------
+    RenderFailedException
+        If a segment still fails after its retries.
+    """
+    workers = workers or settings.RENDER_WORKERS
+    retries = settings.RENDER_SEGMENT_RETRIES if retries is None else retries
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    pending = list(segments)
+    if not pending:
+        return
+
+    for attempt in range(retries + 1):
+        failed = []
+        with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            futures = {
+                executor.submit(encode_segment, segment, threads): segment
+                for segment in pending
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+
+                except RenderFailedException as exc:
+                    logger.warning(
+                        f"Rendering {futures[future].name} failed (attempt {attempt + 1}): {exc}"
+                    )
+                    failed.append(futures[future])
+
+        if not failed:
+            return
+
+        pending = failed
+
+    raise RenderFailedException(
+        f"Could not render {', '.join(segment.name for segment in pending)}."
+    )
+
+
+def write_final_audio(
+    video: Video,
+    mix_path: str,
+    body_duration: float,
+    bumpers: dict[str, Segment],
+    output: str,
+) -> str:
+    """
+    Write the audio track of the whole video in a single pass: the intro, the narration mixed with the
+    music by the audio timeline, and the outro, each part trimmed or padded to the frames of its video
+    segments.
+    """
+    graph = FilterGraph()
+    parts = []
+
+    for name in ("intro", "body", "outro"):
+        if name == "body":
+            parts.append(
+                graph.add(
+                    f"{graph.add_input(mix_path)}:a",
+                    f"{AUDIO_FORMAT},apad,atrim=0:{body_duration:.4f}",
+                    "a",
+                )
+            )
+            continue
+
+        bumper = bumpers.get(name)
+        if not bumper:
+            continue
+
+        path = getattr(video, name).file.path
+        duration = bumper.frames / FPS
+        if has_audio(path):
+            index = graph.add_input(path)
+        else:
+            index = graph.add_input(
+                f"anullsrc=r={SAMPLE_RATE}:cl=stereo",
+                "-f",
+                "lavfi",
+                "-t",
+                f"{duration:.4f}",
+            )
+
+        parts.append(
+            graph.add(f"{index}:a", f"{AUDIO_FORMAT},apad,atrim=0:{duration:.4f}", "a")
+        )
+
+    audio = parts[0]
+    if len(parts) > 1:
+        audio = graph.add(parts, f"concat=n={len(parts)}:v=0:a=1", "a")
+
+    run_ffmpeg(graph.command([audio], output, "-c:a", "aac", "-b:a", "192k"))
+    return output
+
+
+def concat_segments(paths: list[str], audio: str, output: str, list_path: str) -> str:
+    """
+    Join the segments with the concat demuxer and mux the audio track, copying both streams as they are.
+    """
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    run_ffmpeg(
+        [
+            "-y",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            list_path,
+            "-i",
+            audio,
+            "-map",
+            "0:v",
+            "-map",
+            "1:a",
+            "-c",
+            "copy",
+            "-shortest",
+            "-movflags",
+            "+faststart",
+            output,
+        ]
+    )
+    return output
+
+
+def render_with_segments(
+    video: Video,
+    output: str,
+    avatar_clips: Callable[[Video, list[ScenePlan], AudioTimeline], list[str]] = None,
+    workers: int = None,
+) -> str:
+    """
+    Render every scene as an independent, identically encoded segment in parallel and join them without
+    re-encoding.
+
+    The audio of the whole video is laid out and mixed once into its own track by the audio timeline, so
+    the segments carry video only and the joins stay free of audio gaps. Each segment is cut to the
+    exact frames of its span of the timeline, so the video stays in sync with the audio however many
+    scenes there are.
+
+    The segments of the previous render are kept, named after their fingerprint, so after a scene is
+    edited only the scenes whose fingerprint changed are encoded again before the concatenation. Every
+    scene overlays the avatar clip of its own audio, so an edited scene does not change the others.
+
+    Parameters:
+    -----------
+    video : Video
+        The video to render.
+    output : str
+        The file path of the rendered video.
+    avatar_clips : Callable, optional
+        Returns the paths of the avatar clips of the scenes of a video from its scene plans and audio
+        timeline, each lip-synced to the audio of its scene, or an empty list if the avatar could not
+        be animated.
+    workers : int, optional
+        The number of segments encoded at once. Defaults to `settings.RENDER_WORKERS`.
+
+    Returns:
+    --------
+    str
+        The file path of the rendered video.
+    """
+    start = time.perf_counter()
+    plans = plan_scenes(video)
+    if not plans:
+        raise RenderFailedException("No video scenes were processed.")
+
+    segments_dir = os.path.join(video.dir_name, "segments")
+    os.makedirs(segments_dir, exist_ok=True)
+
+    timeline = build_timeline(plans)
+    timeline.write_narration(f"{video.dir_name}/output_audio.wav")
+    mix_path = timeline.write_mix(video, os.path.join(segments_dir, "mix.wav"))
+    clips = []
+    if getattr(video, "avatar", None) and avatar_clips:
+        clips = avatar_clips(video, plans, timeline)
+
+    size = scene_frame_size(video.background)
+    total = timeline.duration
+    segments = []
+    for index, (plan, offset, frames) in enumerate(
+        zip(plans, timeline.offsets, scene_frames(timeline))
+    ):
+        clip = clips[index] if clips else None
+        segments.append(
+            build_scene_segment(video, plan, offset, frames, size, clip, total)
+        )
+
+    body_duration = sum(segment.frames for segment in segments) / FPS
+    bumpers = {}
+    for name in ("intro", "outro"):
+        if getattr(video, name, None):
+            bumpers[name] = build_bumper_segment(name, getattr(video, name).file.path)
+
+    ordered = [bumpers["intro"]] if "intro" in bumpers else []
+    ordered += segments
+    ordered += [bumpers["outro"]] if "outro" in bumpers else []
+
+    changed = {}
+    for segment in ordered:
+        segment.output = os.path.join(segments_dir, f"{segment.fingerprint()}.mp4")
+        if not os.path.exists(segment.output):
+            changed.setdefault(segment.output, segment)
+
+    logger.info(
+        f"Video {video.id}: {len(changed)} of {len(ordered)} segments changed since the last render"
+    )
+    encode_segments(list(changed.values()), workers=workers)
+
+    audio_path = write_final_audio(
+        video,
+        mix_path,
+        body_duration,
+        bumpers,
+        os.path.join(segments_dir, "audio.m4a"),
+    )
+    concat_segments(
+        [segment.output for segment in ordered],
+        audio_path,
+        output,
+        os.path.join(segments_dir, "segments.txt"),
+    )
+    prune_segments(segments_dir, {segment.output for segment in ordered})
+
+    logger.info(
+        f"Rendered {len(ordered)} segments of video {video.id} in {time.perf_counter() - start:.2f}s"
+    )
+    return output
+
+
+def prune_segments(segments_dir: str, keep: set[str]) -> None:
+    """
+    Remove the segments of the previous renders that the video no longer uses.
+    """
+    for name in os.listdir(segments_dir):
+        path = os.path.join(segments_dir, name)
+        if name.endswith(".mp4") and path not in keep:
+            try:
+                os.remove(path)
+            except OSError as exc:
+                logger.warning(f"Could not remove the stale segment {path}: {exc}")
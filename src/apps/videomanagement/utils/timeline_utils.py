@@ -0,0 +1,268 @@
+import logging
+import wave
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from ..models import Video
+from .ffmpeg_utils import SAMPLE_RATE, ScenePlan, run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = 2
+# The length of the windows the speech level of the narration is measured on, for the music ducking.
+DUCKING_WINDOW = 0.02
+# The level above which a window counts as speech, about -40 dBFS.
+DUCKING_THRESHOLD = 0.01
+# How long the music takes to dip under the speech and to come back, in seconds.
+DUCKING_RAMP = 0.3
+WRITE_CHUNK = 1 << 20
+
+
+def decode_audio(path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode the audio of a file with ffmpeg into stereo float samples at a fixed sample rate.
+
+    Parameters:
+    -----------
+    path : str
+        The file path of the audio, or of a video with an audio stream.
+    sample_rate : int, optional
+        The sample rate the audio is resampled to.
+
+    Returns:
+    --------
+    np.ndarray
+        The (samples, 2) float32 samples, in [-1, 1].
+    """
+    result = run_ffmpeg(
+        [
+            "-v",
+            "error",
+            "-i",
+            path,
+            "-vn",
+            "-ac",
+            str(CHANNELS),
+            "-ar",
+            str(sample_rate),
+            "-f",
+            "f32le",
+            "-",
+        ],
+        text=False,
+    )
+    return np.frombuffer(result.stdout, dtype="<f4").reshape(-1, CHANNELS)
+
+
+def write_wav(path: str, samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> str:
+    """
+    Write float samples as a 16 bit PCM WAV file, a chunk at a time, so the same samples always give
+    the same bytes.
+    """
+    with wave.open(path, "wb") as f:
+        f.setnchannels(samples.shape[1])
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        for start in range(0, len(samples), WRITE_CHUNK):
+            chunk = samples[start : start + WRITE_CHUNK] * 32768.0
+            np.clip(np.rint(chunk, out=chunk), -32768, 32767, out=chunk)
+            f.writeframes(chunk.astype("<i2").tobytes())
+
+    return path
+
+
+@dataclass
+class AudioTimeline:
+    """
+    The narration of a whole video laid out in a single buffer, scene after scene.
+
+    Every source is decoded once at `SAMPLE_RATE`, however many scenes use it, and copied into its place
+    in a buffer allocated once for the whole video. The narration WAV that drives the avatar, the audio
+    of every scene and the final mix with the music are all cut or mixed from that buffer, so no audio
+    is decoded or concatenated twice.
+
+    Attributes:
+    -----------
+    samples : np.ndarray
+        The (samples, 2) float32 narration of the video.
+    spans : list[tuple[int, int]]
+        The first and the end sample of every scene in `samples`.
+    sample_rate : int
+        The sample rate of `samples`.
+    """
+
+    samples: np.ndarray
+    spans: list[tuple[int, int]] = field(default_factory=list)
+    sample_rate: int = SAMPLE_RATE
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+    @property
+    def durations(self) -> list[float]:
+        """
+        The duration of every scene, in seconds, the lengths the renderers cut the video of the scenes to.
+        """
+        return [(end - start) / self.sample_rate for start, end in self.spans]
+
+    @property
+    def offsets(self) -> list[float]:
+        """
+        The start of every scene in the video, in seconds.
+        """
+        return [start / self.sample_rate for start, _ in self.spans]
+
+    def scene(self, index: int) -> np.ndarray:
+        start, end = self.spans[index]
+        return self.samples[start:end]
+
+    def write_scene(self, index: int, output: str) -> str:
+        return write_wav(output, self.scene(index), self.sample_rate)
+
+    def write_narration(self, output: str) -> str:
+        return write_wav(output, self.samples, self.sample_rate)
+
+    def mix(self, video: Video) -> np.ndarray:
+        """
+        Mix the music of the video under the narration.
+
+        The music is looped to the length of the narration, scaled by the "music_volume" of the video
+        settings, faded in and out over a tenth of the video (four seconds at most) and, with a
+        "music_ducking" below 1, scaled down by that factor wherever the narration speaks. Every step is
+        applied to the whole buffer at once.
+
+        Returns:
+        --------
+        np.ndarray
+            The mixed samples, or the narration itself if the video has no music.
+        """
+        if not getattr(video, "music", None):
+            return self.samples
+
+        length = len(self.samples)
+        music = np.resize(
+            decode_audio(video.music.file.path, self.sample_rate), (length, CHANNELS)
+        )
+
+        volume = video.settings.get("music_volume", 0.07)
+        ducking = video.settings.get("music_ducking", 1.0)
+        if ducking < 1.0:
+            apply_ducking(
+                music, self.samples, volume, volume * ducking, self.sample_rate
+            )
+        else:
+            music *= volume
+
+        fade = min(int(4 * self.sample_rate), int(length * 0.1))
+        if fade:
+            ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)[:, None]
+            music[:fade] *= ramp
+            music[length - fade :] *= ramp[::-1]
+
+        music += self.samples
+        return music
+
+    def write_mix(self, video: Video, output: str) -> str:
+        return write_wav(output, self.mix(video), self.sample_rate)
+
+
+def apply_ducking(
+    music: np.ndarray,
+    narration: np.ndarray,
+    volume: float,
+    ducked_volume: float,
+    sample_rate: int = SAMPLE_RATE,
+) -> np.ndarray:
+    """
+    Scale the music in place by `volume`, or by `ducked_volume` where the narration speaks.
+
+    The speech is detected from the RMS level of short windows of the narration, and the gain of every
+    window is smoothed over `DUCKING_RAMP` seconds, so the music dips and recovers without clicks.
+    """
+    window = max(1, int(DUCKING_WINDOW * sample_rate))
+    windows = len(narration) // window
+    if not windows:
+        music *= volume
+        return music
+
+    blocks = narration[: windows * window].reshape(windows, window * CHANNELS)
+    level = np.sqrt(np.mean(np.square(blocks), axis=1))
+    gains = np.where(level > DUCKING_THRESHOLD, ducked_volume, volume).astype(
+        np.float32
+    )
+
+    ramp = max(1, int(DUCKING_RAMP / DUCKING_WINDOW))
+    kernel = np.full(ramp, 1.0 / ramp, dtype=np.float32)
+    gains = np.convolve(
+        np.pad(gains, (ramp // 2, ramp - 1 - ramp // 2), mode="edge"), kernel, "valid"
+    )
+
+    ducked = music[: windows * window].reshape(windows, window, CHANNELS)
+    ducked *= gains[:, None, None]
+    music[windows * window :] *= gains[-1]
+    return music
+
+
+def build_timeline(
+    plans: list[ScenePlan], sample_rate: int = SAMPLE_RATE
+) -> AudioTimeline:
+    """
+    Lay out the audio of the scenes of a video in a single buffer, following the scene plans.
+
+    The speech of a scene starts with the scene and a scene video with audio is mixed on top of it; the
+    silences of its tail follow the longer of the two.
+
+    The lengths come from the decoded samples, which can differ from the duration ffprobe estimates for an
+    MP3 stream, so the span of every scene is the single source of its length: the `duration` of every plan
+    is set to it.
+
+    Parameters:
+    -----------
+    plans : list[ScenePlan]
+        The scenes of the video, as resolved by `plan_scenes`.
+    sample_rate : int, optional
+        The sample rate of the timeline.
+
+    Returns:
+    --------
+    AudioTimeline
+        The narration of the video with the span of every scene.
+    """
+    decoded = {}
+
+    def decode(path: str) -> np.ndarray:
+        if path not in decoded:
+            decoded[path] = decode_audio(path, sample_rate)
+        return decoded[path]
+
+    layouts, length = [], 0
+    for plan in plans:
+        body = [decode(plan.speech)] if plan.speech else []
+        if plan.mix_visual_audio:
+            body.append(decode(plan.visual))
+
+        tail = [decode(path) for path in plan.tail]
+        body_length = max((len(part) for part in body), default=0)
+        layouts.append((length, body, tail))
+        length += body_length + sum(len(part) for part in tail)
+
+    samples = np.zeros((length, CHANNELS), dtype=np.float32)
+    spans = []
+    for index, (start, body, tail) in enumerate(layouts):
+        for part in body:
+            samples[start : start + len(part)] += part
+
+        cursor = start + max((len(part) for part in body), default=0)
+        for part in tail:
+            samples[cursor : cursor + len(part)] = part
+            cursor += len(part)
+
+        spans.append((start, cursor))
+        plans[index].duration = (cursor - start) / sample_rate
+
+    logger.info(
+        f"Laid out {len(plans)} scenes from {len(decoded)} sources, {length / sample_rate:.2f}s of audio"
+    )
+    return AudioTimeline(samples, spans, sample_rate)
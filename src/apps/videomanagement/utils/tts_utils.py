@@ -1,18 +1,31 @@
+from __future__ import annotations
+
 import os
-from dataclasses import dataclass
-from typing import Union
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Union
 import logging
-import requests
-from TTS.utils.manage import ModelManager
-from TTS.utils.synthesizer import Synthesizer
 from django.conf import settings
-from openai import OpenAI
-from .mapper import api_providers
+from .cache_utils import DiskCache, hash_key
+from .lazy_utils import lazy_import
+from .http_utils import session, get_openai_client
+from .mapper import api_providers, api_provider_settings
 import sys
 
+if TYPE_CHECKING:
+    from TTS.utils.synthesizer import Synthesizer
+
 logger = logging.getLogger(__name__)
 thismodule = sys.modules[__name__]
 
+torch = lazy_import("torch")
+tts_manage = lazy_import("TTS.utils.manage")
+tts_synthesizer = lazy_import("TTS.utils.synthesizer")
+
 
 @dataclass
 class ApiSyn:
@@ -58,7 +71,7 @@ def create_model(
       and proceeds without a vocoder.
     """
     try:
-        model_manager = ModelManager(model_path)
+        model_manager = tts_manage.ModelManager(model_path)
         model_path, config_path, model_item = model_manager.download_model(model)
         if vocoder == "default_vocoder" and model_item.get(vocoder) is not None:
             voc_path, voc_config_path, _ = model_manager.download_model(
@@ -76,7 +89,7 @@ def create_model(
             voc_path, voc_config_path = None, None
 
         if voc_path is not None and voc_config_path is not None:
-            syn = Synthesizer(
+            syn = tts_synthesizer.Synthesizer(
                 tts_checkpoint=model_path,
                 tts_config_path=config_path,
                 vocoder_checkpoint=voc_path,
@@ -84,7 +97,9 @@ def create_model(
             )
 
         else:
-            syn = Synthesizer(tts_checkpoint=model_path, tts_config_path=config_path)
+            syn = tts_synthesizer.Synthesizer(
+                tts_checkpoint=model_path, tts_config_path=config_path
+            )
 
     except Exception as exc:
         print(exc)
@@ -93,11 +108,181 @@ def create_model(
     return syn
 
 
+def estimate_synthesizer_size(syn: Synthesizer) -> int:
+    """
+    Estimate the memory held by a Synthesizer, in bytes.
+
+    The estimate is the sum of the parameter and buffer sizes of the tts model and the vocoder model,
+    which is what dominates the resident size of a loaded Coqui synthesizer.
+    """
+    size = 0
+    for attr in ("tts_model", "vocoder_model"):
+        module = getattr(syn, attr, None)
+        if module is None or not hasattr(module, "parameters"):
+            continue
+
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            size += tensor.numel() * tensor.element_size()
+
+    return size
+
+
+@dataclass
+class SynthesizerPoolStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    load_time: float = 0.0
+    loads: dict = field(default_factory=dict)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class SynthesizerPool:
+    """
+    A process-wide registry of loaded Synthesizer instances keyed by (model, vocoder).
+
+    Loading a Coqui model from disk takes seconds, so the loaded synthesizers are kept in memory and shared by
+    every caller in the process. The least recently used synthesizer is evicted once the pool holds more than
+    `max_models` entries or more than `max_memory` bytes. A model is loaded under its own lock, so the
+    callers of the models already loaded are not held up by a load.
+
+    Attributes:
+    -----------
+    max_models : int
+        The maximum number of synthesizers that are kept loaded.
+    max_memory : int
+        The maximum estimated memory, in bytes, of all the loaded synthesizers.
+    stats : SynthesizerPoolStats
+        The hit/miss counters and the accumulated load time of the pool.
+    """
+
+    def __init__(self, max_models: int = 2, max_memory: int = 2048 * 1024 * 1024):
+        self.max_models = max_models
+        self.max_memory = max_memory
+        self.stats = SynthesizerPoolStats()
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._load_locks = {}
+
+    def get(
+        self, model: str, vocoder: str = "default_vocoder"
+    ) -> Union[Synthesizer, None]:
+        """
+        Return the synthesizer for the given model and vocoder, loading it if it is not in the pool.
+
+        Parameters:
+        -----------
+        model : str
+            The model name, as accepted by `create_model`.
+        vocoder : str, optional
+            The vocoder name, as accepted by `create_model`. Default is "default_vocoder".
+
+        Returns:
+        --------
+        Synthesizer or None
+            The loaded synthesizer, or None if the model could not be loaded.
+        """
+        key = (model, vocoder)
+        with self._lock:
+            syn = self._lookup(key)
+            if syn is not None:
+                return syn
+
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # Another caller may have loaded the same model while this one waited.
+            with self._lock:
+                syn = self._lookup(key)
+                if syn is not None:
+                    return syn
+
+                self.stats.misses += 1
+
+            started = time.perf_counter()
+            syn = create_model(model=model, vocoder=vocoder)
+            elapsed = time.perf_counter() - started
+
+            if syn is None:
+                logger.warning(f"Could not load synthesizer {model} ({vocoder})")
+                return None
+
+            size = estimate_synthesizer_size(syn)
+            with self._lock:
+                self.stats.load_time += elapsed
+                self.stats.loads[f"{model}|{vocoder}"] = elapsed
+                self._entries[key] = (syn, size)
+                self._evict(keep=key)
+
+            logger.info(f"Loaded synthesizer {model} ({vocoder}) in {elapsed:.2f}s")
+            return syn
+
+    def _lookup(self, key: tuple) -> Union[Synthesizer, None]:
+        if key not in self._entries:
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return self._entries[key][0]
+
+    def memory_usage(self) -> int:
+        with self._lock:
+            return sum(size for _, size in self._entries.values())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def report(self) -> dict:
+        """
+        Return the pool metrics as a dict, suitable for logging.
+        """
+        with self._lock:
+            return {
+                "models": [f"{model}|{vocoder}" for model, vocoder in self._entries],
+                "memory": self.memory_usage(),
+                "hits": self.stats.hits,
+                "misses": self.stats.misses,
+                "hit_ratio": self.stats.hit_ratio,
+                "evictions": self.stats.evictions,
+                "load_time": self.stats.load_time,
+                "loads": dict(self.stats.loads),
+            }
+
+    def _evict(self, keep: tuple) -> None:
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_models
+            or self.memory_usage() > self.max_memory
+        ):
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+
+            self._entries.pop(oldest)
+            self.stats.evictions += 1
+            logger.info(f"Evicted synthesizer {oldest[0]} ({oldest[1]})")
+
+
+synthesizer_pool = SynthesizerPool(
+    max_models=settings.TTS_POOL_MAX_MODELS,
+    max_memory=settings.TTS_POOL_MAX_MEMORY_MB * 1024 * 1024,
+)
+
+speech_cache = DiskCache(
+    directory=settings.TTS_CACHE_DIR,
+    max_size=settings.TTS_CACHE_MAX_MB * 1024 * 1024,
+)
+
+
 def save(
     syn: Union[ApiSyn, Synthesizer], text: str = "", save_path: str = ""
 ) -> Union[str, None]:
     """
-    Save synthesized audio to a file.
+    Save synthesized audio to a file, reusing a cached synthesis of the same text and voice if there is one.
 
     Parameters:
     -----------
@@ -121,11 +306,12 @@ def save(
 
     Detailed Steps:
     ---------------
-    1. Check the type of synthesizer object provided.
-    2. If it's a Synthesizer object, synthesize the text using the Synthesizer's `tts` method and save the output to the
+    1. Look the text and voice up in the speech cache and copy the cached audio to the path on a hit.
+    2. Check the type of synthesizer object provided.
+    3. If it's a Synthesizer object, synthesize the text using the Synthesizer's `tts` method and save the output to the
        specified path.
-    3. If it's an ApiSyn object, determine the provider and call the appropriate API function to synthesize the text.
-    4. Save the synthesized audio to the specified path.
+    4. If it's an ApiSyn object, determine the provider and call the appropriate API function to synthesize the text.
+    5. Save the synthesized audio to the specified path and store a copy of it in the speech cache.
 
     Notes:
     ------
@@ -136,6 +322,17 @@ def save(
     if syn is None:
         return None
 
+    key = speech_cache_key(syn, text)
+    if load_cached_speech(key, save_path):
+        return save_path
+
+    synthesize(syn, text, save_path)
+    cache_speech(key, save_path)
+
+    return save_path
+
+
+def synthesize(syn: Union[ApiSyn, Synthesizer], text: str, save_path: str) -> None:
     if type(syn) is ApiSyn:
         getattr(thismodule, api_providers.get(syn.provider))(text, save_path, syn.path)
 
@@ -143,7 +340,264 @@ def save(
         outputs = syn.tts(text)
         syn.save_wav(outputs, save_path)
 
-    return save_path
+
+def load_cached_speech(key: str, save_path: str) -> Union[str, None]:
+    return speech_cache.get(key, save_path, suffix=os.path.splitext(save_path)[1])
+
+
+def cache_speech(key: str, save_path: str) -> bool:
+    """
+    Store the synthesized audio in the speech cache, if the synthesis produced any audio.
+    """
+    if not os.path.exists(save_path) or os.path.getsize(save_path) == 0:
+        return False
+
+    speech_cache.put(key, save_path, suffix=os.path.splitext(save_path)[1])
+    return True
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def speech_cache_key(syn: Union[ApiSyn, Synthesizer], text: str) -> str:
+    """
+    Return the speech cache key of a text spoken by a synthesizer.
+
+    The key covers the normalized text, the voice, the provider and the settings of the model, so a change
+    in any of them results in a new synthesis.
+    """
+    if type(syn) is ApiSyn:
+        return hash_key(
+            normalize_text(text),
+            syn.provider,
+            syn.path,
+            api_provider_settings.get(syn.provider),
+        )
+
+    return hash_key(
+        normalize_text(text),
+        "local",
+        getattr(syn, "tts_checkpoint", None),
+        getattr(syn, "vocoder_checkpoint", None),
+        getattr(syn, "output_sample_rate", None),
+    )
+
+
+def save_batch(
+    syn: Synthesizer, texts: list[str], save_paths: list[str], batch_size: int = 8
+) -> list[str]:
+    """
+    Synthesize several texts with a local model in padded mini-batches and save one audio file per text.
+
+    Parameters:
+    -----------
+    syn : Synthesizer
+        The loaded synthesizer. Its tts model must support batched inference with `x_lengths`, like VITS.
+    texts : list of str
+        The texts to synthesize.
+    save_paths : list of str
+        The file path of the audio for each text, in the same order as `texts`.
+    batch_size : int, optional
+        The number of texts sent through the model in one forward pass. Default is 8.
+
+    Returns:
+    --------
+    list of str
+        The file paths of the saved audio files, in the same order as `texts`.
+
+    Notes:
+    ------
+    - The texts are sorted by length before batching, so every batch carries as little padding as possible.
+    - The output of each batch item is trimmed to its own length using the output mask of the model.
+    - Texts found in the speech cache are copied from it and are not sent through the model.
+    - Any error is raised to the caller, which is expected to fall back to `save`.
+    """
+    model = syn.tts_model
+    hop_length = model.config.audio.hop_length
+    keys = [speech_cache_key(syn, text) for text in texts]
+    pending = [
+        i for i, key in enumerate(keys) if not load_cached_speech(key, save_paths[i])
+    ]
+    token_ids = {i: model.tokenizer.text_to_ids(texts[i]) for i in pending}
+    order = sorted(pending, key=lambda i: len(token_ids[i]))
+
+    with torch.no_grad():
+        for start in range(0, len(order), batch_size):
+            indexes = order[start : start + batch_size]
+            lengths = [len(token_ids[i]) for i in indexes]
+            x = torch.zeros((len(indexes), max(lengths)), dtype=torch.long)
+            for row, i in enumerate(indexes):
+                x[row, : lengths[row]] = torch.LongTensor(token_ids[i])
+
+            device = next(model.parameters()).device
+            outputs = model.inference(
+                x.to(device),
+                aux_input={"x_lengths": torch.LongTensor(lengths).to(device)},
+            )
+            wavs = outputs["model_outputs"].squeeze(1).cpu().numpy()
+            wav_lengths = outputs["y_mask"].sum(dim=(1, 2)).long() * hop_length
+
+            for row, i in enumerate(indexes):
+                wav = wavs[row][: int(wav_lengths[row])]
+                syn.save_wav(wav, save_paths[i])
+                cache_speech(keys[i], save_paths[i])
+
+    return save_paths
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that allows `rate` acquisitions per second, with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+@dataclass
+class ProviderLimiter:
+    semaphore: threading.Semaphore
+    bucket: TokenBucket
+
+
+provider_limiters = {}
+provider_limiters_lock = threading.Lock()
+
+
+def get_provider_limiter(provider: str) -> ProviderLimiter:
+    """
+    Return the process-wide concurrency and rate limiter of an api provider, creating it on first use.
+    """
+    with provider_limiters_lock:
+        if provider not in provider_limiters:
+            limits = settings.TTS_API_LIMITS.get(
+                provider, settings.TTS_API_LIMITS["default"]
+            )
+            provider_limiters[provider] = ProviderLimiter(
+                semaphore=threading.Semaphore(limits["concurrency"]),
+                bucket=TokenBucket(rate=limits["rate"], capacity=limits["burst"]),
+            )
+
+        return provider_limiters[provider]
+
+
+def save_with_retry(
+    syn: ApiSyn, text: str, save_path: str, retries: int = 3, backoff: float = 1.0
+) -> Union[str, None]:
+    """
+    Save synthesized audio through an api provider, respecting its limits and retrying failed calls.
+
+    Parameters:
+    -----------
+    syn : ApiSyn
+        The api synthesizer to use.
+    text : str
+        The text to synthesize.
+    save_path : str
+        The file path where the synthesized audio will be saved.
+    retries : int, optional
+        The number of attempts before giving up. Default is 3.
+    backoff : float, optional
+        The base delay in seconds of the exponential backoff. Each retry waits a random time between 0 and
+        `backoff * 2 ** attempt`. Default is 1.0.
+
+    Returns:
+    --------
+    str or None
+        The file path to the saved audio file, or None if every attempt failed.
+    """
+    key = speech_cache_key(syn, text)
+    if load_cached_speech(key, save_path):
+        return save_path
+
+    limiter = get_provider_limiter(syn.provider)
+
+    for attempt in range(retries):
+        try:
+            with limiter.semaphore:
+                limiter.bucket.acquire()
+                synthesize(syn, text, save_path)
+
+            if cache_speech(key, save_path):
+                return save_path
+
+            raise Exception(f"{syn.provider} did not return any audio")
+
+        except Exception as exc:
+            logger.warning(
+                f"Attempt {attempt + 1}/{retries} in {syn.provider} failed: {exc}"
+            )
+            if attempt < retries - 1:
+                time.sleep(random.uniform(0, backoff * 2**attempt))
+
+    logger.error(f"Could not synthesize text with {syn.provider}: {text}")
+    return None
+
+
+def save_many(
+    syn: ApiSyn, texts: list[str], save_paths: list[str]
+) -> list[Union[str, None]]:
+    """
+    Synthesize several texts through an api provider concurrently.
+
+    Parameters:
+    -----------
+    syn : ApiSyn
+        The api synthesizer to use.
+    texts : list of str
+        The texts to synthesize.
+    save_paths : list of str
+        The file path of the audio for each text, in the same order as `texts`.
+
+    Returns:
+    --------
+    list of str or None
+        The file path of each saved audio file, or None for the texts that failed, in the same order as `texts`.
+
+    Notes:
+    ------
+    - The number of calls in flight and their rate are capped per provider by `settings.TTS_API_LIMITS`,
+      across every caller in the process.
+    """
+    if not texts:
+        return []
+
+    limits = settings.TTS_API_LIMITS.get(
+        syn.provider, settings.TTS_API_LIMITS["default"]
+    )
+    workers = min(limits["concurrency"], len(texts))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(
+            executor.map(
+                lambda job: save_with_retry(
+                    syn, *job, retries=settings.TTS_API_RETRIES
+                ),
+                zip(texts, save_paths),
+            )
+        )
 
 
 def tts_from_open_api(text, save_path, voice="onyx"):
@@ -168,8 +622,10 @@ def tts_from_open_api(text, save_path, voice="onyx"):
     """
     logger.warning("API CALL IN OFFICIAL GPT-TTS")
 
-    client = OpenAI(api_key=settings.OPEN_API_KEY)
-    response = client.audio.speech.create(model="tts-1", voice=voice, input=text)
+    client = get_openai_client()
+    response = client.audio.speech.create(
+        voice=voice, input=text, **api_provider_settings["open_ai"]
+    )
     response.stream_to_file(save_path)
 
     return response
@@ -205,15 +661,11 @@ def tts_from_eleven_labs(text, save_path, voice):
         "Content-Type": "application/json",
         "xi-api-key": settings.XI_API_KEY,
     }
-    data = {
-        "text": text,
-        "model_id": "eleven_monolingual_v1",
-        "voice_settings": {"stability": 0.5, "similarity_boost": 0.5},
-    }
+    data = {"text": text, **api_provider_settings["eleven_labs"]}
 
     response = None
     try:
-        response = requests.post(url, json=data, headers=headers)
+        response = session.post(url, json=data, headers=headers)
         response.raise_for_status()
         with open(save_path, "wb") as f:
             for chunk in response.iter_content(chunk_size=1024):
@@ -1,4 +1,3 @@
-import urllib.request
 import uuid
 import logging
 from typing import Union
@@ -6,6 +5,7 @@ import requests
 from django.conf import settings
 from rest_framework.exceptions import APIException
 
+from .http_utils import session, download_file
 from .exceptions import (
     GameNotFound,
     InvalidTwitchToken,
@@ -67,7 +67,7 @@ class TwitchClient:
         )
 
         try:
-            response = requests.post(
+            response = session.post(
                 "https://id.twitch.tv/oauth2/token", headers=headers, data=data
             )
             response.raise_for_status()
@@ -117,7 +117,7 @@ class TwitchClient:
 
         try:
             url = f"https://api.twitch.tv/helix/games?name={name}"
-            req = requests.get(url, headers=self.headers)
+            req = session.get(url, headers=self.headers)
             req.raise_for_status()
             return req.json().get("data")[0].get("id")
 
@@ -154,7 +154,7 @@ class TwitchClient:
         req = None
         try:
             url = f"https://api.twitch.tv/helix/users?login={name}"
-            req = requests.get(url, headers=self.headers)
+            req = session.get(url, headers=self.headers)
             req.raise_for_status()
             return req.json().get("data")[0].get("id")
 
@@ -201,7 +201,7 @@ class TwitchClient:
         if start_date:
             url += f"&started_at={start_date}T00:00:00Z"
         try:
-            clips = requests.get(url, headers=self.headers)
+            clips = session.get(url, headers=self.headers)
             clips.raise_for_status()
         except requests.exceptions.HTTPError as err:
             logger.error(err)
@@ -226,7 +226,7 @@ class TwitchClient:
         try:
             index = clip.get("thumbnail_url").find("-preview")
             filename = f"{str(uuid.uuid4())}.mp4"
-            urllib.request.urlretrieve(
+            download_file(
                 clip["thumbnail_url"][:index] + ".mp4", f"{self.path}/{filename}"
             )
 
@@ -247,7 +247,7 @@ class TwitchClient:
         url = f"https://api.twitch.tv/helix/clips?id={clip_id}"
 
         try:
-            clips = requests.get(url, headers=self.headers)
+            clips = session.get(url, headers=self.headers)
             clips.raise_for_status()
         except requests.exceptions.HTTPError as err:
             logger.error(err)
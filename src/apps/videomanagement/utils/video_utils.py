@@ -1,93 +1,48 @@
+from __future__ import annotations
+
 import os
-import shlex
+import shutil
 import subprocess
 import uuid
 import logging
-from PIL import Image
-from typing import Union
-
-from django.db.models import QuerySet
-from moviepy.editor import (
-    AudioFileClip,
-    concatenate_audioclips,
-    CompositeAudioClip,
-    ImageClip,
-    VideoFileClip,
-    vfx,
-    concatenate_videoclips,
-    CompositeVideoClip,
-    TextClip,
-)
-
-from .SadTalker.inference import lip
-from ..models import Avatar, SceneImage, Background, Scene, Video
-from .exceptions import RenderFailedException
-
-
-logger = logging.getLogger(__name__)
-
-
-def check_if_image(path: str) -> bool:
-    supported_image_extensions = {".jpg", ".jpeg", ".png"}
-    file_extension = os.path.splitext(path)[1].lower()
-    return file_extension in supported_image_extensions
-
-
-def check_if_video(path: str) -> bool:
-    supported_video_extensions = {".mp4", ".avi"}
-    file_extension = os.path.splitext(path)[1].lower()
-    return file_extension in supported_video_extensions
+from typing import TYPE_CHECKING
 
+from django.conf import settings
 
-def handle_audio(scene: Scene, scene_image: SceneImage):
-    """
-    Processes and returns the appropriate audio clip based on the given scene and scene image.
-
-    Args:
-        scene (Scene): The scene object containing metadata and file path for the audio.
-        scene_image (SceneImage): The scene image object containing the file path and an indicator if it includes audio.
-
-    Returns:
-        AudioFileClip: The processed audio clip for the scene, which may be a combination of the scene's audio,
-                       the scene image's audio, and silence if applicable.
-    """
-
-    silent = AudioFileClip("assets/blank.wav")
-
-    audio = None
-
-    if scene.file:
-        try:
-            audio = AudioFileClip(scene.file.path)
-        except Exception as e:
-            logger.error(f"Error loading scene audio: {e}")
+from ..models import Avatar, SceneImage, Background, Video
+from .exceptions import RenderFailedException
+from .ffmpeg_utils import (
+    FRAME_SIZE,
+    ScenePlan,
+    concat_clips,
+    plan_scenes,
+    render_keyed_scene,
+    render_with_ffmpeg,
+    scene_frame_size,
+)
+from .file_utils import check_if_image, check_if_video
+from .lazy_utils import lazy_import
+from .lipsync_utils import LIP_OPTIONS, avatar_cache_key, clip_cache_key, lip_sync
+from .rendition_utils import get_composite, get_rendition
+from .segment_utils import prune_segments, render_with_segments
+from .timeline_utils import AudioTimeline, build_timeline
 
-    if scene_image and scene_image.with_audio:
-        try:
-            dump_video = VideoFileClip(scene_image.file.path)
-            scene_audio = dump_video.audio
-            if audio:
-                audio = CompositeAudioClip([audio, scene_audio])
-            else:
-                audio = scene_audio
-        except Exception as e:
-            logger.error(f"Error processing scene image audio: {e}")
+if TYPE_CHECKING:
+    from moviepy.editor import TextClip, VideoFileClip
 
-    if scene_image and scene.is_last and not scene_image.with_audio:
-        audio = concatenate_audioclips([audio, silent, silent])
 
-    if audio is None:
-        audio = silent
+logger = logging.getLogger(__name__)
 
-    return audio
+# moviepy pulls in numpy, imageio and its ffmpeg probe, and only the moviepy renderer needs it.
+mpy = lazy_import("moviepy.editor")
 
 
-def handle_image(audio, scene_image, background):
+def handle_image(duration: float, scene_image, background):
     """
-    Processes and returns the appropriate image clip based on the given audio and scene image.
+    Processes and returns the appropriate image clip based on the given duration and scene image.
 
     Args:
-        audio (AudioFileClip): The audio clip associated with the scene.
+        duration (float): The duration of the audio of the scene, in seconds.
         scene_image (SceneImage): The scene image object containing the file path.
         background (Background): A background object that contains a file of the background image.
 
@@ -96,15 +51,15 @@ def handle_image(audio, scene_image, background):
         ImageClip: The processed image clip for the scene, which may include resizing, duration adjustment,
                    and fade effects, or a default black image clip in case of an error.
     """
+    path = scene_image.file.path
     if background:
-        clip = ImageClip(background.file.path)
-        w, h = clip.size
-        Image.open(scene_image.file.path).convert("RGB").resize(
-            (int(w * 0.65), int(h * 0.65))
-        ).save(scene_image.file.path)
+        # The image is shown at 65% of the background, from a rendition that is created once and
+        # reused by every render, so the original is never re-encoded.
+        path = get_rendition(path, scene_frame_size(background))
+
     try:
-        image = ImageClip(scene_image.file.path)
-        image = image.set_duration(audio.duration)
+        image = mpy.ImageClip(path)
+        image = image.set_duration(duration)
         image = image.fadein(image.duration * 0.2).fadeout(image.duration * 0.2)
     except Exception as exc:
         raise Exception(f"Error handling image: {exc}")
@@ -112,25 +67,25 @@ def handle_image(audio, scene_image, background):
     return image
 
 
-def handle_video(audio: AudioFileClip, scene_image: SceneImage) -> VideoFileClip:
+def handle_video(duration: float, scene_image: SceneImage) -> VideoFileClip:
     """
-    Processes and returns the appropriate video clip based on the given audio and scene image.
+    Processes and returns the appropriate video clip based on the given duration and scene image.
 
     Args:
-        audio (AudioFileClip): The audio clip associated with the scene.
+        duration (float): The duration of the audio of the scene, in seconds.
         scene_image (SceneImage): The scene image object containing the file path to the video file.
 
     Returns:
         VideoFileClip: The processed video clip for the scene, which includes duration adjustment and fade effects.
     """
     try:
-        vid_scene = VideoFileClip(scene_image.file.path).without_audio()
+        vid_scene = mpy.VideoFileClip(scene_image.file.path).without_audio()
 
     except Exception as e:
         raise ValueError(f"Error loading video file at {scene_image.file.path}: {e}")
 
-    if vid_scene.duration > audio.duration:
-        vid_scene = vid_scene.subclip(0, audio.duration)
+    if vid_scene.duration > duration:
+        vid_scene = vid_scene.subclip(0, duration)
 
     vid_scene = vid_scene.fadein(vid_scene.duration * 0.2).fadeout(
         vid_scene.duration * 0.2
@@ -138,9 +93,10 @@ def handle_video(audio: AudioFileClip, scene_image: SceneImage) -> VideoFileClip
     return vid_scene
 
 
-def process_scene(scene_image: SceneImage, audio, background: Background):
+def process_scene(scene_image: SceneImage, duration: float, background: Background):
     """
-    Processes and returns the appropriate visual clip (image or video) based on the given scene image and audio.
+    Processes and returns the appropriate visual clip (image or video) based on the given scene image and
+    the duration of its audio.
 
     This function handles the scene by:
     1. Creating a default black video clip with the duration of the audio.
@@ -150,14 +106,14 @@ def process_scene(scene_image: SceneImage, audio, background: Background):
 
     Args:
         scene_image (SceneImage): The scene image object containing the file path to the image or video file.
-        audio (AudioFileClip): The audio clip associated with the scene.
+        duration (float): The duration of the audio of the scene, in seconds.
         background (bool): A flag indicating if the image should be resized as a background.
 
     Returns:
         VideoFileClip: The processed visual clip for the scene, which may be a black video, an image clip,
                        or a video clip based on the scene image file type.
     """
-    black_clip = ImageClip("assets/black.jpg").set_duration(audio.duration)
+    black_clip = mpy.ImageClip("assets/black.jpg").set_duration(duration)
 
     file_path = scene_image.file.path
 
@@ -165,10 +121,10 @@ def process_scene(scene_image: SceneImage, audio, background: Background):
         return black_clip
     try:
         if check_if_image(scene_image.file.path):
-            return handle_image(audio, scene_image, background)
+            return handle_image(duration, scene_image, background)
 
         if check_if_video(scene_image.file.path):
-            return handle_video(audio, scene_image)
+            return handle_video(duration, scene_image)
 
     except Exception as exc:
         logger.warning(exc)
@@ -180,7 +136,55 @@ def process_scene(scene_image: SceneImage, audio, background: Background):
     return black_clip
 
 
-def handle_avatar_video(video, final_video):
+def compose_scene(
+    video: Video, plan: ScenePlan, offset: float, duration: float
+) -> VideoFileClip:
+    """
+    Returns the clip of a scene already keyed over the background of the video, at the full frame size.
+
+    A still image over an image background is shown from its composite with the background, computed
+    once per scene image and background, and faded in and out by crossfading from the background with
+    the scene cut out of it. The scene videos and every scene over a video background are keyed and
+    overlaid by ffmpeg, so no frame is masked in Python.
+
+    Args:
+        video (Video): The video of the scene, with a background.
+        plan (ScenePlan): The resolved inputs of the scene.
+        offset (float): The start of the scene in the video, in seconds, which places it on a video background.
+        duration (float): The duration of the audio of the scene, in seconds.
+
+    Returns:
+        VideoFileClip: The clip of the scene over the background.
+    """
+    background = video.background
+    if plan.kind == "image" and check_if_image(background.file.path):
+        try:
+            base, composite = get_composite(plan.visual, background)
+            fade = duration * 0.2
+            return mpy.CompositeVideoClip(
+                [
+                    mpy.ImageClip(base).set_duration(duration),
+                    mpy.ImageClip(composite)
+                    .set_duration(duration)
+                    .crossfadein(fade)
+                    .crossfadeout(fade),
+                ],
+                size=FRAME_SIZE,
+            )
+
+        except OSError as exc:
+            logger.warning(
+                f"Could not compose {plan.visual} over the background: {exc}"
+            )
+
+    output = os.path.join(video.dir_name, "keyed", f"scene_{plan.scene.id}.mp4")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    return mpy.VideoFileClip(render_keyed_scene(plan, background, offset, output))
+
+
+def handle_avatar_video(
+    video, final_video, plans: list[ScenePlan] = None, timeline: AudioTimeline = None
+):
     """
     Adds an avatar video to the final video, positioning it at the top right and applying fade-in and fade-out effects.
 
@@ -192,21 +196,23 @@ def handle_avatar_video(video, final_video):
     Args:
         video (Video): The video object containing metadata and the directory name for the avatar video.
         final_video (VideoFileClip): The final video clip onto which the avatar video will be composited.
+        plans (list of ScenePlan, optional): The scene plans of the video, resolved again if not given.
+        timeline (AudioTimeline, optional): The audio timeline of the scenes, built again if not given.
 
     Returns:
         VideoFileClip: The final video clip with the avatar video composited at the top right corner, with fade-in
-                       and fade-out effects applied.
+                       and fade-out effects applied, or the final video unchanged if the avatar could not be
+                       animated.
     """
 
-    avatar_video = f"{os.getcwd()}/{video.dir_name}/output_avatar.mp4"
-
-    if not os.path.exists(f"{os.getcwd()}/{video.dir_name}/output_avatar.mp4"):
-        logger.info("Start creating the avatar video")
-        avatar_video = create_avatar_video(video.avatar, video.dir_name)
+    avatar_video = get_avatar_video(video, plans, timeline)
+    if not avatar_video:
+        logger.warning(f"Rendering video {video.id} without its avatar")
+        return final_video
 
     position = tuple(video.settings.get("avatar_position", "right,top").split(","))
     avatar_vid = (
-        VideoFileClip(avatar_video)
+        mpy.VideoFileClip(avatar_video)
         .without_audio()
         .set_position(position)
         .resize(1.5)
@@ -214,128 +220,146 @@ def handle_avatar_video(video, final_video):
         .fadeout(2)
     )
 
-    final_video = CompositeVideoClip([final_video, avatar_vid], size=(1920, 1080))
+    final_video = mpy.CompositeVideoClip([final_video, avatar_vid], size=(1920, 1080))
     return final_video
 
 
-def handle_music(video, final_audio):
+def get_avatar_video(
+    video: Video, plans: list[ScenePlan] = None, timeline: AudioTimeline = None
+) -> str:
     """
-    Adds background music to the final audio, adjusting the volume and applying fade-in and fade-out effects.
+    Returns the avatar video of the whole video, stitched from the avatar clips of its scenes, or an empty
+    string if the avatar could not be animated.
+    """
+    plans = plan_scenes(video) if plans is None else plans
+    timeline = build_timeline(plans) if timeline is None else timeline
+    clips = get_avatar_clips(video, plans, timeline)
+    if not clips:
+        return ""
 
-    Args:
-        video (Video): The video object containing metadata and the file path for the music.
-        final_audio (AudioFileClip): The final audio clip to which the background music will be added.
+    return concat_clips(
+        clips,
+        timeline.durations,
+        os.path.join(os.getcwd(), video.dir_name, "output_avatar.mp4"),
+        os.path.join(video.dir_name, "avatar_clips", "clips.txt"),
+    )
 
-    Returns:
-        AudioFileClip: The final audio clip with the background music added,
-        including volume adjustment and fade effects.
-    """
 
-    music = AudioFileClip(video.music.file.path)
-    music_volume = video.settings.get("music_volume", 0.07)
-    music = music.volumex(music_volume)
+def get_avatar_clips(
+    video: Video, plans: list[ScenePlan] = None, timeline: AudioTimeline = None
+) -> list[str]:
+    """
+    Returns the avatar clip of every scene of the video, each lip-synced to the audio of its own scene.
 
-    if music.duration < final_audio.duration:
-        loop_count = int(final_audio.duration // music.duration) + 1
-        music = concatenate_audioclips([music] * loop_count).subclip(
-            0, final_audio.duration
+    The clips are named after the content of the scene audio, the avatar image and the lip-sync options,
+    so they survive the edits of the other scenes and editing one sentence only animates that scene
+    again. The scene audio is cut from the audio timeline, built from the plans if not given. An empty
+    list is returned if the avatar could not be animated.
+    """
+    plans = plan_scenes(video) if plans is None else plans
+    timeline = build_timeline(plans) if timeline is None else timeline
+    clips_dir = os.path.join(video.dir_name, "avatar_clips")
+    os.makedirs(clips_dir, exist_ok=True)
+    avatar_key = avatar_cache_key(video.avatar.file.path, LIP_OPTIONS)
+
+    clips = []
+    for index, plan in enumerate(plans):
+        audio_path = timeline.write_scene(
+            index, os.path.join(clips_dir, f"scene_{plan.scene.id}.wav")
         )
+        key = clip_cache_key(audio_path, avatar_key)
+        clip = os.path.join(clips_dir, f"{key[:32]}.mp4")
 
-    else:
-        music = music.subclip(0, final_audio.duration)
-
-    fade_duration = min(4, final_audio.duration * 0.1)
-    music = music.audio_fadein(fade_duration).audio_fadeout(fade_duration)
+        if not os.path.exists(clip):
+            logger.info(f"Animating the avatar of scene {plan.scene.id}")
+            if not create_avatar_video(video.avatar, video.dir_name, audio_path, clip):
+                return []
 
-    final_audio = CompositeAudioClip([final_audio, music])
+        clips.append(clip)
 
-    return final_audio
+    prune_segments(clips_dir, set(clips))
+    return clips
 
 
-def handle_background(final_audio, background, final_video):
+def handle_background(background, final_video):
     """
-    Adds a background effect to a video clip based on the specified color and threshold.
+    Brings the scenes to the full frame size, fading them in over the background.
 
     Args:
-        final_audio (AudioFileClip): The final audio clip to synchronize with the video.
-        background (Background): The background object containing color and threshold settings for masking.
-        final_video (VideoFileClip): The final video clip onto which the masked video will be composited.
+        background (Background or None): The background of the video, or None.
+        final_video (VideoFileClip): The scenes of the video, already composed over the background by
+                                     `compose_scene` if it has one.
 
     Returns:
-        VideoFileClip: The final video with background effect applied, including masking and fade effects.
+        VideoFileClip: The final video at the full frame size.
     """
 
     if not background:
-        return final_video.resize((1920, 1080))
+        return final_video.resize(FRAME_SIZE)
 
-    if background.file.path.lower().endswith((".jpg", ".png")):
-        bg_clip = ImageClip(background.file.path)
-    else:
-        bg_clip = VideoFileClip(background.file.path).without_audio()
-
-    bg_clip = bg_clip.set_duration(final_audio.duration).resize((1920, 1080))
-    mask_color = [int(x) for x in background.color.split(",")]
-    threshold = float(background.threshold) / 255.0
-    masked_clip = final_video.fx(vfx.mask_color, color=mask_color, thr=threshold, s=7)
-    final_video = CompositeVideoClip(
-        [bg_clip, masked_clip.set_duration(final_audio.duration)]
-    ).crossfadein(2)
+    return final_video.crossfadein(2)
 
-    return final_video
 
-
-def handle_final_video(background, final_audio, final_video, video, subtitles: list):
+def handle_final_video(
+    background,
+    final_audio,
+    final_video,
+    video,
+    subtitles: list,
+    plans: list[ScenePlan] = None,
+    timeline: AudioTimeline = None,
+):
     """
-    Processes and generates the final video clip with optional music, background effect, avatar overlay,
+    Processes and generates the final video clip with optional background effect, avatar overlay,
     subtitles, intro, and outro clips.
 
     Args:
-        background (Background or None): Background object containing color and threshold settings for masking,
-                                         or None if no background effect is applied.
-        final_audio (AudioFileClip): The final audio clip to synchronize with the video.
+        background (Background or None): The background the scenes were composed over, or None.
+        final_audio (AudioFileClip): The final audio clip, already mixed with the music, to synchronize with
+                                     the video.
         final_video (VideoFileClip): The base final video clip to which all components will be added.
-        video (Video): The video object containing metadata such as music, avatar, intro, and outro clips.
+        video (Video): The video object containing metadata such as avatar, intro, and outro clips.
         subtitles (list of VideoFileClip): A list of subtitle clips to be added to the final video.
+        plans (list of ScenePlan, optional): The scene plans of the video, for the avatar clips.
+        timeline (AudioTimeline, optional): The audio timeline of the scenes, for the avatar clips.
 
     Returns:
         VideoFileClip: The fully processed final video clip with all specified components added.
     """
-    final_video = handle_background(final_audio, background, final_video)
-
-    if getattr(video, "music", None):
-        final_audio = handle_music(video, final_audio)
-
+    final_video = handle_background(background, final_video)
     final_video = final_video.set_audio(final_audio)
 
     if getattr(video, "avatar", None):
-        final_video = handle_avatar_video(video, final_video)
+        final_video = handle_avatar_video(video, final_video, plans, timeline)
 
     if video.settings.get("subtitles", False) and subtitles:
-        subs = concatenate_videoclips(subtitles, method="compose")
+        subs = mpy.concatenate_videoclips(subtitles, method="compose")
         video_height = final_video.size[1]
         subtitle_position = (60, video_height - 150)
-        final_video = CompositeVideoClip(
+        final_video = mpy.CompositeVideoClip(
             [final_video, subs.set_pos(subtitle_position).fadein(1).fadeout(1)]
         )
 
     if getattr(video, "intro", None):
-        intro = VideoFileClip(video.intro.file.path).resize(final_video.size)
-        final_video = concatenate_videoclips([intro, final_video], method="compose")
+        intro = mpy.VideoFileClip(video.intro.file.path).resize(final_video.size)
+        final_video = mpy.concatenate_videoclips([intro, final_video], method="compose")
 
     if getattr(video, "outro", None):
-        outro = VideoFileClip(video.outro.file.path).resize(final_video.size)
-        final_video = concatenate_videoclips([final_video, outro], method="compose")
+        outro = mpy.VideoFileClip(video.outro.file.path).resize(final_video.size)
+        final_video = mpy.concatenate_videoclips([final_video, outro], method="compose")
 
     return final_video
 
 
-def make_video(video: Video) -> Video:
+def make_video(video: Video, renderer: str = None) -> Video:
     """
     Creates a video based on the provided video object, handling scenes, audio, subtitles, background,
     and final video assembly and output.
 
     Args:
         video (Videos): The video object containing metadata and settings for video creation.
+        renderer (str, optional): The render backend, "moviepy", "ffmpeg" or "segments". Defaults to the
+                                  "renderer" of the video settings, or `settings.DEFAULT_RENDERER`.
 
     Returns:
         Videos: The updated video object with output file path and status.
@@ -344,55 +368,82 @@ def make_video(video: Video) -> Video:
     if video.status not in {"READY", "COMPLETED"}:
         raise RenderFailedException("Video is not in a renderable state.")
 
+    renderer = renderer or video.settings.get("renderer", settings.DEFAULT_RENDERER)
+    if renderer not in {"moviepy", "ffmpeg", "segments"}:
+        raise RenderFailedException(f"Unknown renderer {renderer}.")
+
     video.status = "RENDERING"
     video.save()
 
-    scenes: Union[QuerySet, list[Scene]] = video.prompt.scenes.all()
-    background: Background = video.background
-    sound_list, vids, subtitles = [], [], []
+    final_video_path = f"{video.dir_name}/output_video.mp4"
+    if renderer == "segments":
+        render_with_segments(video, final_video_path, avatar_clips=get_avatar_clips)
+    elif renderer == "ffmpeg":
+        render_with_ffmpeg(video, final_video_path, avatar_video=get_avatar_video)
+    else:
+        render_with_moviepy(video, final_video_path)
 
-    for scene in scenes:
-        scene_image = SceneImage.objects.filter(scene=scene).first()
-        audio = handle_audio(scene, scene_image)
-        sound_list.append(audio)
+    video.output = final_video_path
+    video.status = "COMPLETED"
+    video.save()
+    return video
 
-        if video.settings.get("subtitles", False):
-            subtitles.append(create_subtitle_clip(scene.text, audio.duration))
 
-        vids.append(process_scene(scene_image, audio, background))
+def render_with_moviepy(video: Video, final_video_path: str) -> str:
+    """
+    Renders the video as a MoviePy composition, frame by frame.
 
-    if not vids:
+    Args:
+        video (Videos): The video object containing metadata and settings for video creation.
+        final_video_path (str): The file path of the rendered video.
+
+    Returns:
+        str: The file path of the rendered video.
+    """
+    plans = plan_scenes(video)
+    if not plans:
         raise RenderFailedException("No video scenes were processed.")
 
-    try:
-        final_video = concatenate_videoclips(vids)
+    # The audio of all scenes is laid out once; the narration drives the avatar and the mix with the
+    # music is the audio track of the video.
+    timeline = build_timeline(plans)
+    timeline.write_narration(f"{video.dir_name}/output_audio.wav")
+    mix_path = timeline.write_mix(video, f"{video.dir_name}/output_mix.wav")
 
-        if background:
-            final_video = final_video.margin(
-                top=background.image_pos_top, left=background.image_pos_left, opacity=4
-            ).set_position("center")
+    background: Background = video.background
+    vids, subtitles = [], []
+
+    for index, plan in enumerate(plans):
+        start, end = timeline.spans[index]
+        duration = (end - start) / timeline.sample_rate
 
-        final_audio = concatenate_audioclips(sound_list)
-        final_audio_path = f"{video.dir_name}/output_audio.wav"
-        final_audio.write_audiofile(final_audio_path)
+        if video.settings.get("subtitles", False):
+            subtitles.append(create_subtitle_clip(plan.scene.text, duration))
 
+        if background:
+            vids.append(
+                compose_scene(video, plan, start / timeline.sample_rate, duration)
+            )
+        else:
+            vids.append(process_scene(plan.scene_image, duration, background))
+
+    final_audio = mpy.AudioFileClip(mix_path)
+    final_video = None
+    try:
+        final_video = mpy.concatenate_videoclips(vids)
         final_video = handle_final_video(
-            background, final_audio, final_video, video, subtitles
+            background, final_audio, final_video, video, subtitles, plans, timeline
         )
-        final_video_path = f"{video.dir_name}/output_video.mp4"
         final_video.write_videofile(final_video_path, fps=24, threads=8)
 
-        video.output = final_video_path
-        video.status = "COMPLETED"
-
     finally:
-        for clip in sound_list + vids + subtitles:
+        for clip in vids + subtitles:
             clip.close()
         final_audio.close()
-        final_video.close()
+        if final_video is not None:
+            final_video.close()
 
-    video.save()
-    return video
+    return final_video_path
 
 
 def create_subtitle_clip(
@@ -430,7 +481,7 @@ def create_subtitle_clip(
         A moviepy TextClip styled as a subtitle.
     """
     try:
-        return TextClip(
+        return mpy.TextClip(
             text,
             fontsize=fontsize,
             color=color,
@@ -444,7 +495,9 @@ def create_subtitle_clip(
         return None
 
 
-def create_avatar_video(avatar: Avatar, dir_name: str) -> str:
+def create_avatar_video(
+    avatar: Avatar, dir_name: str, audio_path: str = None, output: str = None
+) -> str:
     """
     Create an avatar video synchronized with an audio file.
 
@@ -454,6 +507,10 @@ def create_avatar_video(avatar: Avatar, dir_name: str) -> str:
         An instance of the Avatars class containing the avatar image file.
     dir_name : str
         The directory name where the output files are stored.
+    audio_path : str, optional
+        The audio driving the avatar, the narration of the whole video by default.
+    output : str, optional
+        The file path of the avatar video, "output_avatar.mp4" in `dir_name` by default.
 
     Returns:
     --------
@@ -462,45 +519,46 @@ def create_avatar_video(avatar: Avatar, dir_name: str) -> str:
 
     Detailed Steps:
     ---------------
-    1. Use the `lip` function to generate a video of the avatar synchronized with the audio file.
-    2. Use ffmpeg to encode the generated video with the h264 codec and save it to the specified directory.
+    1. Use `lip_sync` to generate a video of the avatar synchronized with the audio file, on the lip-sync
+       server if one is configured.
+    2. Move the generated video, already encoded with the h264 codec, to the specified file path.
 
     Notes:
     ------
-    - Requires the `lip` function and ffmpeg to be properly installed and configured.
-    - The `lip` function should generate the avatar video and save it in the specified directory.
+    - Requires SadTalker, or a running lip-sync server, and ffmpeg to be properly installed and configured.
+    - The SadTalker models stay loaded between calls, in this process or in the lip-sync server.
     """
 
+    audio_path = audio_path or os.path.join(dir_name, "output_audio.wav")
+    output = output or os.path.join(os.getcwd(), dir_name, "output_avatar.mp4")
+    # Every avatar video gets its own SadTalker result directory, since the results are named by second.
+    result_dir = f"{os.path.splitext(output)[0]}_lipsync"
+
     try:
-        avatar_cam = lip(
+        avatar_cam = lip_sync(
             source_image=avatar.file.path,
-            driven_audio=os.path.join(dir_name, "output_audio.wav"),
-            result_dir=dir_name,
-            facerender="pirender",
+            driven_audio=audio_path,
+            result_dir=result_dir,
         )
     except Exception as e:
         logger.error(f"Error running lip function: {e}")
         return ""
 
-    output = os.path.join(os.getcwd(), dir_name, "output_avatar.mp4")
+    if not avatar_cam:
+        logger.error("Could not find a face in the avatar image")
+        return ""
 
-    ffmpeg_command = (
-        f'ffmpeg -i "{os.path.join(os.getcwd(), avatar_cam)}" -vcodec h264 "{output}"'
-    )
+    # SadTalker encodes the frames and the audio to H.264/AAC in a single pass, so the result is moved
+    # in place rather than encoded again.
     try:
-        result = subprocess.run(
-            shlex.split(ffmpeg_command),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
-        if result.returncode != 0:
-            logger.error(f"FFmpeg error: {result.stderr}")
-            return ""
-    except Exception as e:
-        logger.error(f"Error executing ffmpeg: {e}")
+        shutil.move(os.path.join(os.getcwd(), avatar_cam), output)
+    except OSError as e:
+        logger.error(f"Error moving the avatar video: {e}")
         return ""
 
+    finally:
+        shutil.rmtree(result_dir, ignore_errors=True)
+
     return output
 
 
@@ -537,13 +595,13 @@ def split_video_and_mp3(video_path: str) -> tuple[str, str]:
     """
 
     folder_to_save = os.path.split(os.path.abspath(video_path))[0]
-    video = VideoFileClip(video_path)
+    video = mpy.VideoFileClip(video_path)
 
     audio_save = f"{str(folder_to_save)}/dialogues/{str(uuid.uuid4())}.mp3"
     video_save = f"{str(folder_to_save)}/images/{str(uuid.uuid4())}.mp4"
 
     try:
-        video = VideoFileClip(video_path)
+        video = mpy.VideoFileClip(video_path)
         video.audio.write_audiofile(audio_save)
         video_without_audio = video.set_audio(None)
         video_without_audio.write_videofile(video_save, codec="libx264", audio=False)
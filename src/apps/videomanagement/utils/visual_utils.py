@@ -2,17 +2,18 @@ import json
 import logging
 import os
 import sys
-import urllib.request
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Union
 
-import requests
 from django.conf import settings
-from openai import OpenAI
 from pytubefix import YouTube, Playlist
 
 from .bing_image_downloader import downloader
 from .exceptions import FileNotDownloadedException
 from .google_image_downloader import downloader as google_downloader
+from .http_utils import session, get_openai_client, download_file, report as http_report
 from .mapper import modes, default_providers
 from .prompt_utils import format_dalle_prompt, determine_fields
 from .video_utils import add_text_to_video
@@ -22,6 +23,9 @@ logger = logging.getLogger(__name__)
 
 thismodule = sys.modules[__name__]
 
+provider_semaphores = {}
+provider_semaphores_lock = threading.Lock()
+
 
 def download_playlist(url: str, category: str) -> None:
     """
@@ -240,7 +244,7 @@ def generate_from_dalle(prompt: str, dir_name: str, style: str, title: str = "")
     """
     logger.warning("API CALL IN DALL-E")
 
-    client = OpenAI(api_key=settings.OPEN_API_KEY)
+    client = get_openai_client()
 
     response = client.images.generate(
         model="dall-e-3",
@@ -252,9 +256,8 @@ def generate_from_dalle(prompt: str, dir_name: str, style: str, title: str = "")
     )
 
     image_url = response.data[0].url
-    response = requests.get(image_url)
     x = str(uuid.uuid4())
-    open(rf"{dir_name}{x}.png", "wb").write(response.content)
+    download_file(image_url, rf"{dir_name}{x}.png")
 
     return rf"{dir_name}{x}.png"
 
@@ -310,10 +313,10 @@ def generate_from_diffusion(
 
     headers = {"Content-Type": "application/json"}
 
-    response = requests.post(url, headers=headers, data=payload)
+    response = session.post(url, headers=headers, data=payload)
     image = response.json()["output"][0]
     filename = str(uuid.uuid4())
-    urllib.request.urlretrieve(image, f"{dir_name}\\{filename}.png")
+    download_file(image, f"{dir_name}\\{filename}.png")
     return f"{dir_name}\\{filename}.png"
 
 
@@ -351,7 +354,7 @@ def generate_from_midjourney(
     logger.warning("Api call in midjourney")
     payload = {"prompt": format_dalle_prompt(title, prompt)}
     headers = {"Authorization": f"Bearer {settings.MIDJOURNEY_KEY}"}
-    response = requests.post(
+    response = session.post(
         "https://api.mymidjourney.ai/api/v1/midjourney/imagine",
         headers=headers,
         data=payload,
@@ -361,13 +364,13 @@ def generate_from_midjourney(
         logger.error("Failed to generate image with midjourney")
         return
 
-    image = requests.get(
+    image = session.get(
         f"https://api.mymidjourney.ai/api/v1/midjourney/message/{response['messageId']}",
-        headers,
+        headers=headers,
     ).json()["uri"]
 
     filename = str(uuid.uuid4())
-    urllib.request.urlretrieve(image, f"{dir_name}\\{filename}.png")
+    download_file(image, f"{dir_name}\\{filename}.png")
     return f"{dir_name}\\{filename}.png"
 
 
@@ -417,19 +420,68 @@ def create_image_scene(
     - If an exception occurs during image downloading or creation, it is logged,
       and the scene is created with a None image.
     """
-    provider = default_providers.get(mode) if not provider else provider
     scene = Scene.objects.get(prompt=prompt, text=text.strip())
-    try:
-        downloaded_image = getattr(thismodule, modes.get(mode, "WEB").get(provider))(
-            image, f"{dir_name}/images/", style=style, title=title
-        )
-    except Exception as ex:
-        logger.error(ex)
-        downloaded_image = None
+    downloaded_image = acquire_image(image, dir_name, mode, provider, style, title)
 
     SceneImage.objects.create(scene=scene, file=downloaded_image, prompt=image)
 
 
+def get_provider_semaphore(provider: str) -> threading.Semaphore:
+    """
+    Return the process-wide semaphore that caps the concurrent calls to an image provider.
+    """
+    with provider_semaphores_lock:
+        if provider not in provider_semaphores:
+            limit = settings.IMAGE_PROVIDER_CONCURRENCY.get(
+                provider, settings.IMAGE_PROVIDER_CONCURRENCY["default"]
+            )
+            provider_semaphores[provider] = threading.Semaphore(limit)
+
+        return provider_semaphores[provider]
+
+
+def acquire_image(
+    image: str,
+    dir_name: str,
+    mode: str = "WEB",
+    provider: str = None,
+    style: str = "vivid",
+    title: str = "",
+) -> Union[str, None]:
+    """
+    Download or generate the image of a scene, without touching the database.
+
+    Parameters:
+    -----------
+    image : str
+        The image description used as the search query or the generation prompt.
+    dir_name : str
+        The directory path where the image will be saved.
+    mode : str, optional
+        The mode for image downloading. Default is "WEB".
+    provider : str, optional
+        The provider for image downloading. Default is the default provider of the mode.
+    style : str, optional
+        The style for image generation. Default is "vivid".
+    title : str, optional
+        The title of the video. Default is an empty string.
+
+    Returns:
+    --------
+    str or None
+        The path to the image, or None if the provider failed.
+    """
+    provider = default_providers.get(mode) if not provider else provider
+    with get_provider_semaphore(provider):
+        try:
+            return getattr(thismodule, modes.get(mode, "WEB").get(provider))(
+                image, f"{dir_name}/images/", style=style, title=title
+            )
+        except Exception as ex:
+            logger.error(ex)
+            return None
+
+
 def create_image_scenes(
     video: Video,
     mode: str = "WEB",
@@ -458,6 +510,9 @@ def create_image_scenes(
     ------
     - This function iterates over scenes in a video's GPT answer and creates image
       scenes based on the scene descriptions.
+    - The images are downloaded or generated in parallel by a pool of `settings.IMAGE_WORKERS` workers, with
+      the concurrent calls to each provider capped by `settings.IMAGE_PROVIDER_CONCURRENCY`. A failing
+      provider only leaves its own scenes without an image.
     - The mode and style parameters determine the method and style of image creation.
     """
 
@@ -467,31 +522,35 @@ def create_image_scenes(
     dir_name = video.dir_name
     first_scene = video.gpt_answer["scenes"][0]
     search_field, narration_field = determine_fields(first_scene)
+
+    jobs = []
     for j in video.gpt_answer["scenes"]:
         if is_sentenced:
             for x in j[search_field]:
-                create_image_scene(
-                    prompt=video.prompt,
-                    image=x["image_description"],
-                    text=x[narration_field],
-                    dir_name=dir_name,
-                    mode=mode,
-                    style=style,
-                    title=video.title,
-                    provider=provider,
-                )
+                jobs.append((x["image_description"], x[narration_field], provider))
 
         else:
-            create_image_scene(
-                prompt=video.prompt,
-                image=j["image"],
-                text=j["dialogue"],
-                dir_name=dir_name,
-                mode=mode,
-                style=style,
-                title=video.title,
+            jobs.append((j["image"], j["dialogue"], None))
+
+    with ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS) as executor:
+        futures = {
+            executor.submit(
+                acquire_image, image, dir_name, mode, job_provider, style, video.title
+            ): (Scene.objects.get(prompt=video.prompt, text=text.strip()), image)
+            for image, text, job_provider in jobs
+        }
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            scene, image = futures[future]
+            downloaded_image = future.result()
+            SceneImage.objects.create(scene=scene, file=downloaded_image, prompt=image)
+            logger.info(
+                f"Image {done}/{len(futures)} of video {video.id} for scene {scene.id}: "
+                f"{'done' if downloaded_image else 'failed'}"
             )
 
+    logger.info(f"HTTP pool stats: {http_report()}")
+
 
 def generate_new_image(
     scene_image: SceneImage, video: Video, style: str = "vivid", *args, **kwargs
@@ -16,6 +16,7 @@ from ..models import (
     SceneImage,
     Video,
 )
+from ..tasks import preprocess_avatar_task
 from ..serializers import (
     TemplatePromptsSerializer,
     IntroSerializer,
@@ -87,6 +88,15 @@ class AvatarView(viewsets.ModelViewSet):
             "voice"
         )
 
+    def perform_create(self, serializer):
+        avatar = serializer.save()
+        preprocess_avatar_task.delay(avatar.id)
+
+    def perform_update(self, serializer):
+        avatar = serializer.save()
+        if "file" in serializer.validated_data:
+            preprocess_avatar_task.delay(avatar.id)
+
 
 class IntroView(viewsets.ModelViewSet):
     serializer_class = IntroSerializer
@@ -1,11 +1,10 @@
 from rest_framework.response import Response
-from rest_framework import viewsets
+from rest_framework import status, viewsets
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.permissions import IsAuthenticated
 from ..models import TemplatePrompt
 from ..swagger_serializers import GenerateSerializer
-from ..services.VideoGenerationServices import generate_video
-from ..serializers import VideoSerializer
+from ..tasks import generate_video_task
 from ..permissions import AiGenerationLimitPermission
 from ..throttling import GenerateRateThrottle
 
@@ -18,17 +17,17 @@ class GenerateView(viewsets.GenericViewSet):
 
     @swagger_auto_schema(
         request_body=GenerateSerializer,
-        operation_description="This API generates the scenes , the prompt and scene images !",
+        operation_description="This API queues the generation of the scenes, the prompt and scene images, "
+        "it returns the id of the job at once !",
     )
     def create(self, request):
         data = request.data.copy()
         serializer = self.get_serializer(data=data)
         serializer.is_valid()
-        video = generate_video(**serializer.validated_data)
+        validated_data = dict(serializer.validated_data, created_by=request.user.id)
+        job = generate_video_task.delay(**validated_data)
 
         return Response(
-            {
-                "message": "The video has been generated successfully",
-                "video": VideoSerializer(video).data,
-            }
+            {"message": "The video has been queued for generation", "job_id": job.id},
+            status=status.HTTP_202_ACCEPTED,
         )
@@ -0,0 +1,28 @@
+from celery.result import AsyncResult
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from ..models import Video
+
+
+@swagger_auto_schema(
+    operation_description="returns the state of a queued job and, once it has created its video, the "
+    "status of the video",
+    method="GET",
+)
+@api_view(["GET"])
+@permission_classes((IsAuthenticated,))
+def job_status(request, job_id):
+    result = AsyncResult(job_id)
+    response = {"job_id": job_id, "job_state": result.state, "video_id": None}
+
+    video = Video.objects.filter(job_id=job_id, created_by=request.user).first()
+    if video is None and result.successful():
+        video = Video.objects.filter(id=result.result, created_by=request.user).first()
+
+    if video:
+        response.update(video_id=video.id, status=video.status)
+
+    return Response(response)
@@ -1,10 +1,10 @@
 from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
-from ..serializers import VideoSerializer
-from ..services.TwitchGenerationService import generate_twitch_video
+from ..tasks import generate_twitch_video_task
 from ..swagger_serializers import TwitchSerializer
 from ..permissions import TwitchGenerationLimitPermission
 from ..throttling import TwitchGenerateRateThrottle
@@ -22,10 +22,14 @@ def generate_twitch(request):
     data = request.data.copy()
     serializer = TwitchSerializer(data=data, context=dict(request=request))
     serializer.is_valid(raise_exception=True)
-    video = generate_twitch_video(**serializer.validated_data)
+    started_at = serializer.validated_data.get("started_at")
+    validated_data = dict(
+        serializer.validated_data,
+        started_at=started_at.isoformat() if started_at else "",
+        created_by=request.user.id,
+    )
+    job = generate_twitch_video_task.delay(**validated_data)
     return Response(
-        {
-            "message": "The video has been generated successfully",
-            "video": VideoSerializer(video).data,
-        }
+        {"message": "The video has been queued for generation", "job_id": job.id},
+        status=status.HTTP_202_ACCEPTED,
     )
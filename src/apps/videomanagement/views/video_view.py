@@ -1,7 +1,9 @@
 import logging
 
+from celery.result import AsyncResult
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
 from rest_framework import viewsets
@@ -15,14 +17,22 @@ from ..models import Video
 from ..paginator import StandardResultsSetPagination
 from ..swagger_serializers import VideoUpdateSerializer, AddSceneSerializer
 from ..serializers import VideoSerializer, VideoNestedSerializer, SceneSerializer
-from ..services.VideoServices import video_update, video_regenerate
+from ..services.VideoServices import video_update
 from ..services.SceneServices import create_scene
-from ..utils.video_utils import make_video
+from ..tasks import queue_regenerate, queue_render
+from ..utils.exceptions import RenderFailedException
 from ..throttling import RenderRateThrottle
 from ..permissions import IsOwnerPermission
 
 logger = logging.getLogger(__name__)
 
+renderer_param = openapi.Parameter(
+    "renderer",
+    openapi.IN_QUERY,
+    description="The render backend, moviepy, ffmpeg or segments.",
+    type=openapi.TYPE_STRING,
+)
+
 
 class VideoView(viewsets.ModelViewSet):
     serializer_class = VideoSerializer
@@ -67,8 +77,8 @@ class VideoView(viewsets.ModelViewSet):
         )
 
     @swagger_auto_schema(
-        operation_description="This api changes the image of the scene or it creates "
-        "a new one if it doesnt exists",
+        operation_description="This api queues the regeneration of the speech and the images of the "
+        "scenes, it returns the id of the job at once",
         method="PATCH",
     )
     @action(detail=True, methods=["PATCH"])
@@ -76,40 +86,56 @@ class VideoView(viewsets.ModelViewSet):
         video = self.get_object()
         video.status = "GENERATION"
         video.save()
-        video_regenerate(video)
-        logger.info(f"Video with id {pk}  got regenerated successfully")
+        job_id = queue_regenerate(video)
+        logger.info(f"Video with id {pk} got queued for regeneration")
 
         return Response(
-            {"Message": f"Video with id {pk} got regenerated successfully"},
-            status=status.HTTP_200_OK,
+            {
+                "Message": f"Video with id {pk} got queued for regeneration",
+                "job_id": job_id,
+            },
+            status=status.HTTP_202_ACCEPTED,
         )
 
     @swagger_auto_schema(
-        operation_description="This api renders the video, you will have to put a query param in url"
-        " video_id with the video you wanna render",
+        operation_description="This api queues the render of the video and returns the id of the job at "
+        "once. The optional renderer query param selects the render backend (moviepy, ffmpeg or "
+        "segments)",
         method="PATCH",
+        manual_parameters=[renderer_param],
     )
     @action(detail=True, methods=["PATCH"])
     @throttle_classes([RenderRateThrottle])
-    def render_video(self, _, pk):
+    def render_video(self, request, pk):
         vid = self.get_object()
-        try:
-            result = make_video(vid)
-            return Response(
-                {
-                    "message": "The video has been made successfully",
-                    "result": self.get_serializer(result).data,
-                }
-            )
+        if vid.status not in {"READY", "COMPLETED"}:
+            raise RenderFailedException("Video is not in a renderable state.")
+
+        job_id = queue_render(vid, renderer=request.query_params.get("renderer"))
+        logger.info(f"Video with id {pk} got queued for rendering")
+
+        return Response(
+            {"message": "The video has been queued for rendering", "job_id": job_id},
+            status=status.HTTP_202_ACCEPTED,
+        )
 
-        except Exception as exc:
-            logger.error(exc)
-            vid.status = "FAILED"
-            vid.save()
+    @swagger_auto_schema(
+        operation_description="This api returns the status of the video and the state of its last job",
+        method="GET",
+    )
+    @action(detail=True, methods=["GET"], url_path="status")
+    def job_status(self, _, pk):
+        video = self.get_object()
+        job_state = AsyncResult(video.job_id).state if video.job_id else None
 
         return Response(
-            {"message": "The render failed, probably you have to generate a new one"},
-            status=400,
+            {
+                "video_id": video.id,
+                "status": video.status,
+                "job_id": video.job_id,
+                "job_state": job_state,
+                "output": video.output.url if video.output else None,
+            }
         )
 
     @swagger_auto_schema(
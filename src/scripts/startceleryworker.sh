@@ -5,4 +5,4 @@ set -o nounset
 
 rm -f './celerybeat.pid'
 
-celery -A video_creator worker -l INFO --pool=solo
+celery -A video_creator worker -l INFO --pool=solo -Q "${CELERY_QUEUES:-celery,generation,rendering,lipsync}"
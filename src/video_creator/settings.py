@@ -2,6 +2,7 @@ from pathlib import Path
 import os
 from dotenv import load_dotenv
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
 
 # Load environment variables
 load_dotenv()
@@ -107,6 +108,23 @@ DJOSER = {
 # Celery Configuration
 CELERY_BROKER_URL = "redis://redis-stack-server:6379/0"
 CELERY_BROKER_URL = "redis://redis-stack-server:6379/0"
+CELERY_RESULT_BACKEND = os.getenv(
+    "CELERY_RESULT_BACKEND", "redis://redis-stack-server:6379/1"
+)
+CELERY_TASK_TRACK_STARTED = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Late-acked jobs are redelivered once unacknowledged for this long, so it must outlast the longest job.
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "visibility_timeout": int(os.getenv("CELERY_VISIBILITY_TIMEOUT", 6 * 3600)),
+}
+CELERY_TASK_ROUTES = {
+    "videomanagement.generate_video": {"queue": "generation"},
+    "videomanagement.generate_twitch_video": {"queue": "generation"},
+    "videomanagement.regenerate_video": {"queue": "generation"},
+    "videomanagement.render_video": {"queue": "rendering"},
+    "videomanagement.lipsync_video": {"queue": "lipsync"},
+    "videomanagement.preprocess_avatar": {"queue": "lipsync"},
+}
 
 # Logging
 LOGGING = {
@@ -211,8 +229,62 @@ TWITCH_CLIENT_SECRET = os.getenv("TWITCH_CLIENT_SECRET")
 XI_API_KEY = os.getenv("XI_API_KEY")
 DIFFUSION_KEY = os.getenv("DIFFUSION_KEY")
 MIDJOURNEY_KEY = os.getenv("MIDJOURNEY_KEY")
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 6))
+IMAGE_PROVIDER_CONCURRENCY = {
+    "default": 4,
+    "DALL-E": 2,
+    "stable-diffusion": 2,
+    "midjourney": 1,
+}
+
+# Rendering
+DEFAULT_RENDERER = os.getenv("DEFAULT_RENDERER", "segments")
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", os.cpu_count() or 2))
+RENDER_SEGMENT_RETRIES = int(os.getenv("RENDER_SEGMENT_RETRIES", 2))
+
+LIPSYNC_SERVER_ADDRESS = os.getenv("LIPSYNC_SERVER_ADDRESS", "")
+# The lip-sync server unpickles what authenticated clients send, so its key is never defaulted.
+LIPSYNC_SERVER_AUTHKEY = os.getenv("LIPSYNC_SERVER_AUTHKEY", "")
+if LIPSYNC_SERVER_ADDRESS and not LIPSYNC_SERVER_AUTHKEY:
+    raise ImproperlyConfigured(
+        "LIPSYNC_SERVER_AUTHKEY must be set when LIPSYNC_SERVER_ADDRESS is set."
+    )
+LIPSYNC_TIMEOUT = float(os.getenv("LIPSYNC_TIMEOUT", 3600))
+if CELERY_BROKER_TRANSPORT_OPTIONS["visibility_timeout"] <= LIPSYNC_TIMEOUT:
+    raise ImproperlyConfigured(
+        "CELERY_VISIBILITY_TIMEOUT must be longer than LIPSYNC_TIMEOUT."
+    )
+LIPSYNC_FRAME_CHUNK = int(os.getenv("LIPSYNC_FRAME_CHUNK", 8))
+LIPSYNC_CHUNK_SECONDS = float(os.getenv("LIPSYNC_CHUNK_SECONDS", 60))
+LIPSYNC_CHUNK_OVERLAP = float(os.getenv("LIPSYNC_CHUNK_OVERLAP", 1.0))
+LIPSYNC_CHUNK_WORKERS = int(os.getenv("LIPSYNC_CHUNK_WORKERS", 1))
+LIPSYNC_IDLE_LOOP = os.getenv("LIPSYNC_IDLE_LOOP", "true").lower() == "true"
+AVATAR_CACHE_DIR = os.getenv("AVATAR_CACHE_DIR", "media/cache/avatars")
+
 CONFIG_PATH = "apps/videomanagement/utils/SadTalker/src/config"
 
+# Outbound HTTP
+HTTP_TIMEOUT = (
+    float(os.getenv("HTTP_CONNECT_TIMEOUT", 10)),
+    float(os.getenv("HTTP_READ_TIMEOUT", 120)),
+)
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 10))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 10))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 3))
+
+# Text to speech
+TTS_POOL_MAX_MODELS = int(os.getenv("TTS_POOL_MAX_MODELS", 2))
+TTS_POOL_MAX_MEMORY_MB = int(os.getenv("TTS_POOL_MAX_MEMORY_MB", 2048))
+TTS_BATCH_SIZE = int(os.getenv("TTS_BATCH_SIZE", 8))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "media/cache/speech")
+TTS_CACHE_MAX_MB = int(os.getenv("TTS_CACHE_MAX_MB", 1024))
+TTS_API_RETRIES = int(os.getenv("TTS_API_RETRIES", 3))
+TTS_API_LIMITS = {
+    "default": {"concurrency": 2, "rate": 1.0, "burst": 2},
+    "open_ai": {"concurrency": 4, "rate": 0.8, "burst": 4},
+    "eleven_labs": {"concurrency": 2, "rate": 2.0, "burst": 2},
+}
+
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 